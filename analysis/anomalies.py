@@ -0,0 +1,128 @@
+"""
+analysis/anomalies.py
+
+Flags unusually large payments, such as a bill three times its normal size.
+Count, mean and sum of squared deviations (M2, as in Welford's online algorithm)
+are kept per merchant and per category. Each run scores its new payments
+against the stored statistics and then folds the batch in with Chan's parallel
+update, so the history is never rescanned.
+"""
+
+import numpy as np
+import pandas as pd
+
+from analysis.recurring import normalise_merchant
+from data_processing.state import load_state_table, save_state_table
+
+LEVELS = ["Merchant", "Category"]
+STATS_COLUMNS = ["Level", "Key", "Count", "Mean", "M2"]
+ANOMALY_LABEL = "Unusually high"
+
+
+def _payments(df: pd.DataFrame) -> pd.DataFrame:
+    """Outgoing payments keyed at every level, with the spend as a positive amount."""
+    payments = df[pd.to_numeric(df["Amount"]) < 0]
+    return pd.DataFrame(
+        {
+            "Merchant": normalise_merchant(payments["Name"]),
+            "Category": payments["Category"].fillna(""),
+            "Spend": -pd.to_numeric(payments["Amount"]),
+        },
+        index=payments.index,
+    )
+
+
+def batch_stats(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Count, mean and M2 of the payments in `df` per merchant and per category.
+
+    Args:
+        df (pd.DataFrame): Transactions with `Name`, `Category` and `Amount`.
+
+    Returns:
+        pd.DataFrame: One row per level and key with the columns in `STATS_COLUMNS`.
+    """
+    payments = _payments(df)
+    stats = []
+    for level in LEVELS:
+        data = payments[payments[level] != ""]
+        grouped = data.groupby(level)["Spend"]
+        level_stats = grouped.agg(Count="size", Mean="mean").reset_index()
+        level_stats["M2"] = (
+            grouped.var(ddof=0).fillna(0).to_numpy() * level_stats["Count"].to_numpy()
+        )
+        stats.append(level_stats.rename(columns={level: "Key"}).assign(Level=level))
+    return pd.concat(stats, ignore_index=True)[STATS_COLUMNS]
+
+
+def merge_stats(existing: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """
+    Combine two sets of statistics with Chan et al.'s parallel update.
+
+    Equivalent to running Welford's algorithm over both sets of payments.
+    """
+    if existing.empty:
+        return new.reset_index(drop=True)
+    merged = existing.merge(new, on=["Level", "Key"], how="outer", suffixes=("", " New"))
+    merged = merged.fillna(
+        {col: 0 for col in ["Count", "Mean", "M2", "Count New", "Mean New", "M2 New"]}
+    )
+
+    count = merged["Count"] + merged["Count New"]
+    delta = merged["Mean New"] - merged["Mean"]
+    # Guarded so keys seen in only one of the sets keep their own statistics
+    share = np.divide(
+        merged["Count New"], count, out=np.zeros(len(merged)), where=count > 0
+    )
+    merged["Mean"] = merged["Mean"] + delta * share
+    merged["M2"] = merged["M2"] + merged["M2 New"] + delta**2 * merged["Count"] * share
+    merged["Count"] = count.astype(np.int64)
+    return merged[STATS_COLUMNS]
+
+
+def score_anomalies(
+    df: pd.DataFrame,
+    stats: pd.DataFrame,
+    z_threshold: float = 3.0,
+    min_count: int = 5,
+    relative_floor: float = 0.1,
+) -> pd.Series:
+    """
+    Flag payments far above what is usual for their merchant, or for their
+    category when the merchant has too little history.
+
+    Args:
+        df (pd.DataFrame): New transactions with `Name`, `Category` and `Amount`.
+        stats (pd.DataFrame): Statistics from before this batch.
+        z_threshold (float): Standard deviations above the mean to flag.
+        min_count (int): Payments needed before a merchant or category is scored.
+        relative_floor (float): Lower bound of the standard deviation as a share of
+            the mean, so small changes to fixed charges are not flagged.
+
+    Returns:
+        pd.Series: `ANOMALY_LABEL` for flagged rows of `df`, None otherwise.
+    """
+    anomalies = pd.Series(None, index=df.index, dtype=object)
+    payments = _payments(df)
+    if payments.empty or stats.empty:
+        return anomalies
+
+    z = pd.Series(np.nan, index=payments.index)
+    for level in LEVELS:
+        level_stats = stats[(stats["Level"] == level) & (stats["Count"] >= min_count)]
+        level_stats = level_stats.set_index("Key")
+        mean = payments[level].map(level_stats["Mean"])
+        std = np.sqrt(payments[level].map(level_stats["M2"] / (level_stats["Count"] - 1)))
+        level_z = (payments["Spend"] - mean) / np.maximum(std, relative_floor * mean)
+        z = z.fillna(level_z)
+
+    anomalies.loc[z.index[z > z_threshold]] = ANOMALY_LABEL
+    return anomalies
+
+
+def load_stats(path: str) -> pd.DataFrame:
+    return load_state_table(path, STATS_COLUMNS)
+
+
+def save_stats(stats: pd.DataFrame, path: str) -> None:
+    save_state_table(stats, path)
@@ -0,0 +1,88 @@
+"""
+analysis/budgets.py
+
+Budgets are configured per category (and optionally subcategory) either per
+calendar month or over a rolling window of months:
+
+    budgets:
+      - category: Food
+        subcategory: Groceries
+        monthly: 300
+      - category: Entertainment
+        rolling_months: 3
+        limit: 450
+
+They are evaluated against the running totals from `analysis.rollups`.
+"""
+
+import pandas as pd
+
+BUDGET_COLUMNS = [
+    "Category",
+    "Subcategory",
+    "Window",
+    "From",
+    "To",
+    "Spend",
+    "Budget",
+    "Remaining",
+    "Used %",
+    "Status",
+]
+
+
+def _previous_months(month: str, n: int) -> list[str]:
+    end = pd.Period(month, freq="M")
+    return [str(end - i) for i in range(n)]
+
+
+def evaluate_budgets(
+    totals: pd.DataFrame, budgets: list[dict], month: str = None
+) -> pd.DataFrame:
+    """
+    Compare spend against every configured budget.
+
+    Args:
+        totals (pd.DataFrame): Running totals from `analysis.rollups`.
+        budgets (list[dict]): The `budgets` section of the config.
+        month (str, optional): Month to report on as 'YYYY-MM'. Defaults to the
+            latest month in `totals`.
+
+    Returns:
+        pd.DataFrame: One row per budget, over-budget rows first.
+    """
+    if not budgets or totals.empty:
+        return pd.DataFrame(columns=BUDGET_COLUMNS)
+    month = month or totals["Month"].max()
+
+    rows = []
+    for budget in budgets:
+        if "monthly" in budget:
+            n_months, limit = 1, budget["monthly"]
+        else:
+            n_months, limit = budget["rolling_months"], budget["limit"]
+        months = _previous_months(month, n_months)
+        subcategory = budget.get("subcategory")
+
+        mask = totals["Month"].isin(months) & (totals["Category"] == budget["category"])
+        if subcategory:
+            mask &= totals["Subcategory"] == subcategory
+        spend = round(float(totals.loc[mask, "Spend"].sum()), 2)
+
+        rows.append(
+            {
+                "Category": budget["category"],
+                "Subcategory": subcategory or "",
+                "Window": "Monthly" if "monthly" in budget else f"{n_months} months",
+                "From": months[-1],
+                "To": months[0],
+                "Spend": spend,
+                "Budget": limit,
+                "Remaining": round(limit - spend, 2),
+                "Used %": round(100 * spend / limit, 1) if limit else None,
+                "Status": "Over budget" if spend > limit else "OK",
+            }
+        )
+
+    report = pd.DataFrame(rows, columns=BUDGET_COLUMNS)
+    return report.sort_values("Remaining").reset_index(drop=True)
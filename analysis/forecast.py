@@ -0,0 +1,139 @@
+"""
+analysis/forecast.py
+
+Projects monthly spend for every category/subcategory/account series. All
+series are laid out as one matrix (series x months) from the running totals and
+each model is fitted to every row at once with array operations, so the cost
+barely depends on the number of series. Months before a series' first spend are
+left out of its fit rather than counted as zero, so a series that started late
+is not pulled down.
+"""
+
+import numpy as np
+import pandas as pd
+
+FORECAST_KEYS = ["Category", "Subcategory", "Account"]
+MODELS = ["Seasonal Naive", "Exp Smoothing", "Linear Trend"]
+
+
+def spend_matrix(
+    totals: pd.DataFrame, keys: list[str] = FORECAST_KEYS
+) -> tuple[pd.DataFrame, pd.PeriodIndex, np.ndarray]:
+    """
+    Lay out monthly spend as a matrix with one row per series.
+
+    Args:
+        totals (pd.DataFrame): Running totals from `analysis.rollups`.
+        keys (list[str]): Columns identifying a series.
+
+    Returns:
+        tuple: The keys of each row, the months of each column (every month
+        between the first and last) and the matrix. Months before a series'
+        first spend are NaN; later months without spend are 0.
+    """
+    dates = pd.to_datetime(totals["Month"], format="%Y-%m")
+    month_number = (dates.dt.year * 12 + dates.dt.month).to_numpy()
+    span = pd.period_range(dates.min(), dates.max(), freq="M")
+    grouped = totals.groupby(keys, sort=True)
+    series = grouped.size().reset_index()[keys]
+
+    row = grouped.ngroup().to_numpy()
+    col = month_number - month_number.min()
+    matrix = np.zeros((len(series), len(span)))
+    np.add.at(matrix, (row, col), totals["Spend"].to_numpy())
+    starts = np.full(len(series), len(span))
+    np.minimum.at(starts, row, col)
+    matrix[np.arange(len(span)) < starts[:, None]] = np.nan
+    return series, span, matrix
+
+
+def _started(y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """First observed month of each row, and the mask of months from then on."""
+    start = np.argmax(~np.isnan(y), axis=1)
+    return start, np.arange(y.shape[1]) >= start[:, None]
+
+
+def seasonal_naive(y: np.ndarray, horizon: int, season: int = 12) -> np.ndarray:
+    """Repeat the same month of the last season (the last month if history is shorter)."""
+    start, _ = _started(y)
+    last = np.repeat(y[:, -1:], horizon, axis=1)
+    if y.shape[1] < season:
+        return last
+    steps = np.arange(horizon) % season
+    short = (y.shape[1] - start < season)[:, None]
+    return np.where(short, last, y[:, -season:][:, steps])
+
+
+def exponential_smoothing(y: np.ndarray, horizon: int, alpha: float = 0.3) -> np.ndarray:
+    """
+    Simple exponential smoothing with the level initialised to each series' first month.
+
+    The final level is a weighted sum of the months, so all series are smoothed
+    with array operations instead of a recursion per series.
+    """
+    n = y.shape[1]
+    start, observed = _started(y)
+    weights = np.broadcast_to(alpha * (1 - alpha) ** np.arange(n - 1, -1, -1), y.shape)
+    weights = np.where(observed, weights, 0.0)
+    weights[np.arange(len(y)), start] = (1 - alpha) ** (n - 1 - start)
+    level = (np.nan_to_num(y) * weights).sum(axis=1)
+    return np.repeat(level[:, None], horizon, axis=1)
+
+
+def linear_trend(y: np.ndarray, horizon: int) -> np.ndarray:
+    """Least-squares line through each series since it started (closed form), floored at zero."""
+    n = y.shape[1]
+    start, observed = _started(y)
+    centre = (start + n - 1) / 2
+    t = np.where(observed, np.arange(n) - centre[:, None], 0.0)
+    values = np.nan_to_num(y)
+    denominator = (t**2).sum(axis=1)
+    mean = values.sum(axis=1) / (n - start)
+    slope = np.divide(
+        (values * t).sum(axis=1),
+        denominator,
+        out=np.zeros(len(y)),
+        where=denominator > 0,
+    )
+    future = np.arange(n, n + horizon) - centre[:, None]
+    return np.clip(mean[:, None] + slope[:, None] * future, 0, None)
+
+
+def forecast_spend(
+    totals: pd.DataFrame,
+    horizon: int = 3,
+    alpha: float = 0.3,
+    season: int = 12,
+    keys: list[str] = FORECAST_KEYS,
+) -> pd.DataFrame:
+    """
+    Forecast the next `horizon` months of spend for every series.
+
+    Args:
+        totals (pd.DataFrame): Running totals from `analysis.rollups`.
+        horizon (int): Number of months to project.
+        alpha (float): Smoothing factor of the exponential smoothing model.
+        season (int): Season length, in months, of the seasonal naive model.
+        keys (list[str]): Columns identifying a series.
+
+    Returns:
+        pd.DataFrame: One row per series and future month with the forecast of
+        each model in `MODELS`.
+    """
+    totals = totals[totals["Spend"] != 0]
+    if totals.empty:
+        return pd.DataFrame(columns=keys + ["Month"] + MODELS)
+
+    series, span, y = spend_matrix(totals, keys)
+    forecasts = {
+        "Seasonal Naive": seasonal_naive(y, horizon, season),
+        "Exp Smoothing": exponential_smoothing(y, horizon, alpha),
+        "Linear Trend": linear_trend(y, horizon),
+    }
+    future = pd.period_range(span[-1] + 1, periods=horizon, freq="M").strftime("%Y-%m")
+
+    result = series.loc[series.index.repeat(horizon)].reset_index(drop=True)
+    result["Month"] = np.tile(future, len(series))
+    for model, values in forecasts.items():
+        result[model] = values.ravel().round(2)
+    return result
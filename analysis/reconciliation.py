@@ -0,0 +1,179 @@
+"""
+analysis/reconciliation.py
+
+Checks each account's transactions against the running balance its statements
+report, and looks for stretches without any transactions that suggest a
+missing statement. The last date and balance of every account are kept between
+runs, so a new batch is checked against where the previous one ended without
+rereading the history.
+"""
+
+import numpy as np
+import pandas as pd
+
+from data_processing.state import load_state_table, save_state_table
+
+POSITION_COLUMNS = ["Account", "Date", "Balance"]
+DISCREPANCY_COLUMNS = ["Account", "Date", "Name", "Balance", "Expected", "Difference"]
+GAP_COLUMNS = ["Account", "From", "To", "Days"]
+
+
+def _positions(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rows sorted by account and date, with the account as an integer `Group`, its
+    `Start` flag and the amount in the balance's currency.
+    """
+    # Balances are in the account's own currency, before any FX conversion
+    amount = df["Original Amount"] if "Original Amount" in df.columns else df["Amount"]
+    groups, _ = pd.factorize(df["Account"])
+    # Stable, so transactions on the same day keep their statement order
+    order = np.lexsort((df["Date"].to_numpy(), groups))
+    data = pd.DataFrame(
+        {
+            "Row": df.index.to_numpy()[order],
+            "Account": df["Account"].to_numpy()[order],
+            "Group": groups[order],
+            "Date": df["Date"].to_numpy()[order],
+            "Amount": pd.to_numeric(amount).fillna(0).to_numpy()[order],
+            "Balance": pd.to_numeric(df["Balance"]).to_numpy(dtype=float)[order]
+            if "Balance" in df.columns
+            else np.nan,
+        }
+    )
+    data["Start"] = np.r_[True, data["Group"].to_numpy()[1:] != data["Group"].to_numpy()[:-1]]
+    return data
+
+
+def _running(values: np.ndarray, start: np.ndarray) -> np.ndarray:
+    """Cumulative sum restarting at every account."""
+    total = np.cumsum(values)
+    before = (total - values)[start]
+    return total - np.repeat(before, np.diff(np.r_[np.flatnonzero(start), len(values)]))
+
+
+def _continues(data: pd.DataFrame, previous: pd.DataFrame) -> pd.DataFrame:
+    """Stored position of each row's account when its new transactions follow on."""
+    if previous is None or previous.empty:
+        return pd.DataFrame({"Date": pd.NaT, "Balance": np.nan}, index=data.index)
+    stored = previous.drop_duplicates("Account", keep="last").set_index("Account")
+    positions = stored.reindex(data["Account"]).set_axis(data.index)
+    first = data["Date"].where(data["Start"]).ffill()
+    # A reprocessed window lies before the stored position and does not follow on
+    return positions.where(positions["Date"] <= first)
+
+
+def reconcile_balances(
+    df: pd.DataFrame, previous: pd.DataFrame = None, tolerance: float = 0.01
+) -> pd.DataFrame:
+    """
+    Find where the transactions stop adding up to the reported balances.
+
+    Per account, the expected balance is the opening balance plus the cumulative
+    sum of the amounts. Its difference from the reported balance stays constant
+    while the rows add up, so only the rows where the difference changes are
+    reported: the first row after a missing, duplicated or wrong transaction.
+
+    Args:
+        df (pd.DataFrame): Transactions with `Account`, `Date`, `Name`, `Amount`
+            and, for accounts that export one, `Balance`.
+        previous (pd.DataFrame, optional): Stored positions from `load_positions`.
+            An account's opening balance is taken from it when its new
+            transactions follow on; otherwise from its first reported balance.
+        tolerance (float): Differences up to this amount are ignored.
+
+    Returns:
+        pd.DataFrame: One row per discrepancy with the columns in
+        `DISCREPANCY_COLUMNS`.
+    """
+    data = _positions(df)
+    running = _running(data["Amount"].to_numpy(), data["Start"].to_numpy())
+    checked = data["Balance"].notna().to_numpy()
+    if not checked.any():
+        return pd.DataFrame(columns=DISCREPANCY_COLUMNS)
+
+    stored = _continues(data, previous)["Balance"].to_numpy(dtype=float)
+    # Relative to a stored balance the difference should be zero; without one,
+    # it only has to stay the same from one reported balance to the next
+    difference = data["Balance"].to_numpy() - running - np.nan_to_num(stored)
+    group = data["Group"].to_numpy()[checked]
+    difference = np.round(difference[checked], 2)
+    first = np.r_[True, group[1:] != group[:-1]]
+    step = np.where(first, np.where(np.isnan(stored[checked]), 0.0, difference), 0.0)
+    step[~first] = np.diff(difference)[~first[1:]]
+    broken = np.flatnonzero(checked)[np.abs(step) > tolerance]
+    step = step[np.abs(step) > tolerance]
+
+    report = data.loc[broken, ["Account", "Date", "Balance"]]
+    report.insert(2, "Name", df.loc[data.loc[broken, "Row"], "Name"].to_numpy())
+    report["Expected"] = (report["Balance"] - step).round(2)
+    report["Difference"] = step.round(2)
+    return report[DISCREPANCY_COLUMNS].reset_index(drop=True)
+
+
+def find_gaps(
+    df: pd.DataFrame, previous: pd.DataFrame = None, max_gap_days: int = 35
+) -> pd.DataFrame:
+    """
+    Stretches longer than `max_gap_days` without transactions in an account.
+
+    Args:
+        df (pd.DataFrame): Transactions with `Account` and `Date`.
+        previous (pd.DataFrame, optional): Stored positions; the gap between an
+            account's last stored date and its new transactions is checked too.
+        max_gap_days (int): Longest quiet period expected between transactions.
+
+    Returns:
+        pd.DataFrame: One row per gap with the columns in `GAP_COLUMNS`.
+    """
+    data = _positions(df)
+    before = data["Date"].shift()
+    before[data["Start"]] = _continues(data, previous)["Date"][data["Start"]]
+    days = (data["Date"] - before).dt.days
+    gaps = days > max_gap_days
+    report = pd.DataFrame(
+        {
+            "Account": data.loc[gaps, "Account"],
+            "From": before[gaps],
+            "To": data.loc[gaps, "Date"],
+            "Days": days[gaps].astype(int),
+        },
+        columns=GAP_COLUMNS,
+    )
+    return report.reset_index(drop=True)
+
+
+def update_positions(previous: pd.DataFrame, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Latest date and balance of every account after adding `df`.
+
+    The balance is the expected one after the account's last transaction, so it
+    is carried forward for accounts whose last rows report no balance.
+    """
+    data = _positions(df)
+    running = _running(data["Amount"].to_numpy(), data["Start"].to_numpy())
+    # Balance after each row: the last reported (or stored) one plus the amounts since
+    offset = pd.Series(data["Balance"].to_numpy() - running)
+    opening = data["Start"] & offset.isna()
+    offset[opening] = _continues(data, previous)["Balance"][opening]
+    offset = offset.groupby(data["Group"]).ffill()
+    data["Balance"] = (offset + running).round(2)
+
+    latest = data[np.r_[data["Start"].to_numpy()[1:], True]][POSITION_COLUMNS]
+    if previous is None or previous.empty:
+        return latest.reset_index(drop=True)
+    combined = pd.concat([previous, latest], ignore_index=True)
+    combined["Date"] = pd.to_datetime(combined["Date"])
+    return (
+        combined.sort_values("Date", kind="stable")
+        .drop_duplicates("Account", keep="last")
+        .sort_values("Account")
+        .reset_index(drop=True)
+    )
+
+
+def load_positions(path: str) -> pd.DataFrame:
+    return load_state_table(path, POSITION_COLUMNS, date_columns=["Date"])
+
+
+def save_positions(positions: pd.DataFrame, path: str) -> None:
+    save_state_table(positions, path)
@@ -0,0 +1,229 @@
+"""
+analysis/recurring.py
+
+Detects subscriptions and standing charges. Every (merchant, account) series is
+summarised by its count, first/last date and the sums and squared sums of its
+inter-arrival intervals and amounts. Those moments can be merged, so each run
+only summarises the new transactions and extends the stored series instead of
+re-scanning the full history.
+"""
+
+import numpy as np
+import pandas as pd
+
+from data_processing.state import load_state_table, save_state_table
+
+KEYS = ["Merchant", "Account"]
+SERIES_COLUMNS = KEYS + [
+    "Count",
+    "First Date",
+    "Last Date",
+    "Interval Sum",
+    "Interval Sum Sq",
+    "Amount Sum",
+    "Amount Sum Sq",
+]
+
+# Nominal period lengths in days
+PERIODS = {
+    "Weekly": 7.0,
+    "Fortnightly": 14.0,
+    "Monthly": 30.44,
+    "Quarterly": 91.31,
+    "Yearly": 365.25,
+}
+
+
+def normalise_merchant(names: pd.Series) -> pd.Series:
+    """
+    Reduce transaction descriptions to a comparable merchant name by dropping
+    case, digits (card numbers, references, dates) and punctuation.
+    """
+    return (
+        names.fillna("")
+        .astype(str)
+        .str.lower()
+        .str.replace(r"[\d]+", " ", regex=True)
+        .str.replace(r"[^\w\s&]", " ", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def summarise_series(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarise the outgoing payments in `df` per merchant and account.
+
+    Args:
+        df (pd.DataFrame): Transactions with `Name`, `Account`, `Date` and `Amount`.
+
+    Returns:
+        pd.DataFrame: One row per series with the columns in `SERIES_COLUMNS`.
+    """
+    payments = df[df["Amount"] < 0]
+    data = pd.DataFrame(
+        {
+            "Merchant": normalise_merchant(payments["Name"]),
+            "Account": payments["Account"],
+            "Date": payments["Date"],
+            "Amount": -payments["Amount"],
+        }
+    )
+    data = data[data["Merchant"] != ""].sort_values(KEYS + ["Date"])
+    data["Interval"] = data.groupby(KEYS)["Date"].diff().dt.days
+    data["Interval Sq"] = data["Interval"] ** 2
+    data["Amount Sq"] = data["Amount"] ** 2
+
+    grouped = data.groupby(KEYS, sort=False)
+    summary = grouped.agg(
+        **{
+            "Count": ("Date", "size"),
+            "First Date": ("Date", "min"),
+            "Last Date": ("Date", "max"),
+            "Interval Sum": ("Interval", "sum"),
+            "Interval Sum Sq": ("Interval Sq", "sum"),
+            "Amount Sum": ("Amount", "sum"),
+            "Amount Sum Sq": ("Amount Sq", "sum"),
+        }
+    )
+    return summary.reset_index()[SERIES_COLUMNS]
+
+
+def merge_series(existing: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """
+    Extend stored series with the summary of newly ingested transactions.
+
+    The interval between the two batches (whichever comes first) is added to the
+    interval moments so the merged series matches a full re-scan. When the
+    batches overlap, e.g. a late statement, the intervals across the overlap
+    cannot be recovered from the summaries; the mean interval of both batches is
+    used as the bridge instead, which leaves the mean unchanged and does not
+    widen the spread.
+    """
+    if existing.empty:
+        return new.copy()
+    if new.empty:
+        return existing.copy()
+
+    merged = existing.merge(new, on=KEYS, how="outer", suffixes=("", " New"))
+    both = merged["Count"].notna() & merged["Count New"].notna()
+    after = (merged["First Date New"] - merged["Last Date"]).dt.days
+    before = (merged["First Date"] - merged["Last Date New"]).dt.days
+    n_intervals = merged["Count"] + merged["Count New"] - 2
+    pooled = (merged["Interval Sum"] + merged["Interval Sum New"]) / n_intervals.where(
+        n_intervals > 0
+    )
+    bridge = after.where(after >= 0, before.where(before >= 0, pooled))
+    bridge = bridge.where(both, 0).fillna(0)
+
+    result = merged[KEYS].copy()
+    result["Count"] = merged["Count"].fillna(0) + merged["Count New"].fillna(0)
+    result["First Date"] = merged[["First Date", "First Date New"]].min(axis=1)
+    result["Last Date"] = merged[["Last Date", "Last Date New"]].max(axis=1)
+    for col in ("Interval Sum", "Amount Sum", "Amount Sum Sq", "Interval Sum Sq"):
+        result[col] = merged[col].fillna(0) + merged[f"{col} New"].fillna(0)
+    result["Interval Sum"] += bridge
+    result["Interval Sum Sq"] += bridge**2
+    result["Count"] = result["Count"].astype(int)
+    return result[SERIES_COLUMNS]
+
+
+def overlapping_series(existing: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """
+    Keys of the series whose new payments fall between stored ones, such as a
+    statement imported late, so `merge_series` cannot merge them exactly.
+    """
+    merged = existing.merge(new, on=KEYS, suffixes=("", " New"))
+    late = (merged["First Date New"] < merged["Last Date"]) & (
+        merged["Last Date New"] > merged["First Date"]
+    )
+    return merged.loc[late, KEYS].reset_index(drop=True)
+
+
+def rescan_series(
+    series: pd.DataFrame, transactions: pd.DataFrame, keys: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Re-derive the given series from all of their transactions.
+
+    Args:
+        series (pd.DataFrame): Merged series summaries.
+        transactions (pd.DataFrame): Every transaction, stored and new, with
+            `Name`, `Account`, `Date` and `Amount`.
+        keys (pd.DataFrame): Series to rescan, from `overlapping_series`.
+
+    Returns:
+        pd.DataFrame: `series` with the rescanned series replaced.
+    """
+    if keys.empty:
+        return series
+    wanted = pd.MultiIndex.from_frame(keys)
+    merchants = normalise_merchant(transactions["Name"])
+    selected = pd.MultiIndex.from_arrays([merchants, transactions["Account"]]).isin(wanted)
+    rescanned = summarise_series(transactions[selected])
+    kept = series[~pd.MultiIndex.from_frame(series[KEYS]).isin(wanted)]
+    return pd.concat([kept, rescanned], ignore_index=True)[SERIES_COLUMNS]
+
+
+def classify_series(
+    series: pd.DataFrame,
+    min_occurrences: int = 3,
+    interval_tolerance: float = 0.2,
+    amount_tolerance: float = 0.25,
+) -> pd.DataFrame:
+    """
+    Label the series whose payments arrive at a regular period with a stable amount.
+
+    Args:
+        series (pd.DataFrame): Series summaries from `summarise_series` or `merge_series`.
+        min_occurrences (int): Payments needed before a series can be recurring.
+        interval_tolerance (float): Allowed relative deviation of the mean interval
+            from the nominal period, and the maximum coefficient of variation of
+            the intervals.
+        amount_tolerance (float): Maximum coefficient of variation of the amounts.
+
+    Returns:
+        pd.DataFrame: The recurring series with their period, mean amount and next
+        expected date, most expensive first.
+    """
+    count = series["Count"].to_numpy(dtype=float)
+    n_intervals = np.maximum(count - 1, 1)
+    mean_interval = series["Interval Sum"].to_numpy() / n_intervals
+    interval_var = series["Interval Sum Sq"].to_numpy() / n_intervals - mean_interval**2
+    mean_amount = series["Amount Sum"].to_numpy() / count
+    amount_var = series["Amount Sum Sq"].to_numpy() / count - mean_amount**2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        interval_cv = np.sqrt(np.clip(interval_var, 0, None)) / mean_interval
+        amount_cv = np.sqrt(np.clip(amount_var, 0, None)) / mean_amount
+
+        nominal = np.array(list(PERIODS.values()))
+        error = np.abs(mean_interval[:, None] - nominal[None, :]) / nominal[None, :]
+    best = error.argmin(axis=1)
+    period_error = error[np.arange(len(series)), best]
+
+    recurring = (
+        (count >= min_occurrences)
+        & (period_error <= interval_tolerance)
+        & (interval_cv <= interval_tolerance)
+        & (amount_cv <= amount_tolerance)
+    )
+
+    result = series[KEYS + ["Count", "First Date", "Last Date"]].copy()
+    result["Period"] = np.array(list(PERIODS))[best]
+    result["Mean Interval"] = mean_interval.round(1)
+    result["Mean Amount"] = mean_amount.round(2)
+    result["Amount CV"] = amount_cv.round(3)
+    result["Next Expected"] = result["Last Date"] + pd.to_timedelta(
+        np.round(mean_interval), unit="D"
+    )
+    result = result[recurring]
+    return result.sort_values("Mean Amount", ascending=False).reset_index(drop=True)
+
+
+def load_series(path: str) -> pd.DataFrame:
+    return load_state_table(path, SERIES_COLUMNS, ["First Date", "Last Date"])
+
+
+def save_series(series: pd.DataFrame, path: str) -> None:
+    save_state_table(series, path)
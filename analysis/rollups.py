@@ -0,0 +1,81 @@
+"""
+analysis/rollups.py
+
+Running monthly totals per category, subcategory and account (and per merchant).
+The stored totals are only ever adjusted by the transactions that changed in a
+run, so nothing downstream has to re-aggregate the full history.
+"""
+
+import pandas as pd
+
+from analysis.recurring import normalise_merchant
+from data_processing.state import load_state_table, save_state_table
+
+ROLLUP_KEYS = ["Month", "Category", "Subcategory", "Account"]
+MERCHANT_ROLLUP_KEYS = ["Month", "Merchant"]
+VALUE_COLUMNS = ["Spend", "Income", "Count"]
+ROLLUP_COLUMNS = ROLLUP_KEYS + VALUE_COLUMNS
+
+
+def monthly_rollup(
+    df: pd.DataFrame, sign: int = 1, keys: list[str] = ROLLUP_KEYS
+) -> pd.DataFrame:
+    """
+    Aggregate transactions into monthly totals.
+
+    Args:
+        df (pd.DataFrame): Transactions with `Date`, `Category`, `Subcategory`,
+            `Account`, `Name` and `Amount`.
+        sign (int): 1 to add the transactions to the totals, -1 to remove them
+            (e.g. the old categorisation of a re-categorised row).
+        keys (list[str]): Grouping columns, `ROLLUP_KEYS` or `MERCHANT_ROLLUP_KEYS`.
+
+    Returns:
+        pd.DataFrame: Totals with `keys` plus Spend, Income and Count. Spend and
+        income are both positive.
+    """
+    amount = pd.to_numeric(df["Amount"]).fillna(0)
+    data = pd.DataFrame(
+        {
+            "Month": df["Date"].dt.strftime("%Y-%m"),
+            "Spend": -amount.clip(upper=0) * sign,
+            "Income": amount.clip(lower=0) * sign,
+            "Count": sign,
+        }
+    )
+    for key in keys:
+        if key == "Merchant":
+            data[key] = normalise_merchant(df["Name"])
+        elif key in ("Category", "Subcategory"):
+            data[key] = df[key].fillna("")
+        elif key != "Month":
+            data[key] = df[key]
+    return data.groupby(keys, as_index=False)[VALUE_COLUMNS].sum()
+
+
+def update_rollup(
+    totals: pd.DataFrame, delta: pd.DataFrame, keys: list[str] = ROLLUP_KEYS
+) -> pd.DataFrame:
+    """Add a delta from `monthly_rollup` to the running totals."""
+    if totals.empty:
+        combined = delta
+    else:
+        combined = pd.concat([totals, delta], ignore_index=True)
+    for col in ("Category", "Subcategory", "Merchant"):
+        if col in keys:
+            combined[col] = combined[col].fillna("")
+    combined = combined.groupby(keys, as_index=False)[VALUE_COLUMNS].sum()
+    combined[["Spend", "Income"]] = combined[["Spend", "Income"]].round(2)
+    return combined[combined["Count"] != 0].reset_index(drop=True)
+
+
+def load_rollup(path: str, keys: list[str] = ROLLUP_KEYS) -> pd.DataFrame:
+    totals = load_state_table(path, keys + VALUE_COLUMNS)
+    for col in ("Category", "Subcategory", "Merchant"):
+        if col in keys:
+            totals[col] = totals[col].fillna("")
+    return totals
+
+
+def save_rollup(totals: pd.DataFrame, path: str) -> None:
+    save_state_table(totals, path)
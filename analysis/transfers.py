@@ -0,0 +1,163 @@
+"""
+analysis/transfers.py
+
+Pairs money leaving one of our accounts with the same amount arriving in
+another, so internal transfers are not counted as both spend and income.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def match_transfers(
+    df: pd.DataFrame, window_days: int = 3, max_rounds: int = 5
+) -> pd.Series:
+    """
+    Find inter-account transfers.
+
+    For every destination account, outgoing payments from the other accounts are
+    matched to the nearest incoming payment of exactly the same amount with a
+    sorted as-of join (`pd.merge_asof` by amount in pence), which is
+    O(n log n) per account rather than comparing every pair. The closest pairs
+    within `window_days` are kept one-to-one, and the remaining transactions are
+    rematched for a few rounds so a transaction losing its nearest partner can
+    still pair with the next one.
+
+    Args:
+        df (pd.DataFrame): Transactions with `Date`, `Account` and `Amount`.
+        window_days (int): Maximum days between the two sides of a transfer.
+        max_rounds (int): Number of rematching rounds.
+
+    Returns:
+        pd.Series: Transfer ID per row of `df` (shared by both sides), None otherwise.
+    """
+    transfer_ids = pd.Series(None, index=df.index, dtype=object)
+    if df.empty:
+        return transfer_ids
+
+    cents = (pd.to_numeric(df["Amount"]) * 100).round()
+    data = pd.DataFrame(
+        {
+            "Row": df.index,
+            "Date": df["Date"],
+            "Account": df["Account"],
+            "Key": cents.abs(),
+        }
+    ).sort_values("Date")
+    outgoing = data[data["Row"].isin(df.index[cents < 0])]
+    incoming = data[data["Row"].isin(df.index[cents > 0])]
+    window = pd.Timedelta(days=window_days)
+
+    pairs = []
+    for _ in range(max_rounds):
+        candidates = []
+        for account, received in incoming.groupby("Account", sort=False):
+            sent = outgoing[outgoing["Account"] != account]
+            if sent.empty:
+                continue
+            received = received.rename(
+                columns={"Row": "Row In", "Account": "Account In"}
+            ).assign(**{"Date In": received["Date"]})
+            nearest = pd.merge_asof(
+                sent.rename(columns={"Row": "Row Out", "Account": "Account Out"}),
+                received,
+                on="Date",
+                by="Key",
+                direction="nearest",
+                tolerance=window,
+            )
+            candidates.append(nearest.dropna(subset=["Row In"]))
+        if not candidates:
+            break
+        candidates = pd.concat(candidates).rename(columns={"Date": "Date Out"})
+        if candidates.empty:
+            break
+        candidates["Gap"] = (candidates["Date In"] - candidates["Date Out"]).abs()
+
+        matched = (
+            candidates.sort_values(["Gap", "Row Out", "Row In"])
+            .drop_duplicates("Row Out")
+            .drop_duplicates("Row In")
+        )
+        pairs.append(matched)
+        outgoing = outgoing[~outgoing["Row"].isin(matched["Row Out"])]
+        incoming = incoming[~incoming["Row"].isin(matched["Row In"])]
+
+    if not pairs:
+        return transfer_ids
+
+    pairs = pd.concat(pairs)
+    # Stable across runs: derived from the accounts, dates and amount of the pair
+    identity = pairs[["Account Out", "Account In", "Date Out", "Date In", "Key"]]
+    identity = identity.assign(
+        Occurrence=identity.groupby(list(identity.columns)).cumcount()
+    )
+    digest = pd.util.hash_pandas_object(identity, index=False)
+    ids = (
+        "TR-"
+        + pairs["Date Out"].dt.strftime("%Y%m%d")
+        + "-"
+        + digest.map("{:016x}".format).str[:10]
+    )
+    transfer_ids.loc[pairs["Row Out"].to_numpy()] = ids.to_numpy()
+    transfer_ids.loc[pairs["Row In"].astype(df.index.dtype).to_numpy()] = ids.to_numpy()
+    return transfer_ids
+
+
+def match_stored_transfers(
+    df: pd.DataFrame,
+    history: pd.DataFrame,
+    window_days: int = 3,
+    max_rounds: int = 5,
+) -> tuple[pd.Series, pd.Series]:
+    """
+    Pair transactions left unmatched in a batch with unmatched stored ones.
+
+    The two sides of a transfer often arrive in different runs, e.g. when two
+    banks' monthly exports are downloaded on different days. Only stored rows
+    within `window_days` of the batch are considered, and only pairs with one
+    side in each are kept.
+
+    Args:
+        df (pd.DataFrame): The batch, with the `Transfer ID` from `match_transfers`.
+        history (pd.DataFrame): Stored history.
+        window_days (int): Maximum days between the two sides of a transfer.
+        max_rounds (int): Number of rematching rounds.
+
+    Returns:
+        tuple[pd.Series, pd.Series]: Transfer ID of the newly paired rows, per row
+        of `df` and per row of `history`, None elsewhere.
+    """
+    new_ids = pd.Series(None, index=df.index, dtype=object)
+    stored_ids = pd.Series(None, index=history.index, dtype=object)
+    new = df[df["Transfer ID"].isna()]
+    if new.empty or history.empty:
+        return new_ids, stored_ids
+    window = pd.Timedelta(days=window_days)
+    stored = history[
+        history["Transfer ID"].isna()
+        & history["Date"].between(new["Date"].min() - window, new["Date"].max() + window)
+    ]
+    if stored.empty:
+        return new_ids, stored_ids
+
+    columns = ["Date", "Account", "Amount"]
+    ids = match_transfers(
+        pd.concat([new[columns], stored[columns]], ignore_index=True),
+        window_days,
+        max_rounds,
+    )
+    is_new = pd.Series(np.arange(len(ids)) < len(new), index=ids.index)
+    # Pairs within one side were already left unmatched by their own run
+    mixed = is_new.groupby(ids).nunique() == 2
+    ids = ids.where(ids.map(mixed).eq(True), None)
+    new_ids.loc[new.index] = ids.iloc[: len(new)].to_numpy()
+    stored_ids.loc[stored.index] = ids.iloc[len(new) :].to_numpy()
+    return new_ids, stored_ids
+
+
+def exclude_transfers(df: pd.DataFrame) -> pd.DataFrame:
+    """Drop matched transfers before computing spend or income."""
+    if "Transfer ID" not in df.columns:
+        return df
+    return df[df["Transfer ID"].isna()]
@@ -0,0 +1,133 @@
+"""
+batch.py
+
+Run the tracker for several households in one process:
+
+    python batch.py households/alice/config.yaml households/bob/config.yaml --workers 4
+
+Rules are compiled once and shared by every tenant. A failing tenant is reported
+in the summary without stopping the others.
+"""
+
+import argparse
+import time
+import traceback
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from categorisation.categorisation_rules import rules
+from categorisation.manual_categorisation import compile_rules
+from data_processing.data_loading import load_config
+from main import run
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+_worker_rules = None
+
+
+def _init_worker(compiled_rules: list[dict]):
+    # Process pool initialiser: each worker receives the compiled rules once
+    # rather than once per tenant.
+    global _worker_rules
+    _worker_rules = compiled_rules
+
+
+def run_tenant(config_path: str, compiled_rules: list[dict] = None) -> dict:
+    """
+    Run the tracker for a single config, capturing any failure.
+
+    Args:
+        config_path (str): Path to the tenant's config.yaml.
+        compiled_rules (list[dict], optional): Rules from `compile_rules`. Defaults
+            to the rules handed to this worker process.
+
+    Returns:
+        dict: config path, status, total seconds, per-stage timings and error.
+    """
+    start = time.perf_counter()
+    result = {"config": config_path, "stages": {}, "error": None}
+    try:
+        config = load_config(config_path)
+        result["stages"] = run(config, compiled_rules or _worker_rules)
+        result["status"] = "ok"
+    except Exception:
+        result["status"] = "failed"
+        result["error"] = traceback.format_exc()
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run_batch(
+    config_paths: list[str], workers: int = 4, processes: bool = False
+) -> list[dict]:
+    """
+    Run every config across a worker pool.
+
+    Args:
+        config_paths (list[str]): Tenant config files.
+        workers (int): Number of tenants processed at once.
+        processes (bool): Use worker processes instead of threads.
+
+    Returns:
+        list[dict]: One result per tenant, in the order given.
+    """
+    compiled_rules = compile_rules(rules)
+    if processes:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(compiled_rules,)
+        )
+        submit = lambda path: executor.submit(run_tenant, path)
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        submit = lambda path: executor.submit(run_tenant, path, compiled_rules)
+
+    with executor:
+        futures = {submit(path): path for path in config_paths}
+        results = {}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            print(f"[{result['status']}] {result['config']} ({result['seconds']:.2f}s)")
+    return [results[path] for path in config_paths]
+
+
+def print_summary(results: list[dict]):
+    stages = sorted({stage for result in results for stage in result["stages"]})
+    header = f"{'Config':<40} {'Status':<8} {'Total':>8}" + "".join(
+        f" {stage:>10}" for stage in stages
+    )
+    print(header)
+    print("─" * len(header))
+    for result in results:
+        line = f"{result['config']:<40} {result['status']:<8} {result['seconds']:>7.2f}s"
+        line += "".join(
+            f" {result['stages'][stage]:>9.2f}s" if stage in result["stages"] else f" {'-':>10}"
+            for stage in stages
+        )
+        print(line)
+
+    failed = [result for result in results if result["status"] != "ok"]
+    for result in failed:
+        print(f"\n[❌] {result['config']} failed:\n{result['error']}")
+    print(f"\n{len(results) - len(failed)}/{len(results)} tenants succeeded")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the tracker for many configs.")
+    parser.add_argument("configs", nargs="+", help="config.yaml file per household")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--processes",
+        action="store_true",
+        help="use worker processes instead of threads",
+    )
+    args = parser.parse_args()
+
+    results = run_batch(args.configs, args.workers, args.processes)
+    print_summary(results)
+    if any(result["status"] != "ok" for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+benchmarks/bench_csv_io.py
+
+Throughput of every CSV engine and compression combination on a synthetic
+transaction history:
+
+    python -m benchmarks.bench_csv_io --rows 1000000
+
+MB/s is measured against the size of the uncompressed CSV so the numbers are
+comparable across compression settings. Each combination is read back and
+checked against the pandas baseline.
+"""
+
+import argparse
+import importlib.util
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from parser.csv_parser import COMPRESSION_EXTENSIONS, CSV_ENGINES, read_csv, write_csv
+
+
+def make_transactions(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    names = np.array(
+        ["TESCO STORES", "Netflix", "Greggs", "TFL TRAVEL", "Amazon, UK", "Salary"]
+    )
+    amounts = rng.normal(-20, 40, n_rows).round(2)
+    return pd.DataFrame(
+        {
+            "Date": pd.Timestamp("2020-01-01")
+            + pd.to_timedelta(rng.integers(0, 5 * 365, n_rows), unit="D"),
+            "Time": np.where(rng.random(n_rows) < 0.5, "12:30", None),
+            "Type": rng.choice(["DEB", "FPO", "FPI"], n_rows),
+            "Name": rng.choice(names, n_rows),
+            "Amount": amounts,
+            "Category": rng.choice(["Food", "Bills", None], n_rows),
+            "Amount Out": np.where(amounts < 0, amounts, np.nan),
+            "Amount In": np.where(amounts >= 0, amounts, np.nan),
+            "Account": rng.choice(["bank_name1", "bank_name2"], n_rows),
+        }
+    )
+
+
+def same_values(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    """Same columns, the same cells missing, and the same values in the rest."""
+    if list(a.columns) != list(b.columns) or len(a) != len(b):
+        return False
+    for col in a.columns:
+        missing = a[col].isna().to_numpy()
+        if not np.array_equal(missing, b[col].isna().to_numpy()):
+            return False
+        if pd.api.types.is_numeric_dtype(a[col]) and pd.api.types.is_numeric_dtype(b[col]):
+            if not np.allclose(a[col][~missing], b[col][~missing]):
+                return False
+        elif not a[col][~missing].astype(str).equals(b[col][~missing].astype(str)):
+            return False
+    return True
+
+
+def available_compressions() -> list[str | None]:
+    compressions = [None, "gzip"]
+    if importlib.util.find_spec("zstandard"):
+        compressions.append("zstd")
+    return compressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    df = make_transactions(args.rows)
+    engines = [
+        engine
+        for engine in CSV_ENGINES
+        if engine == "pandas" or importlib.util.find_spec(engine)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        baseline_path = os.path.join(tmp_dir, "baseline.csv")
+        write_csv(df, baseline_path)
+        size_mb = os.path.getsize(baseline_path) / 1e6
+        baseline = read_csv(baseline_path)
+        print(f"{args.rows:,} rows, {size_mb:.1f} MB uncompressed\n")
+        mismatches = []
+        print(f"{'Engine':<10} {'Compression':<12} {'Write MB/s':>11} {'Read MB/s':>10} {'Size MB':>8}  Same")
+
+        for engine in engines:
+            for compression in available_compressions():
+                path = os.path.join(
+                    tmp_dir,
+                    f"{engine}.csv{COMPRESSION_EXTENSIONS[compression]}",
+                )
+                start = time.perf_counter()
+                write_csv(df, path, engine, compression)
+                write_seconds = time.perf_counter() - start
+
+                start = time.perf_counter()
+                result = read_csv(path, engine)
+                read_seconds = time.perf_counter() - start
+
+                same = same_values(result, baseline)
+                if not same:
+                    mismatches.append(f"{engine}/{compression}")
+                print(
+                    f"{engine:<10} {str(compression):<12} "
+                    f"{size_mb / write_seconds:>11.1f} {size_mb / read_seconds:>10.1f} "
+                    f"{os.path.getsize(path) / 1e6:>8.1f}  {'yes' if same else 'NO'}"
+                )
+
+    if mismatches:
+        raise SystemExit(f"Read back different values: {', '.join(mismatches)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+benchmarks/bench_forecast.py
+
+Runtime of the vectorised spending forecasts on synthetic running totals with
+many category/subcategory/account series:
+
+    python -m benchmarks.bench_forecast --series 5000 --months 60
+
+A per-series Python loop over a sample of the series is timed alongside as a
+reference, and its forecasts are checked against the vectorised ones.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from analysis.forecast import (
+    exponential_smoothing,
+    forecast_spend,
+    linear_trend,
+    seasonal_naive,
+    spend_matrix,
+)
+
+
+def make_totals(n_series: int, n_months: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    months = pd.period_range("2020-01", periods=n_months, freq="M").strftime("%Y-%m")
+    base = rng.gamma(2, 50, n_series)[:, None]
+    season = 1 + 0.2 * np.sin(2 * np.pi * np.arange(n_months) / 12)
+    spend = (base * season * rng.lognormal(0, 0.3, (n_series, n_months))).round(2)
+    # A third of the series start part way through, like newly added categories
+    late = rng.random(n_series) < 1 / 3
+    spend[np.arange(n_months) < (late * rng.integers(0, n_months, n_series))[:, None]] = 0
+    totals = pd.DataFrame(
+        {
+            "Month": np.tile(months, n_series),
+            "Category": np.repeat([f"Category {i // 100}" for i in range(n_series)], n_months),
+            "Subcategory": np.repeat([f"Sub {i % 100}" for i in range(n_series)], n_months),
+            "Account": "bank_name1",
+            "Spend": spend.ravel(),
+            "Income": 0.0,
+            "Count": 1,
+        }
+    )
+    return totals[totals["Spend"] != 0].reset_index(drop=True)
+
+
+def loop_forecast(y: np.ndarray, horizon: int, alpha: float, season: int) -> np.ndarray:
+    """One series at a time, the way a per-series model fit would run."""
+    out = []
+    for values in y:
+        values = values[~np.isnan(values)]
+        level = values[0]
+        for value in values[1:]:
+            level = alpha * value + (1 - alpha) * level
+        if len(values) > 1:
+            slope, intercept = np.polyfit(np.arange(len(values)), values, 1)
+        else:
+            slope, intercept = 0.0, values[0]
+        trend = np.maximum(intercept + slope * np.arange(len(values), len(values) + horizon), 0)
+        if len(values) < season:
+            # Less than a season of history: repeat the last month
+            naive = np.full(horizon, values[-1])
+        else:
+            naive = values[-season:][np.arange(horizon) % season]
+        out.append(np.concatenate([naive, np.full(horizon, level), trend]))
+    return np.array(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--series", type=int, default=5_000)
+    parser.add_argument("--months", type=int, default=60)
+    parser.add_argument("--horizon", type=int, default=3)
+    parser.add_argument("--sample", type=int, default=500)
+    args = parser.parse_args()
+    alpha, season = 0.3, 12
+
+    totals = make_totals(args.series, args.months)
+    print(f"{args.series:,} series x {args.months} months ({len(totals):,} rollup rows)\n")
+
+    start = time.perf_counter()
+    _, _, y = spend_matrix(totals)
+    matrix_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorised = np.hstack(
+        [
+            seasonal_naive(y, args.horizon, season),
+            exponential_smoothing(y, args.horizon, alpha),
+            linear_trend(y, args.horizon),
+        ]
+    )
+    models_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    forecast_spend(totals, args.horizon, alpha, season)
+    total_seconds = time.perf_counter() - start
+
+    sample = y[: args.sample]
+    start = time.perf_counter()
+    reference = loop_forecast(sample, args.horizon, alpha, season)
+    loop_seconds = (time.perf_counter() - start) * len(y) / len(sample)
+    same = np.allclose(reference, vectorised[: len(sample)])
+
+    print(f"{'Build matrix':<28} {matrix_seconds * 1000:>9.1f} ms")
+    print(f"{'Fit all models':<28} {models_seconds * 1000:>9.1f} ms")
+    print(f"{'forecast_spend end to end':<28} {total_seconds * 1000:>9.1f} ms")
+    print(f"{'Per-series loop (est.)':<28} {loop_seconds * 1000:>9.1f} ms")
+    print(f"\nMatches per-series loop: {'yes' if same else 'NO'}")
+    if not same:
+        raise SystemExit("Vectorised forecasts differ from the per-series loop")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,23 +2,51 @@
 data_processing/manual_categorisation.py
 """
 
+import multiprocessing
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
 import pandas as pd
 
+_worker_rules = None
+
+
+def compile_rules(rules: list[dict]) -> list[dict]:
+    """
+    Precompile the regex of every `contains` condition so the rules can be applied
+    to many DataFrames without rebuilding patterns. Already compiled rules are
+    returned unchanged.
+    """
+    compiled = []
+    for rule in rules:
+        conditions = []
+        for cond in rule["conditions"]:
+            if "contains" in cond and "pattern" not in cond:
+                pattern = r"|".join(re.escape(term.lower()) for term in cond["contains"])
+                cond = {**cond, "pattern": re.compile(pattern)}
+            conditions.append(cond)
+        compiled.append({**rule, "conditions": conditions})
+    return compiled
+
 
 def apply_categorisation_rules(df: pd.DataFrame, rules: list[dict]) -> pd.Series:
+    rules = compile_rules(rules)
     categories = pd.Series(index=df.index, dtype=object)
     subcategories = pd.Series(index=df.index, dtype=object)
+    lowered = {}  # text of each column matched by `contains`, lowercased once
 
     for rule in rules:
-        mask = pd.Series([True] * len(df))
+        mask = pd.Series(np.ones(len(df), dtype=bool), index=df.index)
 
         for cond in rule["conditions"]:
             col = cond["column"]
             if "contains" in cond:
-                terms = cond["contains"]
-                pattern = r"|".join(re.escape(term.lower()) for term in terms)
-                mask &= df[col].astype(str).str.lower().str.contains(pattern, na=False)
+                if col not in lowered:
+                    lowered[col] = df[col].astype(str).str.lower()
+                mask &= lowered[col].str.contains(cond["pattern"], na=False)
             elif "equals" in cond:
                 mask &= df[col] == cond["equals"]
             elif "gt" in cond:
@@ -31,3 +59,93 @@ def apply_categorisation_rules(df: pd.DataFrame, rules: list[dict]) -> pd.Series
             subcategories[mask] = rule["subcategory"]
 
     return pd.DataFrame({"Category": categories, "Subcategory": subcategories})
+
+
+def _init_worker(compiled_rules: list[dict]):
+    # Process pool initialiser: each worker receives the compiled rules once
+    # rather than with every block.
+    global _worker_rules
+    _worker_rules = compiled_rules
+
+
+def _categorise_block(block: pd.DataFrame) -> pd.DataFrame:
+    return apply_categorisation_rules(block, _worker_rules)
+
+
+def categorisation_pool(rules: list[dict], max_workers: int = None) -> ProcessPoolExecutor:
+    """
+    Process pool for `apply_categorisation_rules_chunked`, created once per run
+    and reused for every statement.
+
+    Workers are started with spawn rather than fork: statements are parsed on a
+    background thread meanwhile, and a forked worker could inherit a lock that
+    thread was holding.
+
+    Args:
+        rules (list[dict]): Categorisation rules, compiled once for every worker.
+        max_workers (int, optional): Worker processes; defaults to the CPU count.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers or os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(compile_rules(rules),),
+    )
+
+
+def apply_categorisation_rules_chunked(
+    df: pd.DataFrame,
+    rules: list[dict],
+    chunk_size: int = 100_000,
+    max_workers: int = None,
+    max_pending: int = None,
+    executor: ProcessPoolExecutor = None,
+) -> pd.DataFrame:
+    """
+    `apply_categorisation_rules` over blocks of rows on a process pool, for
+    backfills too large to categorise in one go.
+
+    Only the columns the rules read are sent to the workers, and at most
+    `max_pending` blocks are in flight, so the rule masks of a few blocks are
+    held in memory at a time. Rules apply to each row independently, so the
+    result is the same as categorising `df` in one process.
+
+    Args:
+        df (pd.DataFrame): Transactions to categorise.
+        rules (list[dict]): Categorisation rules, compiled once for every worker.
+        chunk_size (int): Rows per block.
+        max_workers (int, optional): Worker processes; defaults to the CPU count.
+        max_pending (int, optional): Blocks submitted but not yet collected;
+            defaults to twice the number of workers.
+        executor (ProcessPoolExecutor, optional): Pool from `categorisation_pool`
+            with the same rules, left running for the next statement. Without it
+            a pool is started for this call only.
+
+    Returns:
+        pd.DataFrame: Category and Subcategory for every row of `df`.
+    """
+    rules = compile_rules(rules)
+    if len(df) <= chunk_size:
+        return apply_categorisation_rules(df, rules)
+
+    columns = list(
+        dict.fromkeys(cond["column"] for rule in rules for cond in rule["conditions"])
+    )
+    max_pending = max_pending or 2 * (max_workers or os.cpu_count())
+    blocks = (
+        df.iloc[start : start + chunk_size][columns]
+        for start in range(0, len(df), chunk_size)
+    )
+    results = []
+    if executor is None:
+        pool = categorisation_pool(rules, max_workers)
+    else:
+        pool = nullcontext(executor)
+    with pool as executor:
+        pending = []
+        for block in blocks:
+            pending.append(executor.submit(_categorise_block, block))
+            if len(pending) >= max_pending:
+                results.append(pending.pop(0).result())
+        results += [future.result() for future in pending]
+    return pd.concat(results)
@@ -0,0 +1,163 @@
+"""
+categorisation/rule_preview.py
+
+Shows what a candidate rule would catch in the stored history without running
+the pipeline. The history is reduced once to a table of unique merchant names,
+with their row counts, totals, stored categories and the category the existing
+rules give them. It is small enough to match a rule against interactively
+however many transactions the history holds.
+"""
+
+import re
+
+import pandas as pd
+
+from categorisation.manual_categorisation import (
+    apply_categorisation_rules,
+    compile_rules,
+)
+
+MERCHANT_COLUMNS = ["Name", "Lower", "Rows", "Spend", "Income", "Stored", "Rule"]
+SHORT_TERM = 3  # terms this short are checked for matches inside other words
+
+
+def _label(category: pd.Series, subcategory: pd.Series) -> pd.Series:
+    category = category.fillna("").replace("", "Uncategorised")
+    subcategory = subcategory.fillna("")
+    return category.where(subcategory == "", category + " / " + subcategory)
+
+
+def build_merchant_table(history: pd.DataFrame, rules: list[dict] = ()) -> pd.DataFrame:
+    """
+    Unique merchant names of the history with everything a preview reports.
+
+    Args:
+        history (pd.DataFrame): Stored history from `load_history`.
+        rules (list[dict]): Existing rules; the category they give each name is
+            kept for the conflict check. Rules with conditions on other columns
+            than Name are left out, as the table has one row per name.
+
+    Returns:
+        pd.DataFrame: One row per name with the columns in `MERCHANT_COLUMNS`:
+        its lowercased text, row count, spend and income (both positive), the
+        stored categories of its rows and the category given by the rules.
+    """
+    amount = pd.to_numeric(history["Amount"]).fillna(0)
+    data = pd.DataFrame(
+        {
+            "Name": history["Name"].fillna("").astype(str),
+            "Stored": _label(history["Category"], history["Subcategory"]),
+            "Spend": -amount.clip(upper=0),
+            "Income": amount.clip(lower=0),
+        }
+    )
+    merchants = data.groupby("Name", as_index=False).agg(
+        Rows=("Spend", "size"), Spend=("Spend", "sum"), Income=("Income", "sum")
+    )
+    stored = (
+        data[["Name", "Stored"]]
+        .drop_duplicates()
+        .sort_values("Stored")
+        .groupby("Name")["Stored"]
+        .agg(", ".join)
+    )
+    merchants["Stored"] = merchants["Name"].map(stored)
+    merchants["Lower"] = merchants["Name"].str.lower()
+
+    existing = [
+        rule
+        for rule in compile_rules(list(rules))
+        if all(cond["column"] == "Name" for cond in rule["conditions"])
+    ]
+    by_rules = apply_categorisation_rules(merchants, existing)
+    merchants["Rule"] = _label(by_rules["Category"], by_rules["Subcategory"]).where(
+        by_rules["Category"].notna(), ""
+    )
+    return merchants[MERCHANT_COLUMNS]
+
+
+def preview_rule(merchants: pd.DataFrame, rule: dict) -> dict[str, pd.DataFrame]:
+    """
+    Match a candidate rule against the merchant table.
+
+    Args:
+        merchants (pd.DataFrame): From `build_merchant_table`.
+        rule (dict): Candidate rule, in the format of `categorisation_rules.py`,
+            with `contains` or `equals` conditions on Name; amounts and types
+            are not kept per merchant.
+
+    Returns:
+        dict[str, pd.DataFrame]: `matches` (matched merchants, most frequent
+        first), `conflicts` (matched merchants an existing rule puts in another
+        category) and `partial` (per short term, the merchants it only matches
+        inside a longer word).
+    """
+    candidate = compile_rules([rule])[0]
+    matched = pd.Series(True, index=merchants.index)
+    for cond in candidate["conditions"]:
+        if cond["column"] != "Name" or not ("contains" in cond or "equals" in cond):
+            raise ValueError(
+                "Only 'contains' and 'equals' conditions on Name can be previewed."
+            )
+        if "contains" in cond:
+            matched &= merchants["Lower"].str.contains(cond["pattern"])
+        else:
+            matched &= merchants["Name"] == cond["equals"]
+    matches = (
+        merchants[matched]
+        .sort_values("Rows", ascending=False, kind="stable")
+        .reset_index(drop=True)
+    )
+
+    new_label = _label(
+        pd.Series([rule["category"]]), pd.Series([rule.get("subcategory", "")])
+    )[0]
+    conflicts = matches[(matches["Rule"] != "") & (matches["Rule"] != new_label)]
+
+    partial = []
+    for cond in candidate["conditions"]:
+        for term in cond.get("contains", []):
+            term = term.strip().lower()
+            if len(term) > SHORT_TERM:
+                continue
+            anywhere = matches["Lower"].str.contains(re.escape(term))
+            whole_word = matches["Lower"].str.contains(rf"\b{re.escape(term)}\b")
+            inside = anywhere & ~whole_word
+            partial.append(matches.loc[inside, ["Name"]].assign(Term=term))
+    partial = pd.concat(partial, ignore_index=True) if partial else pd.DataFrame(
+        columns=["Name", "Term"]
+    )
+
+    return {
+        "matches": matches,
+        "conflicts": conflicts.reset_index(drop=True),
+        "partial": partial[["Term", "Name"]],
+    }
+
+
+def format_preview(preview: dict[str, pd.DataFrame], max_rows: int = 20) -> list[str]:
+    """Lines to print for a result of `preview_rule`."""
+    matches = preview["matches"]
+    lines = [f"{'Merchant':<32} {'Rows':>7} {'Spend':>11}  Stored category"]
+    lines += [
+        f"{row['Name'][:32]:<32} {row['Rows']:>7} {row['Spend']:>11.2f}  "
+        f"{row['Stored']}"
+        for _, row in matches.head(max_rows).iterrows()
+    ]
+    if len(matches) > max_rows:
+        lines.append(f"  ... and {len(matches) - max_rows} more")
+    lines.append(
+        f"{len(matches)} merchants, {int(matches['Rows'].sum())} rows, "
+        f"{matches['Spend'].sum():.2f} spend, {matches['Income'].sum():.2f} income"
+    )
+    for label, names in preview["conflicts"].groupby("Rule", sort=False)["Name"]:
+        lines.append(
+            f"[⚠️] {len(names)} merchants are already categorised as {label} by an "
+            f"existing rule, e.g. {', '.join(names.head(3))}"
+        )
+    for term, names in preview["partial"].groupby("Term", sort=False)["Name"]:
+        lines.append(
+            f"[⚠️] '{term}' only matches inside a longer word in {len(names)} "
+            f"merchants, e.g. {', '.join(names.head(3))}"
+        )
+    return lines
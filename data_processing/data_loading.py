@@ -5,7 +5,16 @@ data_processing/data_loading.py
 import os
 import yaml
 import pandas as pd
-from parser.csv_parser import retrieve_csv_filepaths, load_csv_statement
+from parser.csv_parser import (
+    CSV_ENGINES,
+    COMPRESSION_EXTENSIONS,
+    retrieve_csv_filepaths,
+    load_csv_statement,
+)
+from parser.pdf_parser import PDF_CACHE_DIR, retrieve_pdf_filepaths, load_pdf_statement
+from data_processing.stage_cache import file_digest, resolve, run_stage
+from parser.api_importer import load_api_statement
+from parser.format_registry import build_format_registry, route_statement
 
 
 def load_config(filepath="config.yaml"):
@@ -39,6 +48,42 @@ def load_path_variables(config: dict):
     return DATA_DIR, CSV_OUTPUT_PATH, EXCEL_OUTPUT_PATH
 
 
+def load_io_options(config: dict) -> tuple[str, str | None]:
+    """
+    Read the CSV engine and output compression from the `io` section of the config.
+
+    Args:
+        config (dict): Loaded configuration dictionary.
+
+    Returns:
+        tuple[str, str | None]: engine ('pandas' or 'pyarrow') and compression
+        (None, 'gzip' or 'zstd').
+    """
+    io_config = config.get("io", {})
+    engine = io_config.get("engine", "pandas")
+    compression = io_config.get("compression")
+    if compression in ("none", ""):
+        compression = None
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Unknown CSV engine '{engine}'. Choose from {CSV_ENGINES}")
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unknown compression '{compression}'")
+    return engine, compression
+
+
+def load_state_dir(config: dict) -> str:
+    """
+    Directory holding state carried between runs (detected series, running totals, ...).
+
+    Args:
+        config (dict): Loaded configuration dictionary.
+
+    Returns:
+        str: `state_folder` inside the data directory. Defaults to '.state'.
+    """
+    return os.path.join(config["data_dir"], config.get("state_folder", ".state"))
+
+
 def load_accounts_variables(config: dict):
     """
     Extract account information and map accounts to color values.
@@ -115,38 +160,203 @@ def check_dfs_not_empty(df_list: list[pd.DataFrame]):
             )
 
 
-def load_and_combine_csvs(
-    accounts: dict, data_dir: str, output_columns: list
-) -> tuple[pd.DataFrame, dict]:
+def retrieve_statement_filepaths(
+    accounts: dict, data_dir: str, inbox: str = None
+) -> dict[str, list[str]]:
     """
-    Load, parse, and combine CSV statements for multiple accounts.
+    List the statement files waiting in each account's directory (and the inbox).
+
+    CSV statements are routed by their header line before anything is parsed: a
+    file in an account's directory stays with that account when its columns match
+    the account's mapping, a misfiled statement moves to the one account whose
+    format it matches, and files matching no account or several are skipped with
+    a warning. Files in the shared `inbox` folder are routed the same way.
 
     Args:
-        accounts (dict): Dictionary of account names and their metadata (directory, mapping).
+        accounts (dict): Dictionary of account names and their metadata.
         data_dir (str): Base directory where account folders are stored.
-        output_columns (list): Desired column names for the final DataFrame.
+        inbox (str, optional): Folder, relative to `data_dir`, holding CSV
+            statements of any account.
 
     Returns:
-        tuple:
-            - Combined pandas DataFrame of all transactions
-            - Dictionary mapping account names to their CSV file paths
+        dict: Account name to the paths of its CSV or PDF statements.
     """
-    df_list = []
-    filepaths_dict = {}
-
+    registry = build_format_registry(accounts)
+    filepaths_dict = {account: [] for account in accounts}
+    candidates = []
     for account, details in accounts.items():
+        if details.get("format", "csv") == "api":
+            continue
         directory = os.path.join(data_dir, details["directory"])
-        filepaths = retrieve_csv_filepaths(directory)
-        filepaths_dict[account] = filepaths
+        if details.get("format", "csv") == "pdf":
+            filepaths_dict[account] = retrieve_pdf_filepaths(directory)
+        else:
+            candidates += [(path, account) for path in retrieve_csv_filepaths(directory)]
+    if inbox and os.path.isdir(os.path.join(data_dir, inbox)):
+        candidates += [
+            (path, None) for path in retrieve_csv_filepaths(os.path.join(data_dir, inbox))
+        ]
 
-        df_list.extend(
-            load_csv_statement(path, account, details["mapping"], output_columns)
-            for path in filepaths
-        )
+    for path, folder_account in candidates:
+        account, reason = route_statement(path, registry, folder_account)
+        if account is None:
+            print(f"[⚠️] Skipping {path}: {reason}. It is left in place, unprocessed")
+            continue
+        if folder_account and account != folder_account:
+            print(f"[↪️] {os.path.basename(path)} looks like a {account} statement")
+        filepaths_dict[account].append(path)
+    return filepaths_dict
+
+
+def iter_statements(
+    accounts: dict,
+    filepaths_dict: dict,
+    output_columns: list,
+    cache_dir: str,
+    engine: str = "pandas",
+    nrows: int = None,
+    cursors: dict = None,
+    stage_cache: dict = None,
+    read_only: bool = False,
+):
+    """
+    Parse statements one file at a time.
+
+    Accounts with `format: api` are fetched from their bank feed instead, starting
+    from their entry in `cursors`, which is then updated to the new cursor. Only
+    the first `nrows` transactions of each file are kept when given. With a
+    `stage_cache`, a file parsed before with the same settings is not parsed again.
+    With `read_only`, the PDF table cache is used but not added to.
+
+    Yields:
+        tuple[str, str, pd.DataFrame]: account name, file path (or feed URL) and
+        parsed statement.
+    """
+    if cursors is None:
+        cursors = {}
+    for account, details in accounts.items():
+        if details.get("format", "csv") == "api":
+            df, cursors[account] = load_api_statement(
+                account, details, output_columns, cursors.get(account), nrows
+            )
+            print(f"[📡] Fetched {len(df)} new transactions for {account}")
+            if not df.empty:
+                yield account, details["api"]["url"], df
+            continue
+        for path in filepaths_dict.get(account, []):
+
+            def parse():
+                if details.get("format", "csv") == "pdf":
+                    return load_pdf_statement(
+                        path,
+                        account,
+                        details["mapping"],
+                        output_columns,
+                        cache_dir,
+                        nrows,
+                        read_only,
+                    )
+                return load_csv_statement(
+                    path, account, details["mapping"], output_columns, engine, nrows
+                )
+
+            if stage_cache is None:
+                yield account, path, parse()
+                continue
+            parsed = run_stage(
+                stage_cache,
+                "parse",
+                parse,
+                {
+                    "file": file_digest(path),
+                    "account": account,
+                    "mapping": details["mapping"],
+                    "format": details.get("format", "csv"),
+                    "columns": output_columns,
+                    "engine": engine,
+                    "nrows": nrows,
+                },
+                version=2,
+                label=os.path.basename(path),
+            )
+            yield account, path, resolve(parsed)
+
+
+def is_newest_first(dates: pd.Series) -> bool:
+    """Whether a statement lists its transactions from the latest to the earliest."""
+    parsed = pd.to_datetime(dates, format="%d/%m/%Y", errors="coerce").dropna()
+    return len(parsed) > 1 and parsed.iloc[0] > parsed.iloc[-1]
+
+
+def combine_statements(
+    df_list: list[pd.DataFrame], columns: list = None
+) -> pd.DataFrame:
+    """
+    Concatenate parsed statements into one date-sorted DataFrame.
+
+    Statements listed newest first are reversed, and transactions on the same
+    day keep their statement order, so running balances follow on row by row.
+
+    Args:
+        df_list (list[pd.DataFrame]): Statements from `load_csv_statement` or `load_pdf_statement`.
+        columns (list, optional): Columns of the empty frame returned when there
+            are no statements, e.g. on a run that only syncs workbook edits.
+
+    Returns:
+        pd.DataFrame: All transactions, sorted by date.
+    """
+    if not df_list:
+        empty = pd.DataFrame(columns=columns or ["Date"])
+        empty["Date"] = pd.to_datetime(empty["Date"])
+        return empty
     check_dfs_not_empty(df_list)
 
+    df_list = [
+        df.iloc[::-1] if is_newest_first(df["Date"]) else df for df in df_list
+    ]
     combined_df = pd.concat(df_list, ignore_index=True)
     combined_df["Date"] = pd.to_datetime(combined_df["Date"], format="%d/%m/%Y")
-    combined_df.sort_values(by="Date", inplace=True)
+    combined_df.sort_values(by="Date", kind="stable", inplace=True)
     combined_df.reset_index(drop=True, inplace=True)
-    return combined_df, filepaths_dict
+    return combined_df
+
+
+def load_and_combine_csvs(
+    accounts: dict,
+    data_dir: str,
+    output_columns: list,
+    cache_dir: str = None,
+    engine: str = "pandas",
+    inbox: str = None,
+    cursors: dict = None,
+) -> tuple[pd.DataFrame, dict]:
+    """
+    Load, parse, and combine CSV or PDF statements for multiple accounts.
+
+    Args:
+        accounts (dict): Dictionary of account names and their metadata (directory,
+            mapping and optional format, 'csv', 'pdf' or 'api').
+        data_dir (str): Base directory where account folders are stored.
+        output_columns (list): Desired column names for the final DataFrame.
+        cache_dir (str, optional): Where extracted PDF tables are cached.
+            Defaults to '.cache/pdf' inside `data_dir`.
+        engine (str): CSV engine, 'pandas' or 'pyarrow'.
+        inbox (str, optional): Shared folder of CSV statements routed by header.
+        cursors (dict, optional): Bank feed cursors per API account, updated in
+            place; store them once the transactions are written out.
+
+    Returns:
+        tuple:
+            - Combined pandas DataFrame of all transactions
+            - Dictionary mapping account names to their statement file paths
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(data_dir, PDF_CACHE_DIR)
+    filepaths_dict = retrieve_statement_filepaths(accounts, data_dir, inbox)
+    df_list = [
+        df
+        for _, _, df in iter_statements(
+            accounts, filepaths_dict, output_columns, cache_dir, engine, cursors=cursors
+        )
+    ]
+    return combine_statements(df_list), filepaths_dict
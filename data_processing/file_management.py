@@ -3,18 +3,55 @@ data_processing/file_management.py
 """
 
 import os
+import gzip
+import json
+import errno
 import shutil
-import datetime
+import tempfile
 import pandas as pd
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from parser.csv_parser import COMPRESSION_EXTENSIONS
+from parser.pdf_parser import PDF_CACHE_DIR, load_cached_tables, tables_to_dataframe
 
+# Written at the root of the archive folder; one JSON line per archived file.
+JOURNAL_FILENAME = "journal.jsonl"
 
-def check_file_month(file_path: str, date_columns=None) -> str:
+
+@contextmanager
+def atomic_write(path: str):
+    """
+    Yield a temporary path next to `path` and rename it over `path` on success.
+
+    A crash or exception while writing leaves any existing file untouched and
+    never exposes a partially written one.
+    """
+    directory, filename = os.path.split(os.path.abspath(path))
+    name, ext = os.path.splitext(filename)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=ext, dir=directory)
+    os.close(fd)
+    try:
+        yield tmp_path
+        # mkstemp creates owner-only files; keep the permissions of the file we replace
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def check_file_month(file_path: str, date_columns=None, cache_dir=None) -> str:
     """
-    Reads a CSV or Excel file and returns the earliest month (YYYY-MM) found in the specified date columns.
+    Reads a CSV, Excel or PDF file and returns the earliest month (YYYY-MM) found in the specified date columns.
 
     Parameters:
         file_path (str): Path to the file.
         date_columns (list[str], optional): List of possible date column names to check. Defaults to ["Date", "Transaction Date"].
+        cache_dir (str, optional): PDF extraction cache, so PDFs are not parsed a second time.
 
     Returns:
         str: Earliest month in 'YYYY-MM' format.
@@ -31,6 +68,8 @@ def check_file_month(file_path: str, date_columns=None) -> str:
         df = pd.read_csv(file_path)
     elif ext in [".xls", ".xlsx"]:
         df = pd.read_excel(file_path)
+    elif ext == ".pdf" and cache_dir:
+        df = tables_to_dataframe(load_cached_tables(file_path, cache_dir))
     else:
         raise ValueError(f"Unsupported file type: {ext}")
 
@@ -56,49 +95,245 @@ def check_file_month(file_path: str, date_columns=None) -> str:
     return month_str
 
 
-def archive_file(file_path: str, account: str, archive_dir: str):
+def move_file(src: str, dst: str, move: bool = True) -> None:
+    """
+    Move a file with a single rename when possible.
+
+    Falls back to copy-then-delete when `src` and `dst` are on different devices,
+    or always when `move` is False.
+    """
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    if move:
+        try:
+            os.rename(src, dst)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    shutil.copy2(src, dst)
+    os.remove(src)
+
+
+def open_compressed(path: str, mode: str, compression: str):
+    """Open a gzip or zstd file as a binary stream."""
+    if compression == "gzip":
+        return gzip.open(path, mode)
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.open(path, mode)
+    raise ValueError(f"Unknown compression '{compression}'")
+
+
+def compress_file(src: str, dst: str, compression: str) -> None:
+    """Write a compressed copy of `src` to `dst`, then delete `src`."""
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    with open(src, "rb") as f_in, open_compressed(dst, "wb", compression) as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(src)
+
+
+def decompress_file(src: str, dst: str, compression: str) -> None:
+    """Inverse of `compress_file`."""
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    with open_compressed(src, "rb", compression) as f_in, open(dst, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(src)
+
+
+def append_to_journal(
+    journal_path: str, original: str, archived: str, compression: str = None
+) -> None:
+    """Record a move so that `replay_archive_journal` can undo it."""
+    entry = {"original": original, "archived": archived}
+    if compression:
+        entry["compression"] = compression
+    with open(journal_path, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def archive_file(
+    file_path: str,
+    account: str,
+    archive_dir: str,
+    cache_dir=None,
+    journal_path: str = None,
+    base_dir: str = None,
+    compression: str = None,
+):
     if not os.path.exists(archive_dir):
         os.makedirs(archive_dir)
 
-    month = check_file_month(file_path)
+    month = check_file_month(file_path, cache_dir=cache_dir)
     filename = os.path.basename(file_path)
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    archived_name = f"{account}_{month}.csv"
+    ext = os.path.splitext(filename)[1].lower() + COMPRESSION_EXTENSIONS[compression]
+    archived_name = f"{account}_{month}{ext}"
     archived_path = os.path.join(archive_dir, archived_name)
 
-    shutil.move(file_path, archived_path)
+    # Never overwrite an earlier statement for the same month
+    suffix = 1
+    while os.path.exists(archived_path):
+        archived_name = f"{account}_{month}_{suffix}{ext}"
+        archived_path = os.path.join(archive_dir, archived_name)
+        suffix += 1
+
+    if compression:
+        compress_file(file_path, archived_path, compression)
+    else:
+        move_file(file_path, archived_path)
+    if journal_path:
+        base_dir = base_dir or os.path.dirname(journal_path)
+        append_to_journal(
+            journal_path,
+            os.path.relpath(file_path, base_dir),
+            os.path.relpath(archived_path, base_dir),
+            compression,
+        )
     print(f"[📁] Archived {filename} → {archived_name}")
 
 
 def archive_processed_files(
-    accounts: dict, filepaths_dict: dict, data_dir: str, archive_folder: str
+    accounts: dict,
+    filepaths_dict: dict,
+    data_dir: str,
+    archive_folder: str,
+    cache_dir: str = None,
+    compression: str = None,
 ):
     if not archive_folder:
         return
+    if cache_dir is None:
+        cache_dir = os.path.join(data_dir, PDF_CACHE_DIR)
+    journal_path = os.path.join(data_dir, archive_folder, JOURNAL_FILENAME)
+    os.makedirs(os.path.dirname(journal_path), exist_ok=True)
     for account, details in accounts.items():
         for file in filepaths_dict.get(account, []):
             dir_name = details["directory"]
             archive_directory = os.path.join(data_dir, archive_folder, dir_name)
-            archive_file(file, account, archive_directory)
+            archive_file(
+                file,
+                account,
+                archive_directory,
+                cache_dir,
+                journal_path,
+                data_dir,
+                compression,
+            )
+
+
+def replay_archive_journal(
+    journal_path: str, base_dir: str, move: bool = True, max_workers: int = 8
+) -> int:
+    """
+    Return every journalled file to the exact path it was archived from.
+
+    Files are restored concurrently, except that entries sharing an original path
+    are restored one after another, so a later one never overwrites an earlier
+    one. Entries that cannot be restored (for example because a file already
+    exists at the original path) are kept in the journal so the reset can be
+    retried; the journal is removed once it is empty.
+
+    Args:
+        journal_path (str): Path to the archive journal.
+        base_dir (str): Directory the journalled paths are relative to.
+        move (bool): If True, files are renamed. If False, they are copied then deleted.
+        max_workers (int): Number of concurrent restores.
+
+    Returns:
+        int: Number of files restored.
+    """
+    with open(journal_path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+
+    def restore(entry: dict) -> bool:
+        src = os.path.join(base_dir, entry["archived"])
+        dst = os.path.join(base_dir, entry["original"])
+        if not os.path.exists(src):
+            print(f"[⚠️] {entry['archived']} is missing from the archive, skipping")
+            return True
+        if os.path.exists(dst):
+            print(f"[⚠️] {entry['original']} already exists, leaving it archived")
+            return False
+        if entry.get("compression"):
+            decompress_file(src, dst, entry["compression"])
+        else:
+            move_file(src, dst, move)
+        return True
+
+    # The exists check and the restore are not atomic, so each destination is
+    # only ever handled by one worker
+    by_destination = {}
+    for entry in entries:
+        by_destination.setdefault(os.path.normpath(entry["original"]), []).append(entry)
+
+    def restore_serially(group: list[dict]) -> list[bool]:
+        return [restore(entry) for entry in group]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(restore_serially, by_destination.values())
+        restored = {
+            id(entry): done
+            for group, group_done in zip(by_destination.values(), results)
+            for entry, done in zip(group, group_done)
+        }
+
+    remaining = [entry for entry in entries if not restored[id(entry)]]
+    if remaining:
+        with open(journal_path, "w") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in remaining)
+    else:
+        os.remove(journal_path)
+    return len(entries) - len(remaining)
+
+
+def merge_folder(src_path: str, dest_path: str, move: bool = True) -> None:
+    """Merge the contents of `src_path` into `dest_path`, then remove `src_path`."""
+    if move and not os.path.exists(dest_path):
+        try:
+            os.rename(src_path, dest_path)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    for root, _, files in os.walk(src_path):
+        target_dir = os.path.join(dest_path, os.path.relpath(root, src_path))
+        for file in files:
+            move_file(os.path.join(root, file), os.path.join(target_dir, file), move)
+    shutil.rmtree(src_path)
 
 
 def unarchive_processed_folders(
     archive_dir: str, destination_dir: str, move: bool = True
-):
+) -> bool:
     """
-    Move or copy entire folders from `archive_dir` to `destination_dir`, and ensure
+    Restore archived statements from `archive_dir` to `destination_dir`, and ensure
     nothing remains in the archive afterwards.
 
+    Files recorded in the archive journal are returned to their original paths and
+    names. Anything archived before the journal existed is merged back folder by folder.
+
     Args:
         archive_dir (str): The archive directory containing folders to restore.
         destination_dir (str): The location to move or copy the folders to.
-        move (bool): If True, folders will be moved. If False, folders will be copied.
+        move (bool): If True, files will be moved. If False, files will be copied.
+
+    Returns:
+        bool: False when some journalled files could not be restored; they stay
+        archived, and nothing else is restored, so the reset can be retried.
     """
     if not os.path.exists(archive_dir):
         raise FileNotFoundError(f"Archive directory does not exist: {archive_dir}")
 
     os.makedirs(destination_dir, exist_ok=True)
 
+    journal_path = os.path.join(archive_dir, JOURNAL_FILENAME)
+    if os.path.exists(journal_path):
+        restored = replay_archive_journal(journal_path, destination_dir, move)
+        print(f"[📥] Restored {restored} journalled files to their original paths")
+        if os.path.exists(journal_path):
+            print(f"[⚠️] Some files could not be restored, see {journal_path}")
+            return False
+
     for folder_name in os.listdir(archive_dir):
         src_path = os.path.join(archive_dir, folder_name)
         dest_path = os.path.join(destination_dir, folder_name)
@@ -106,63 +341,6 @@ def unarchive_processed_folders(
         if not os.path.isdir(src_path):
             continue  # Skip files
 
-        if move:
-            if not os.path.exists(dest_path):
-                shutil.move(src_path, dest_path)
-                print(f"[📁] Moved {folder_name} → {dest_path}")
-            elif os.path.isdir(dest_path) and not os.listdir(dest_path):
-                os.rmdir(dest_path)
-                shutil.move(src_path, dest_path)
-                print(f"[♻️] Replaced empty {folder_name} → {dest_path}")
-            else:
-                # Destination exists and has content — merge then delete
-                for item in os.listdir(src_path):
-                    src_item = os.path.join(src_path, item)
-                    dest_item = os.path.join(dest_path, item)
-
-                    if os.path.isdir(src_item):
-                        if not os.path.exists(dest_item):
-                            shutil.copytree(src_item, dest_item)
-                        else:
-                            for root, _, files in os.walk(src_item):
-                                rel_path = os.path.relpath(root, src_path)
-                                target_dir = os.path.join(dest_path, rel_path)
-                                os.makedirs(target_dir, exist_ok=True)
-                                for file in files:
-                                    shutil.copy2(
-                                        os.path.join(root, file),
-                                        os.path.join(target_dir, file),
-                                    )
-                    else:
-                        shutil.copy2(src_item, dest_item)
-
-                shutil.rmtree(src_path)  # Ensure the archive folder is removed
-                print(f"[📥] Merged and removed {folder_name} from archive")
-        else:
-            # Copy mode: copy entire folder contents, then delete the archive folder
-            if not os.path.exists(dest_path):
-                shutil.copytree(src_path, dest_path)
-                print(f"[📁] Copied {folder_name} → {dest_path}")
-            else:
-                for item in os.listdir(src_path):
-                    src_item = os.path.join(src_path, item)
-                    dest_item = os.path.join(dest_path, item)
-
-                    if os.path.isdir(src_item):
-                        if not os.path.exists(dest_item):
-                            shutil.copytree(src_item, dest_item)
-                        else:
-                            for root, _, files in os.walk(src_item):
-                                rel_path = os.path.relpath(root, src_path)
-                                target_dir = os.path.join(dest_path, rel_path)
-                                os.makedirs(target_dir, exist_ok=True)
-                                for file in files:
-                                    shutil.copy2(
-                                        os.path.join(root, file),
-                                        os.path.join(target_dir, file),
-                                    )
-                    else:
-                        shutil.copy2(src_item, dest_item)
-
-                shutil.rmtree(src_path)
-                print(f"[📥] Copied and removed {folder_name} from archive")
+        merge_folder(src_path, dest_path, move)
+        print(f"[📥] Restored {folder_name} → {dest_path}")
+    return True
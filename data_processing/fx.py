@@ -0,0 +1,105 @@
+"""
+data_processing/fx.py
+"""
+
+import os
+from functools import lru_cache
+
+import pandas as pd
+
+
+@lru_cache(maxsize=8)
+def _read_fx_rates(path: str, mtime: float) -> pd.DataFrame:
+    rates = pd.read_csv(path)
+    rates["Date"] = pd.to_datetime(rates["Date"], format="%Y-%m-%d")
+    rates["Currency"] = rates["Currency"].str.upper()
+    return rates.sort_values("Date").reset_index(drop=True)
+
+
+def load_fx_rates(path: str) -> pd.DataFrame:
+    """
+    Load a local FX rates file.
+
+    The file is a CSV with `Date` (YYYY-MM-DD), `Currency` and `Rate` columns, where
+    `Rate` is the amount of base currency bought by one unit of `Currency`. The
+    parsed table is cached until the file is modified.
+
+    Args:
+        path (str): Path to the rates CSV.
+
+    Returns:
+        pd.DataFrame: Rates sorted by date.
+    """
+    return _read_fx_rates(path, os.path.getmtime(path))
+
+
+def account_currencies(accounts: dict, base_currency: str) -> dict[str, str]:
+    """Map each account to its configured currency, defaulting to the base currency."""
+    return {
+        account: details.get("currency", base_currency).upper()
+        for account, details in accounts.items()
+    }
+
+
+def convert_to_base_currency(
+    df: pd.DataFrame,
+    currencies: dict[str, str],
+    base_currency: str,
+    rates: pd.DataFrame = None,
+) -> pd.DataFrame:
+    """
+    Convert amounts to the base currency using the most recent rate on or before
+    each transaction date.
+
+    The original amount and its currency are kept in the `Original Amount` and
+    `Currency` columns; `Amount`, `Amount In` and `Amount Out` are converted.
+
+    Args:
+        df (pd.DataFrame): Transactions with `Date`, `Account` and amount columns.
+        currencies (dict[str, str]): Account name to currency code.
+        base_currency (str): Currency all amounts are converted to.
+        rates (pd.DataFrame, optional): Table from `load_fx_rates`. Only needed if
+            any account is not in the base currency.
+
+    Returns:
+        pd.DataFrame: `df` with converted amounts.
+
+    Raises:
+        ValueError: If a foreign transaction has no rate on or before its date.
+    """
+    base_currency = base_currency.upper()
+    df["Currency"] = df["Account"].map(currencies).fillna(base_currency)
+    df["Original Amount"] = df["Amount"]
+
+    foreign = df["Currency"] != base_currency
+    if not foreign.any():
+        return df
+    if rates is None:
+        raise ValueError("Accounts in foreign currencies need an fx_rates file.")
+
+    lookup = pd.DataFrame(
+        {
+            "Date": pd.to_datetime(df.loc[foreign, "Date"], format="%d/%m/%Y"),
+            "Currency": df.loc[foreign, "Currency"],
+            "Row": df.index[foreign],
+        }
+    ).sort_values("Date")
+    matched = pd.merge_asof(
+        lookup, rates[["Date", "Currency", "Rate"]], on="Date", by="Currency"
+    )
+
+    missing = matched[matched["Rate"].isna()]
+    if not missing.empty:
+        first = missing.iloc[0]
+        raise ValueError(
+            f"No {first['Currency']} rate on or before {first['Date']:%Y-%m-%d} "
+            f"({len(missing)} transactions without a rate)."
+        )
+
+    rate = pd.Series(matched["Rate"].to_numpy(), index=matched["Row"].to_numpy())
+    for col in ("Amount", "Amount In", "Amount Out"):
+        if col in df.columns:
+            df.loc[foreign, col] = (
+                pd.to_numeric(df.loc[foreign, col]) * rate
+            ).round(2)
+    return df
@@ -0,0 +1,201 @@
+"""
+data_processing/history.py
+
+Every processed transaction is kept in a history table in the state directory,
+identified by a fingerprint of the fields a statement supplies (so it survives
+the round trip through the Excel workbook). Manual category corrections are
+stored separately as overrides keyed by the same fingerprint.
+"""
+
+import numpy as np
+import pandas as pd
+
+from data_processing.state import load_state_table, save_state_table
+
+FINGERPRINT_COLUMNS = ["Date", "Time", "Account", "Name", "Amount"]
+HISTORY_COLUMNS = [
+    "Fingerprint",
+    "Date",
+    "Time",
+    "Account",
+    "Name",
+    "Amount",
+    "Category",
+    "Subcategory",
+    "Transfer ID",
+]
+OVERRIDE_COLUMNS = ["Fingerprint", "Category", "Subcategory"]
+
+
+def _identity(df: pd.DataFrame) -> pd.DataFrame:
+    # Normalised so values read back from Excel hash like the parsed statement
+    return pd.DataFrame(
+        {
+            "Date": pd.to_datetime(df["Date"]).dt.strftime("%Y-%m-%d"),
+            "Time": df["Time"].fillna("").astype(str).str.strip()
+            if "Time" in df.columns
+            else "",
+            "Account": df["Account"].fillna("").astype(str),
+            "Name": df["Name"].fillna("").astype(str).str.strip(),
+            "Amount": pd.to_numeric(df["Amount"]).astype(float).round(2),
+        },
+        index=df.index,
+    )
+
+
+def fingerprint_rows(df: pd.DataFrame, history: pd.DataFrame = None) -> pd.Series:
+    """
+    Stable identifier for each transaction.
+
+    Identical transactions (same day, account, name and amount) are told apart by
+    their occurrence, counted on from the ones already in `history`.
+
+    Args:
+        df (pd.DataFrame): Transactions with `FINGERPRINT_COLUMNS` (Time optional).
+        history (pd.DataFrame, optional): Stored history the rows are added to.
+
+    Returns:
+        pd.Series: Hex fingerprint per row of `df`.
+    """
+    if df.empty:
+        return pd.Series(dtype=object, index=df.index)
+    base = pd.util.hash_pandas_object(_identity(df), index=False)
+    occurrence = base.groupby(base.to_numpy()).cumcount()
+    if history is not None and not history.empty:
+        seen = (
+            pd.util.hash_pandas_object(_identity(history), index=False)
+            .value_counts()
+        )
+        occurrence += base.map(seen).fillna(0).astype(np.int64)
+    digest = pd.util.hash_pandas_object(
+        pd.DataFrame({"Base": base.to_numpy(), "Occurrence": occurrence.to_numpy()}),
+        index=False,
+    )
+    return pd.Series(digest.map("{:016x}".format).to_numpy(), index=df.index)
+
+
+def load_history(path: str) -> pd.DataFrame:
+    history = load_state_table(path, HISTORY_COLUMNS, date_columns=["Date"])
+    history[["Category", "Subcategory"]] = history[["Category", "Subcategory"]].fillna("")
+    return history
+
+
+def append_history(history: pd.DataFrame, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add newly processed transactions (already fingerprinted) to the history.
+
+    The history is kept sorted by date so a date window can be found by binary
+    search (see `split_window`).
+    """
+    new = df.reindex(columns=HISTORY_COLUMNS)
+    new = new[~new["Fingerprint"].isin(history["Fingerprint"])]
+    combined = new if history.empty else pd.concat([history, new], ignore_index=True)
+    return combined.sort_values("Date", kind="stable").reset_index(drop=True)
+
+
+def split_window(
+    history: pd.DataFrame,
+    accounts: list[str],
+    since: pd.Timestamp,
+    until: pd.Timestamp,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Separate the stored transactions of `accounts` dated within a window.
+
+    Args:
+        history (pd.DataFrame): Stored history.
+        accounts (list[str]): Accounts whose transactions are replaced.
+        since (pd.Timestamp): First day of the window.
+        until (pd.Timestamp): Last day of the window (inclusive).
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: The history without the window, sorted
+        by date, and the transactions in it.
+    """
+    if not history["Date"].is_monotonic_increasing:
+        history = history.sort_values("Date", kind="stable").reset_index(drop=True)
+    start = history["Date"].searchsorted(since, side="left")
+    end = history["Date"].searchsorted(until, side="right")
+    window = history.iloc[start:end]
+    in_window = window["Account"].isin(accounts)
+    removed = window[in_window]
+    kept = pd.concat(
+        [history.iloc[:start], window[~in_window], history.iloc[end:]],
+        ignore_index=True,
+    )
+    return kept, removed.reset_index(drop=True)
+
+
+def save_history(history: pd.DataFrame, path: str) -> None:
+    save_state_table(history, path)
+
+
+def load_overrides(path: str) -> pd.DataFrame:
+    return load_state_table(path, OVERRIDE_COLUMNS).fillna("")
+
+
+def save_overrides(overrides: pd.DataFrame, path: str) -> None:
+    save_state_table(overrides, path)
+
+
+def update_overrides(overrides: pd.DataFrame, changes: pd.DataFrame) -> pd.DataFrame:
+    """Record corrected categories, replacing earlier overrides of the same rows."""
+    combined = pd.concat([overrides, changes[OVERRIDE_COLUMNS]], ignore_index=True)
+    return combined.drop_duplicates("Fingerprint", keep="last").reset_index(drop=True)
+
+
+def apply_overrides(df: pd.DataFrame, overrides: pd.DataFrame) -> pd.DataFrame:
+    """
+    Replace the rule-based categories of overridden rows.
+
+    Args:
+        df (pd.DataFrame): Transactions with `Fingerprint`, `Category` and `Subcategory`.
+        overrides (pd.DataFrame): From `load_overrides`.
+
+    Returns:
+        pd.DataFrame: Category and Subcategory for every row of `df`.
+    """
+    categories = df[["Category", "Subcategory"]].copy()
+    if overrides.empty:
+        return categories
+    corrected = overrides.set_index("Fingerprint")
+    mask = df["Fingerprint"].isin(corrected.index)
+    categories.loc[mask] = corrected.loc[
+        df.loc[mask, "Fingerprint"], ["Category", "Subcategory"]
+    ].to_numpy()
+    return categories
+
+
+def find_category_edits(history: pd.DataFrame, sheet: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rows whose category was changed by hand in the workbook.
+
+    Args:
+        history (pd.DataFrame): Stored history.
+        sheet (pd.DataFrame): Fingerprint, Category and Subcategory of every
+            workbook row, e.g. from `read_master_data_categories`.
+
+    Returns:
+        pd.DataFrame: The changed history rows with their previous categories and
+        the edited `New Category` / `New Subcategory`.
+    """
+    edited = sheet.rename(
+        columns={"Category": "New Category", "Subcategory": "New Subcategory"}
+    )
+    merged = history.merge(edited, on="Fingerprint", how="inner")
+    changed = (merged["Category"] != merged["New Category"]) | (
+        merged["Subcategory"] != merged["New Subcategory"]
+    )
+    return merged[changed].reset_index(drop=True)
+
+
+def apply_category_edits(history: pd.DataFrame, edits: pd.DataFrame) -> pd.DataFrame:
+    """Write edited categories into the history, touching only the edited rows."""
+    if edits.empty:
+        return history
+    new = edits.set_index("Fingerprint")[["New Category", "New Subcategory"]]
+    mask = history["Fingerprint"].isin(new.index)
+    history.loc[mask, ["Category", "Subcategory"]] = new.loc[
+        history.loc[mask, "Fingerprint"]
+    ].to_numpy()
+    return history
@@ -0,0 +1,82 @@
+"""
+data_processing/pipeline.py
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_DONE = object()
+
+
+def prefetch(iterable, depth: int = 1):
+    """
+    Iterate over `iterable` while a background thread produces the next items.
+
+    Used so that parsing statement N+1 overlaps whatever the caller does with
+    statement N. Exceptions raised by the producer are re-raised in the caller.
+
+    Args:
+        iterable: Any iterable, typically a generator of parsed statements.
+        depth (int): How many items may be produced ahead of the consumer.
+
+    Yields:
+        The items of `iterable`, in order.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                buffer.put((item, None))
+        except BaseException as e:
+            buffer.put((None, e))
+            return
+        buffer.put((_DONE, None))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        # Unblock the producer if the consumer stopped early
+        stop.set()
+        while producer.is_alive():
+            try:
+                buffer.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def run_concurrently(tasks: dict) -> dict[str, float]:
+    """
+    Run independent stages on their own threads and wait for all of them.
+
+    Args:
+        tasks (dict): Stage name to a zero-argument callable.
+
+    Returns:
+        dict[str, float]: Seconds taken by each stage.
+
+    Raises:
+        Exception: The first error raised by any stage, after every stage has finished.
+    """
+
+    def timed(task):
+        start = time.perf_counter()
+        task()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=len(tasks) or 1) as executor:
+        futures = {name: executor.submit(timed, task) for name, task in tasks.items()}
+    return {name: future.result() for name, future in futures.items()}
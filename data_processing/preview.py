@@ -0,0 +1,77 @@
+"""
+data_processing/preview.py
+
+Summary printed by a dry run: how the parsed transactions would be
+categorised, compared with what the history already records for them.
+"""
+
+import pandas as pd
+
+
+def _label(category, subcategory) -> str:
+    category = category if isinstance(category, str) and category else "Uncategorised"
+    if isinstance(subcategory, str) and subcategory:
+        return f"{category} / {subcategory}"
+    return category
+
+
+def preview_changes(
+    df: pd.DataFrame, history: pd.DataFrame, max_rows: int = 50
+) -> list[str]:
+    """
+    Diff-style lines describing the categorised transactions.
+
+    Rows not seen before are listed with `+`, rows already in the history whose
+    category would change with `~` (old → new), and unchanged rows are counted.
+
+    Args:
+        df (pd.DataFrame): Parsed and categorised transactions, with the
+            `Fingerprint` the run gave them (counted on from the history, so a
+            repeat of a stored transaction shows as new, as it would be stored).
+        history (pd.DataFrame): Stored history from `load_history`.
+        max_rows (int): Maximum number of transactions listed.
+
+    Returns:
+        list[str]: Lines to print.
+    """
+    previous = history.set_index("Fingerprint")[["Category", "Subcategory"]]
+    fingerprints = df["Fingerprint"]
+    known = fingerprints.isin(previous.index)
+    old = previous.reindex(fingerprints).set_axis(df.index).fillna("")
+    changed = known & (
+        (df["Category"].fillna("") != old["Category"])
+        | (df["Subcategory"].fillna("") != old["Subcategory"])
+    )
+
+    lines = []
+    listed = df[~known | changed]
+    for index, row in listed.head(max_rows).iterrows():
+        new_label = _label(row["Category"], row["Subcategory"])
+        prefix = (
+            f"{row['Date']:%d/%m/%Y}  {row['Account']:<12} "
+            f"{str(row['Name'])[:30]:<30} {row['Amount']:>10.2f}  "
+        )
+        if changed[index]:
+            old_label = _label(old.at[index, "Category"], old.at[index, "Subcategory"])
+            lines.append(f"~ {prefix}{old_label} → {new_label}")
+        else:
+            lines.append(f"+ {prefix}{new_label}")
+    if len(listed) > max_rows:
+        lines.append(f"  ... and {len(listed) - max_rows} more")
+    lines.append(
+        f"{(~known).sum()} new, {changed.sum()} recategorised, "
+        f"{(known & ~changed).sum()} unchanged"
+    )
+
+    by_category = (
+        df.assign(Label=[_label(c, s) for c, s in zip(df["Category"], df["Subcategory"])])
+        .groupby("Label")["Amount"]
+        .agg(["size", "sum"])
+        .sort_values("size", ascending=False)
+    )
+    lines.append("By category:")
+    lines += [
+        f"  {label:<40} {int(row['size']):>6} rows {row['sum']:>12.2f}"
+        for label, row in by_category.iterrows()
+    ]
+    return lines
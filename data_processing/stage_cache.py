@@ -0,0 +1,207 @@
+"""
+data_processing/stage_cache.py
+
+Content-addressed cache for the stages of a run. A stage declares its inputs;
+its key is a hash of the stage name, version and inputs, where an input that is
+the result of an earlier stage contributes that stage's key. Results are pickled
+under the key, so a stage is only recomputed when something it depends on
+changed, and a cached result is only loaded when it is actually used.
+
+Stages whose job is to write files declare them as outputs instead; they count
+as cached while the files still have the content they were written with.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+import pandas as pd
+
+from data_processing.file_management import atomic_write
+
+STAGE_CACHE_DIR = os.path.join(".cache", "stages")
+
+
+def open_stage_cache(
+    cache_dir: str, enabled: bool = True, keep: int = 64, read_only: bool = False
+) -> dict:
+    """
+    Create the cache shared by the stages of one run.
+
+    Args:
+        cache_dir (str): Where results are stored, one folder per stage.
+        enabled (bool): When False every stage is computed and nothing is stored.
+        keep (int): Results kept per stage; the least recently used are removed.
+        read_only (bool): Reuse stored results but leave the cache untouched:
+            nothing is stored, pruned or marked as recently used.
+    """
+    return {
+        "dir": cache_dir,
+        "enabled": enabled,
+        "keep": keep,
+        "read_only": read_only,
+        "log": [],
+        "lock": threading.Lock(),
+    }
+
+
+def file_digest(path: str) -> str | None:
+    """SHA-256 of a file's content, or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _digest(value) -> str:
+    if isinstance(value, dict) and "key" in value and "load" in value:
+        return value["key"]
+    if isinstance(value, pd.DataFrame):
+        rows = pd.util.hash_pandas_object(value, index=True).to_numpy()
+        header = json.dumps([list(map(str, value.columns)), list(map(str, value.dtypes))])
+        return hashlib.sha256(header.encode() + rows.tobytes()).hexdigest()
+    if isinstance(value, pd.Series):
+        return _digest(value.to_frame())
+    if isinstance(value, (list, tuple)):
+        return hashlib.sha256(
+            "\x1f".join(_digest(item) for item in value).encode()
+        ).hexdigest()
+    if isinstance(value, dict):
+        return hashlib.sha256(
+            "\x1f".join(
+                f"{key}={_digest(item)}" for key, item in sorted(value.items())
+            ).encode()
+        ).hexdigest()
+    return hashlib.sha256(json.dumps(value, default=repr).encode()).hexdigest()
+
+
+def resolve(value):
+    """The value of a stage result (loading it if cached), or `value` itself."""
+    if isinstance(value, dict) and "key" in value and "load" in value:
+        return value["load"]()
+    if isinstance(value, list):
+        return [resolve(item) for item in value]
+    return value
+
+
+def run_stage(
+    cache: dict,
+    name: str,
+    compute,
+    inputs: dict,
+    version: int = 1,
+    outputs: list[str] = (),
+    label: str = None,
+    keep: int = None,
+) -> dict:
+    """
+    Compute a stage, or reuse its result if its inputs have not changed.
+
+    Args:
+        cache (dict): From `open_stage_cache`.
+        name (str): Stage name; results of different stages never collide.
+        compute: Called without arguments to produce the result; it should
+            `resolve` the results of other stages it uses.
+        inputs (dict): Everything the result depends on. Values may be results of
+            other stages, DataFrames, lists or anything JSON serialisable.
+        version (int): Bump when the stage's code changes its result.
+        outputs (list[str]): Files written by `compute`. When given, the result is
+            not stored; the stage is cached while the files are unchanged.
+        label (str, optional): Shown in the explain report, e.g. the statement.
+        keep (int, optional): Results kept for this stage, instead of the cache's
+            default. Stages holding the whole dataset keep only the latest.
+
+    Returns:
+        dict: Stage result with its `key`, whether it was a `hit`, and `load`,
+        which returns the value (see `resolve`).
+    """
+    key = _digest({"stage": name, "version": version, "inputs": inputs})
+    entry_dir = os.path.join(cache["dir"], name)
+    entry_path = os.path.join(entry_dir, f"{key}.pkl")
+    start = time.perf_counter()
+
+    hit = False
+    if cache["enabled"] and os.path.exists(entry_path):
+        if outputs:
+            with open(entry_path, "rb") as f:
+                written = pickle.load(f)
+            hit = all(file_digest(path) == digest for path, digest in written.items())
+        else:
+            hit = True
+
+    if hit:
+        if not cache["read_only"]:
+            os.utime(entry_path)
+        loaded = {}
+
+        def load():
+            if "value" not in loaded and not outputs:
+                with open(entry_path, "rb") as f:
+                    loaded["value"] = pickle.load(f)
+            return loaded.get("value")
+
+    else:
+        value = compute()
+        if cache["enabled"] and not cache["read_only"]:
+            os.makedirs(entry_dir, exist_ok=True)
+            stored = {path: file_digest(path) for path in outputs} if outputs else value
+            with atomic_write(entry_path) as tmp_path:
+                with open(tmp_path, "wb") as f:
+                    pickle.dump(stored, f, protocol=pickle.HIGHEST_PROTOCOL)
+            _prune(entry_dir, cache["keep"] if keep is None else keep)
+
+        def load():
+            return value
+
+    with cache["lock"]:
+        cache["log"].append(
+            {
+                "stage": name,
+                "label": label or "",
+                "status": "hit" if hit else "miss",
+                "key": key[:12],
+                "seconds": time.perf_counter() - start,
+            }
+        )
+    return {"key": key, "hit": hit, "load": load}
+
+
+def record_uncached(cache: dict, name: str, seconds: float, reason: str) -> None:
+    """Note a stage that always runs, so the explain report covers the whole run."""
+    with cache["lock"]:
+        cache["log"].append(
+            {"stage": name, "label": reason, "status": "run", "key": "", "seconds": seconds}
+        )
+
+
+def _prune(entry_dir: str, keep: int) -> None:
+    entries = sorted(
+        (entry.path for entry in os.scandir(entry_dir) if entry.name.endswith(".pkl")),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    for path in entries[keep:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def explain(cache: dict) -> list[str]:
+    """One line per stage run: whether it hit the cache, its key and its time."""
+    lines = [f"{'Stage':<12} {'Status':<6} {'Key':<12} {'Time':>9}  Detail"]
+    for entry in cache["log"]:
+        lines.append(
+            f"{entry['stage']:<12} {entry['status']:<6} {entry['key']:<12} "
+            f"{entry['seconds'] * 1000:>7.1f}ms  {entry['label']}"
+        )
+    hits = sum(entry["status"] == "hit" for entry in cache["log"])
+    cacheable = sum(entry["status"] != "run" for entry in cache["log"])
+    lines.append(f"{hits}/{cacheable} cacheable stages reused")
+    return lines
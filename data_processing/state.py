@@ -0,0 +1,37 @@
+"""
+data_processing/state.py
+"""
+
+import os
+import pandas as pd
+
+from data_processing.file_management import atomic_write
+
+
+def load_state_table(
+    path: str, columns: list[str], date_columns: list[str] = ()
+) -> pd.DataFrame:
+    """
+    Load a table persisted by `save_state_table`.
+
+    Args:
+        path (str): CSV file in the state directory.
+        columns (list[str]): Columns of the table, used when it does not exist yet.
+        date_columns (list[str]): Columns to parse as dates.
+
+    Returns:
+        pd.DataFrame: The stored table, or an empty one.
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=columns)
+    df = pd.read_csv(path)
+    for col in date_columns:
+        df[col] = pd.to_datetime(df[col], format="%Y-%m-%d")
+    return df
+
+
+def save_state_table(df: pd.DataFrame, path: str) -> None:
+    """Atomically write a state table, creating the state directory if needed."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path) as tmp_path:
+        df.to_csv(tmp_path, index=False, date_format="%Y-%m-%d")
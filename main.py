@@ -3,26 +3,119 @@ from data_processing.data_loading import (
     load_path_variables,
     load_accounts_variables,
     load_categories_and_colors,
-    load_and_combine_csvs,
+    load_io_options,
+    load_state_dir,
+    retrieve_statement_filepaths,
+    iter_statements,
 )
 from data_processing.file_management import archive_processed_files
-from categorisation.manual_categorisation import apply_categorisation_rules
+from data_processing.fx import account_currencies, load_fx_rates
+from data_processing.history import (
+    append_history,
+    apply_overrides,
+    fingerprint_rows,
+    load_history,
+    load_overrides,
+    save_history,
+    save_overrides,
+)
+from data_processing.pipeline import run_concurrently
+from data_processing.stage_cache import (
+    STAGE_CACHE_DIR,
+    explain,
+    open_stage_cache,
+    record_uncached,
+)
+from parser.csv_parser import COMPRESSION_EXTENSIONS
+from parser.pdf_parser import PDF_CACHE_DIR
+from parser.api_importer import load_cursors, save_cursors
+from analysis.recurring import load_series, save_series
+from analysis.rollups import save_rollup
+from analysis.anomalies import load_stats, save_stats
+from analysis.reconciliation import load_positions, save_positions
+from analysis.forecast import FORECAST_KEYS, forecast_spend
+from analysis.transfers import exclude_transfers
+from categorisation.manual_categorisation import apply_categorisation_rules, compile_rules
 from categorisation.ai_categorisation import apply_ai_categorisation
 from categorisation.categorisation_rules import rules
-from parser.excel.openpyxl.main import update_excel_file
+from parser.excel.openpyxl.main import list_shards
+from stages import (
+    check_budgets,
+    combine,
+    detect_recurring,
+    export_csv,
+    export_excel,
+    export_html,
+    format_for_output,
+    link_transfers,
+    parse_and_categorise,
+    print_preview,
+    read_workbook_edits,
+    reconcile,
+    replace_window,
+    score_unusual,
+    update_totals,
+)
 from models.llama_runner import setup_llm
 from models.ollama_runner import ask_ollama
 import pandas as pd
+import argparse
 import os
+import time
 import yaml
 import warnings
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 
 
-def main():
-    print("Loading config...")
-    config = load_config("config.yaml")
+def parse_window_date(value: str) -> pd.Timestamp:
+    """Parse a `--since`/`--until` date, which must be written as YYYY-MM-DD."""
+    try:
+        return pd.to_datetime(value, format="%Y-%m-%d")
+    except ValueError:
+        raise ValueError(
+            f"Reprocessing dates must be written as YYYY-MM-DD, got '{value}'"
+        ) from None
+
+
+def run(
+    config: dict,
+    rules: list[dict],
+    dry_run: bool = False,
+    preview_rows: int = None,
+    explain_cache: bool = False,
+    since: str = None,
+    until: str = None,
+    reprocess_accounts: list[str] = None,
+) -> dict[str, float]:
+    """
+    Parse, categorise and write out the statements described by one config.
+
+    Args:
+        config (dict): Loaded configuration dictionary.
+        rules (list[dict]): Categorisation rules, ideally passed through `compile_rules`.
+        dry_run (bool): Stop after categorising and print how the transactions
+            would be categorised; nothing is written, saved or archived.
+        preview_rows (int, optional): Only parse the first rows of each file.
+        explain_cache (bool): Print which stages were reused from the stage cache.
+        since (str, optional): Reprocess from this date (YYYY-MM-DD): the stored
+            transactions of the reprocessed accounts in the window are replaced by
+            the parsed ones. Only those accounts' statements are read and
+            archived, and a statement with rows outside the window is rejected.
+        until (str, optional): Last date to reprocess (inclusive, YYYY-MM-DD).
+        reprocess_accounts (list[str], optional): Accounts to reprocess, instead of
+            those with statements waiting.
+
+    Returns:
+        dict[str, float]: Seconds spent in each stage.
+    """
+    timings = {}
+    start = time.perf_counter()
+    reprocessing = since is not None or until is not None or bool(reprocess_accounts)
+    since = parse_window_date(since) if since is not None else None
+    until = parse_window_date(until) if until is not None else None
+    if since is not None and until is not None and since > until:
+        raise ValueError(f"--since {since:%Y-%m-%d} is after --until {until:%Y-%m-%d}")
     DATA_DIR, CSV_OUTPUT_PATH, EXCEL_OUTPUT_PATH = load_path_variables(config)
     accounts, account_colour_map = load_accounts_variables(config)
     category_list, subcategory_list, category_colour_map, category_emoji_map = (
@@ -31,47 +124,264 @@ def main():
     classification_features = config["classification_features"]
     output_columns = config["output_columns"]
     archive_folder = config.get("archive_folder", None)
-    print("Parsing CSV statements...")
+    state_dir = load_state_dir(config)
+    engine, compression = load_io_options(config)
+    sharding = config.get("excel_sharding")
+    CSV_OUTPUT_PATH += COMPRESSION_EXTENSIONS[compression]
+    base_currency = config.get("base_currency", "GBP")
+    currencies = account_currencies(accounts, base_currency)
+    fx_rates = None
+    if config.get("fx_rates") and set(currencies.values()) != {base_currency.upper()}:
+        fx_rates = load_fx_rates(os.path.join(DATA_DIR, config["fx_rates"]))
+    filepaths_dict = retrieve_statement_filepaths(
+        accounts, DATA_DIR, config.get("inbox")
+    )
+    if reprocessing:
+        unknown = sorted(set(reprocess_accounts or []) - set(accounts))
+        if unknown:
+            raise ValueError(f"Unknown accounts to reprocess: {', '.join(unknown)}")
+        # Other accounts' statements and feeds are left for the next normal run
+        reprocessed = reprocess_accounts or [
+            account for account, paths in filepaths_dict.items() if paths
+        ]
+        accounts = {
+            account: details
+            for account, details in accounts.items()
+            if account in reprocessed
+        }
+        filepaths_dict = {account: filepaths_dict[account] for account in accounts}
+    stage_cache = open_stage_cache(
+        os.path.join(DATA_DIR, STAGE_CACHE_DIR),
+        config.get("stage_cache", True),
+        read_only=dry_run,
+    )
 
-    print("Combining statements...")
-    df, filepaths_dict = load_and_combine_csvs(accounts, DATA_DIR, output_columns)
+    cursors_path = os.path.join(state_dir, "api_cursors.csv")
+    cursors = load_cursors(cursors_path)
+    history_path = os.path.join(state_dir, "history.csv")
+    overrides_path = os.path.join(state_dir, "category_overrides.csv")
+    history = load_history(history_path)
+    overrides = load_overrides(overrides_path)
+    edit_deltas = []
+    # Workbooks are written before the history is saved, so only a workbook
+    # modified after it can hold manual edits.
+    edited_workbooks = [
+        path
+        for path in (list_shards(EXCEL_OUTPUT_PATH) if sharding else [EXCEL_OUTPUT_PATH])
+        if os.path.exists(path)
+        and os.path.exists(history_path)
+        and os.path.getmtime(path) > os.path.getmtime(history_path)
+    ]
+    if not history.empty and not dry_run and edited_workbooks:
+        history, overrides, edit_deltas = read_workbook_edits(
+            history, overrides, edited_workbooks, category_emoji_map
+        )
 
-    # Categorising
-    print("Categorising transactions...")
-    df[["Category", "Subcategory"]] = apply_categorisation_rules(df, rules)
-    # df = apply_ai_categorisation(ask_ollama, df, classification_features, category_list)
-    df = df[output_columns]
-    print(df.head())
-
-    df["Category"] = df["Category"].apply(
-        lambda cat: (
-            f"{category_emoji_map.get(cat, '')} {cat}"
-            if cat in category_emoji_map
-            else cat
+    statements = iter_statements(
+        accounts,
+        filepaths_dict,
+        output_columns,
+        os.path.join(DATA_DIR, PDF_CACHE_DIR),
+        engine,
+        preview_rows,
+        cursors,
+        stage_cache,
+        read_only=dry_run,
+    )
+    df_list = parse_and_categorise(
+        statements,
+        rules,
+        currencies,
+        base_currency,
+        fx_rates,
+        config.get("categorisation") or {},
+        stage_cache,
+    )
+    df = combine(df_list, output_columns, stage_cache)
+
+    window = None
+    removed = history.iloc[0:0]
+    if reprocessing:
+        history, removed, window = replace_window(df, history, accounts, since, until)
+    df["Fingerprint"] = fingerprint_rows(df, history)
+    df[["Category", "Subcategory"]] = apply_overrides(df, overrides)
+    timings["parse_and_categorise"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    positions_path = os.path.join(state_dir, "balances.csv")
+    positions = reconcile(
+        df, load_positions(positions_path), config.get("reconciliation") or {}
+    )
+    timings["reconcile"] = time.perf_counter() - start
+
+    if dry_run:
+        n_files = sum(len(paths) for paths in filepaths_dict.values())
+        print_preview(df, history, removed, n_files, preview_rows)
+        if explain_cache:
+            print("\n".join(explain(stage_cache)))
+        return timings
+
+    start = time.perf_counter()
+    df["Transfer ID"], history, late_transfers = link_transfers(
+        df, history, removed, config.get("transfers", {})
+    )
+    spending = exclude_transfers(df)
+    # Reprocessed rows were already folded into the recurring series and
+    # anomaly statistics when they were first processed
+    fresh = spending[~spending["Fingerprint"].isin(removed["Fingerprint"])]
+
+    series_path = os.path.join(state_dir, "recurring_series.csv")
+    series, recurring = detect_recurring(
+        spending, fresh, history, load_series(series_path), config.get("recurring", {})
+    )
+    stats_path = os.path.join(state_dir, "anomaly_stats.csv")
+    df["Anomaly"], stats = score_unusual(
+        spending, fresh, load_stats(stats_path), config.get("anomalies", {})
+    )
+    record_uncached(
+        stage_cache,
+        "analyse",
+        time.perf_counter() - start,
+        "transfers, recurring payments and anomalies update running state",
+    )
+
+    rollup_path = os.path.join(state_dir, "monthly_totals.csv")
+    merchant_rollup_path = os.path.join(state_dir, "monthly_merchant_totals.csv")
+    # Replaced transactions, and stored ones now known to be transfers, are
+    # taken back out of the totals
+    totals, merchant_totals = update_totals(
+        spending,
+        pd.concat([exclude_transfers(removed), late_transfers], ignore_index=True),
+        edit_deltas,
+        rollup_path,
+        merchant_rollup_path,
+        stage_cache,
+    )
+    budget_report = check_budgets(totals, config.get("budgets", []))
+    history = append_history(history, df)
+    timings["analyse"] = time.perf_counter() - start
+
+    extra_sheets = {"Recurring": recurring, "Budget": budget_report}
+    if config.get("forecast") is not None:
+        start = time.perf_counter()
+        forecast = forecast_spend(totals, **(config["forecast"] or {}))
+        timings["forecast"] = time.perf_counter() - start
+        print(
+            f"Forecast {len(forecast[FORECAST_KEYS].drop_duplicates())} spending "
+            f"series in {timings['forecast'] * 1000:.0f} ms"
         )
+        extra_sheets["Forecast"] = forecast
+
+    start = time.perf_counter()
+    # df = apply_ai_categorisation(ask_ollama, df, classification_features, category_list)
+    df, category_list_with_emojis, category_colour_map = format_for_output(
+        df, output_columns, category_list, category_colour_map, category_emoji_map
     )
-    category_colour_map = {
-        f"{category_emoji_map.get(cat, '')} {cat}": colour
-        for cat, colour in category_colour_map.items()
+    timings["format"] = time.perf_counter() - start
+
+    writers = {
+        "csv": lambda: export_csv(
+            df, CSV_OUTPUT_PATH, engine, compression, stage_cache
+        ),
+        "excel": lambda: export_excel(
+            df,
+            EXCEL_OUTPUT_PATH,
+            category_list_with_emojis,
+            subcategory_list,
+            category_colour_map,
+            account_colour_map,
+            base_currency,
+            extra_sheets,
+            sharding,
+            window,
+            history_path,
+            stage_cache,
+        ),
     }
-    category_list_with_emojis = [
-        f"{category_emoji_map.get(cat, '')} {cat}" for cat in category_list
-    ]
+    if config.get("html_report"):
+        writers["html"] = lambda: export_html(
+            totals,
+            merchant_totals,
+            os.path.join(DATA_DIR, config["html_report"]),
+            base_currency,
+            stage_cache,
+        )
+    print("Writing outputs...")
+    timings.update(run_concurrently(writers))
 
-    df.to_csv(CSV_OUTPUT_PATH, index=False)
-    print(f"Combined CSV saved to: {CSV_OUTPUT_PATH}")
-    update_excel_file(
-        df,
-        EXCEL_OUTPUT_PATH,
-        category_list_with_emojis,
-        subcategory_list,
-        category_colour_map,
-        account_colour_map,
+    # Only commit state and archive once both outputs are safely on disk, so a
+    # failed write never leaves statements archived but unrecorded.
+    start = time.perf_counter()
+    save_history(history, history_path)
+    save_overrides(overrides, overrides_path)
+    save_series(series, series_path)
+    save_stats(stats, stats_path)
+    save_positions(positions, positions_path)
+    save_cursors(cursors, cursors_path)
+    save_rollup(totals, rollup_path)
+    save_rollup(merchant_totals, merchant_rollup_path)
+    print(f"Archiving processed files...")
+    archive_processed_files(
+        accounts, filepaths_dict, DATA_DIR, archive_folder, compression=compression
     )
-    print(f"Excel spreadsheet saved to {EXCEL_OUTPUT_PATH}")
+    timings["archive"] = time.perf_counter() - start
+    if explain_cache:
+        print("\n".join(explain(stage_cache)))
+    return timings
 
-    print(f"Archiving processed files...")
-    archive_processed_files(accounts, filepaths_dict, DATA_DIR, archive_folder)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Parse, categorise and archive bank statements."
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="categorise and print a summary without writing or archiving anything",
+    )
+    parser.add_argument(
+        "--preview",
+        type=int,
+        metavar="N",
+        help="dry run on only the first N rows of each statement",
+    )
+    parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="list which stages were reused from the stage cache and which were recomputed",
+    )
+    parser.add_argument(
+        "--since",
+        metavar="YYYY-MM-DD",
+        help="reprocess from this date, replacing the stored transactions of the "
+        "statements' accounts in the window",
+    )
+    parser.add_argument(
+        "--until",
+        metavar="YYYY-MM-DD",
+        help="last date to reprocess (inclusive)",
+    )
+    parser.add_argument(
+        "--account",
+        action="append",
+        dest="accounts",
+        metavar="NAME",
+        help="account to reprocess (repeatable); defaults to the statements' accounts",
+    )
+    args = parser.parse_args()
+
+    print("Loading config...")
+    config = load_config("config.yaml")
+    run(
+        config,
+        compile_rules(rules),
+        dry_run=args.dry_run or args.preview is not None,
+        preview_rows=args.preview,
+        explain_cache=args.explain,
+        since=args.since,
+        until=args.until,
+        reprocess_accounts=args.accounts,
+    )
 
 
 if __name__ == "__main__":
@@ -1,8 +1,104 @@
 "parser/csv_parser.py"
 
 import os
+
+import numpy as np
 import pandas as pd
 
+CSV_ENGINES = ("pandas", "pyarrow")
+COMPRESSION_EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def read_csv(path: str, engine: str = "pandas", **kwargs) -> pd.DataFrame:
+    """
+    Read a CSV with the configured engine.
+
+    Args:
+        path (str): CSV file, optionally gzip or zstd compressed.
+        engine (str): 'pandas' for the default parser or 'pyarrow' for the
+            multithreaded PyArrow reader.
+        **kwargs: Passed to `pd.read_csv`; only supported by the pandas engine.
+
+    Returns:
+        pd.DataFrame: The parsed file.
+    """
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Unknown CSV engine '{engine}'. Choose from {CSV_ENGINES}")
+    if engine == "pandas":
+        return pd.read_csv(path, **kwargs)
+    if kwargs:
+        raise TypeError(f"The pyarrow engine does not support {sorted(kwargs)}")
+
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    # PyArrow infers dates and times where pandas keeps strings. Check the types
+    # inferred from the first block and read any temporal columns as text.
+    with pa_csv.open_csv(path) as reader:
+        schema = reader.schema
+    text_columns = {
+        field.name: pa.string()
+        for field in schema
+        if pa.types.is_temporal(field.type)
+    }
+    # Empty text cells are nulls, as pandas reads them
+    table = pa_csv.read_csv(
+        path,
+        convert_options=pa_csv.ConvertOptions(
+            column_types=text_columns, strings_can_be_null=True
+        ),
+    )
+    return table.to_pandas()
+
+
+def _to_arrow_compatible(df: pd.DataFrame) -> pd.DataFrame:
+    # Render dates and mixed object columns the way DataFrame.to_csv does, so both
+    # engines write the same values.
+    df = df.copy()
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            date_only = (series.dropna() == series.dropna().dt.normalize()).all()
+            df[col] = series.dt.strftime("%Y-%m-%d" if date_only else "%Y-%m-%d %H:%M:%S")
+        elif series.dtype == object:
+            df[col] = series.where(series.isna(), series.astype(str))
+    return df
+
+
+def write_csv(
+    df: pd.DataFrame, path: str, engine: str = "pandas", compression: str = None
+) -> None:
+    """
+    Write a DataFrame without its index using the configured engine.
+
+    Both engines produce files that read back to the same values; only quoting
+    and the spelling of whole floats and booleans may differ.
+
+    Args:
+        df (pd.DataFrame): Data to write.
+        path (str): Destination file.
+        engine (str): 'pandas' or 'pyarrow'.
+        compression (str, optional): None, 'gzip' or 'zstd'.
+    """
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Unknown CSV engine '{engine}'. Choose from {CSV_ENGINES}")
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unknown compression '{compression}'")
+
+    if engine == "pandas":
+        df.to_csv(path, index=False, compression=compression)
+        return
+
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    table = pa.Table.from_pandas(_to_arrow_compatible(df), preserve_index=False)
+    if compression:
+        with pa.CompressedOutputStream(path, compression) as out:
+            pa_csv.write_csv(table, out)
+    else:
+        pa_csv.write_csv(table, path)
+
 
 def retrieve_csv_filepaths(dir: str) -> list[str]:
     """Retrieves CSV files in a directory"""
@@ -14,19 +110,49 @@ def retrieve_csv_filepaths(dir: str) -> list[str]:
     ]
 
 
-def load_csv_statement(
-    path: str, account: str, columns_mapping: dict, final_columns: list
-):
-    df = pd.read_csv(path)
+def _coerce_amount(series: pd.Series) -> pd.Series:
+    """
+    Converts text amounts such as '£1,234.56' to floats, leaving numbers untouched.
+
+    Raises:
+        ValueError: If a non-empty cell is not an amount, rather than reading it
+            as missing.
+    """
+    if series.dtype != object:
+        return series
+    cleaned = series.astype(str).str.replace(r"[£$€,\s]", "", regex=True)
+    amounts = pd.to_numeric(cleaned, errors="coerce")
+    unreadable = amounts.isna() & series.notna() & (cleaned != "")
+    if unreadable.any():
+        examples = ", ".join(map(repr, series[unreadable].unique()[:3]))
+        raise ValueError(f"Unreadable amounts in column '{series.name}': {examples}")
+    return amounts
+
+
+def normalise_statement(
+    df: pd.DataFrame, account: str, columns_mapping: dict, final_columns: list
+) -> pd.DataFrame:
+    """
+    Maps a raw statement table onto the unified schema used by the tracker.
+
+    A mapped `Balance` column (the running balance some banks export) is kept
+    after the schema's columns for balance reconciliation.
+    """
     df.columns = df.columns.str.strip().str.lower()
-    # print(df.columns)
     df = df.rename(columns=columns_mapping)
     df["Account"] = account
-    df["Amount Out"] = -1 * df["Amount Out"].abs()
-    if "Amount In" in df.columns:
-        df["Amount In"] = df["Amount In"].abs()
-    else:
-        df["Amount In"] = None
+    if "Amount Out" not in df.columns and "Amount" in df.columns:
+        # Sources with a single signed amount, such as bank APIs
+        amount = _coerce_amount(df["Amount"])
+        df["Amount Out"] = amount.where(amount < 0)
+        df["Amount In"] = amount.where(amount > 0)
+    # Statements may lack either column, e.g. an export with no credits
+    for col in ("Amount Out", "Amount In"):
+        if col in df.columns:
+            df[col] = _coerce_amount(df[col]).abs()
+        else:
+            df[col] = np.nan
+    df["Amount Out"] = -1 * df["Amount Out"]
 
     df["Amount"] = df["Amount Out"].fillna(0) + df["Amount In"].fillna(0)
 
@@ -34,10 +160,31 @@ def load_csv_statement(
         if col not in df.columns:
             df[col] = None
 
-    # print(df[final_columns].head())
+    if "Balance" in df.columns and "Balance" not in final_columns:
+        df["Balance"] = _coerce_amount(df["Balance"])
+        return df[[*final_columns, "Balance"]]
     return df[final_columns]
 
 
+def load_csv_statement(
+    path: str,
+    account: str,
+    columns_mapping: dict,
+    final_columns: list,
+    engine: str = "pandas",
+    nrows: int = None,
+):
+    if nrows is not None:
+        # Only pandas can stop after the first rows
+        df = read_csv(path, "pandas", nrows=nrows)
+    else:
+        df = read_csv(path, engine)
+    try:
+        return normalise_statement(df, account, columns_mapping, final_columns)
+    except ValueError as error:
+        raise ValueError(f"{path}: {error}") from error
+
+
 def append_to_csv(new_df, output_path):
     if os.path.exists(output_path):
         existing_df = pd.read_csv(output_path)
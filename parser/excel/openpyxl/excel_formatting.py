@@ -8,6 +8,9 @@ from openpyxl.worksheet.datavalidation import DataValidation
 from openpyxl.formatting.rule import FormulaRule
 
 
+CURRENCY_SYMBOLS = {"GBP": "£", "EUR": "€", "USD": "$"}
+
+
 # ─── HELPERS ────────────────────────────────────────────────────────────────
 
 
@@ -18,6 +21,13 @@ def get_col_idx(worksheet, col_name: str) -> int | None:
     return header.index(col_name) + 1
 
 
+def currency_number_format(currency: str = "GBP") -> str:
+    symbol = CURRENCY_SYMBOLS.get(currency.upper())
+    if symbol:
+        return f"{symbol}#,##0.00"
+    return f'#,##0.00 "{currency.upper()}"'
+
+
 def generate_distinct_colors(n: int) -> list[str]:
     random.seed(42)
     colors = set()
@@ -50,7 +60,10 @@ def apply_conditional_formatting(
         )
 
 
-def apply_currency_formatting(worksheet, columns: list[str]) -> None:
+def apply_currency_formatting(
+    worksheet, columns: list[str], currency: str = "GBP"
+) -> None:
+    number_format = currency_number_format(currency)
     for col_name in columns:
         col_idx = get_col_idx(worksheet, col_name)
         if not col_idx:
@@ -58,7 +71,22 @@ def apply_currency_formatting(worksheet, columns: list[str]) -> None:
         for row in worksheet.iter_rows(min_row=2, min_col=col_idx, max_col=col_idx):
             for cell in row:
                 if isinstance(cell.value, (int, float)):
-                    cell.number_format = "£#,##0.00"
+                    cell.number_format = number_format
+
+
+def apply_row_currency_formatting(
+    worksheet, col_name: str, currency_col: str = "Currency"
+) -> None:
+    """Format each cell of `col_name` in the currency named on the same row."""
+    col_idx = get_col_idx(worksheet, col_name)
+    currency_idx = get_col_idx(worksheet, currency_col)
+    if not col_idx or not currency_idx:
+        return
+    for row in worksheet.iter_rows(min_row=2):
+        cell = row[col_idx - 1]
+        currency = row[currency_idx - 1].value
+        if isinstance(cell.value, (int, float)) and currency:
+            cell.number_format = currency_number_format(currency)
 
 
 def apply_bold_headers(worksheet) -> None:
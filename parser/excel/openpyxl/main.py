@@ -1,15 +1,20 @@
+import glob
 import os
+import re
 import pandas as pd
 from openpyxl import load_workbook, Workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.worksheet.table import Table
 from openpyxl.utils import get_column_letter, range_boundaries
 
-
+from analysis.anomalies import ANOMALY_LABEL
+from analysis.forecast import MODELS as FORECAST_MODELS
+from data_processing.file_management import atomic_write
 from parser.excel.openpyxl.excel_formatting import (
     add_dropdown,
     apply_bold_headers,
     apply_currency_formatting,
+    apply_row_currency_formatting,
     apply_conditional_formatting,
     order_sheets,
     resize_columns,
@@ -24,7 +29,105 @@ def delete_sheet_in_excel_file(filepath: str, sheet_name: str = "MasterData"):
     if sheet_name in workbook.sheetnames:
         workbook.remove(workbook[sheet_name])
         print(f"Worksheet {sheet_name} removed from {filepath}.")
-    workbook.save(filepath)
+    with atomic_write(filepath) as tmp_path:
+        workbook.save(tmp_path)
+
+
+def read_master_data_categories(
+    filepath: str, category_emoji_map: dict = None, sheet_name: str = "MasterData"
+) -> pd.DataFrame:
+    """
+    Stream the identifying fields and categories of every MasterData row.
+
+    The workbook is opened read-only and only the needed columns are kept, so
+    large workbooks are never loaded into memory as a whole.
+
+    Args:
+        filepath (str): Workbook written by `update_excel_file`.
+        category_emoji_map (dict, optional): Category to emoji, used to strip the
+            emoji prefix added to categories for display.
+        sheet_name (str): Sheet holding the transactions.
+
+    Returns:
+        pd.DataFrame: Date, Time, Account, Name, Amount, Category and Subcategory
+        in sheet order (empty if the workbook or sheet does not exist).
+    """
+    columns = ["Date", "Time", "Account", "Name", "Amount", "Category", "Subcategory"]
+    if not os.path.exists(filepath):
+        return pd.DataFrame(columns=columns)
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        if sheet_name not in workbook.sheetnames:
+            return pd.DataFrame(columns=columns)
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        present = [col for col in columns if col in header]
+        positions = [header.index(col) for col in present]
+        records = [
+            [row[i] if i < len(row) else None for i in positions]
+            for row in rows
+            if any(cell is not None for cell in row)
+        ]
+    finally:
+        workbook.close()
+
+    df = pd.DataFrame(records, columns=present).reindex(columns=columns)
+    df[["Category", "Subcategory"]] = df[["Category", "Subcategory"]].fillna("")
+    labels = {
+        f"{emoji} {cat}": cat for cat, emoji in (category_emoji_map or {}).items()
+    }
+    df["Category"] = df["Category"].replace(labels)
+    return df
+
+
+def remove_master_data_rows(
+    ws, accounts: list[str], since: pd.Timestamp, until: pd.Timestamp
+) -> int:
+    """Delete the rows of `accounts` dated between `since` and `until` (inclusive)."""
+    header = [cell.value for cell in ws[1]]
+    if "Date" not in header or "Account" not in header:
+        return 0
+    date_idx, account_idx = header.index("Date"), header.index("Account")
+    doomed = [
+        row_idx
+        for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2)
+        if row[account_idx] in accounts
+        and row[date_idx] is not None
+        and since <= pd.Timestamp(row[date_idx]) <= until
+    ]
+    # Delete runs of adjacent rows bottom-up so earlier row numbers stay valid
+    runs = []
+    for row_idx in doomed:
+        if runs and runs[-1][0] + runs[-1][1] == row_idx:
+            runs[-1][1] += 1
+        else:
+            runs.append([row_idx, 1])
+    for start, count in reversed(runs):
+        ws.delete_rows(start, count)
+    return len(doomed)
+
+
+def write_summary_sheet(
+    workbook, sheet_name: str, df: pd.DataFrame, base_currency: str = "GBP"
+) -> None:
+    """Replace `sheet_name` in `workbook` with the contents of `df`."""
+    if sheet_name in workbook.sheetnames:
+        workbook.remove(workbook[sheet_name])
+    ws = workbook.create_sheet(sheet_name)
+    ws.append(list(df.columns))
+    for row in dataframe_to_rows(df, index=False, header=False):
+        ws.append(row)
+
+    amount_columns = [
+        col
+        for col in df.columns
+        if "Amount" in col
+        or col in ("Spend", "Income", "Budget", "Remaining", *FORECAST_MODELS)
+    ]
+    apply_currency_formatting(ws, amount_columns, base_currency)
+    apply_conditional_formatting(ws, "Status", {"Over budget": "FF9999"})
+    apply_bold_headers(ws)
+    resize_columns(ws)
 
 
 def update_excel_file(
@@ -34,7 +137,20 @@ def update_excel_file(
     subcategory_list: list[str],
     category_colour_map: dict,
     account_colour_map: dict,
-) -> None:
+    base_currency: str = "GBP",
+    extra_sheets: dict[str, pd.DataFrame] = None,
+    replace: tuple = None,
+) -> int:
+    """
+    Append transactions to the MasterData table of a workbook.
+
+    Args:
+        replace (tuple, optional): (accounts, since, until); existing rows of those
+            accounts dated within the window are removed before appending.
+
+    Returns:
+        int: Number of rows removed by `replace`.
+    """
     df["Year"] = df["Date"].dt.strftime("%Y")
     df["Month"] = df["Date"].dt.strftime("%m")
     df["Date"] = df["Date"].dt.date
@@ -56,6 +172,8 @@ def update_excel_file(
         ws = workbook.create_sheet(sheet_name)
         ws.append(list(df.columns))  # Add header
 
+    removed = remove_master_data_rows(ws, *replace) if replace else 0
+
     # Get existing table (if any)
     if table_name in ws.tables:
         table = ws.tables[table_name]
@@ -95,10 +213,211 @@ def update_excel_file(
     # Reapply formatting
     apply_conditional_formatting(ws, "Category", category_colour_map)
     apply_conditional_formatting(ws, "Account", account_colour_map)
-    apply_currency_formatting(ws, ["Amount", "Amount In", "Amount Out"])
+    apply_conditional_formatting(ws, "Anomaly", {ANOMALY_LABEL: "FFCC99"})
+    apply_currency_formatting(ws, ["Amount", "Amount In", "Amount Out"], base_currency)
+    apply_row_currency_formatting(ws, "Original Amount")
     apply_bold_headers(ws)
     resize_columns(ws)
     add_dropdown(ws, category_list, col_name="Category")
     add_dropdown(ws, subcategory_list, col_name="Subcategory")
 
-    workbook.save(filepath)
+    # Summary sheets are rebuilt on every run and kept after MasterData
+    for extra_name, extra_df in (extra_sheets or {}).items():
+        write_summary_sheet(workbook, extra_name, extra_df, base_currency)
+    order_sheets(workbook, [sheet_name, *(extra_sheets or {})])
+
+    with atomic_write(filepath) as tmp_path:
+        workbook.save(tmp_path)
+    return removed
+
+
+# ─── SHARDED WORKBOOKS ──────────────────────────────────────────────────────
+
+SHARDINGS = ("year", "quarter")
+INDEX_SHEET = "Index"
+INDEX_COLUMNS = ["Period", "Workbook", "Rows", "First Date", "Last Date"]
+
+
+def shard_periods(dates: pd.Series, sharding: str) -> pd.Series:
+    """Period of each date: '2024' when sharding by year, '2024-Q1' by quarter."""
+    if sharding not in SHARDINGS:
+        raise ValueError(f"Unknown sharding '{sharding}'. Choose from {SHARDINGS}")
+    if sharding == "year":
+        return dates.dt.strftime("%Y")
+    return dates.dt.strftime("%Y") + "-Q" + dates.dt.quarter.astype(str)
+
+
+def shard_path(filepath: str, period: str) -> str:
+    """Workbook of one period, next to the index workbook at `filepath`."""
+    stem, ext = os.path.splitext(filepath)
+    return f"{stem}_{period}{ext}"
+
+
+def list_shards(filepath: str) -> list[str]:
+    """Shard workbooks written next to the index workbook at `filepath`."""
+    stem, ext = os.path.splitext(filepath)
+    pattern = re.compile(
+        re.escape(os.path.basename(stem)) + r"_\d{4}(-Q[1-4])?" + re.escape(ext) + "$"
+    )
+    return sorted(
+        path
+        for path in glob.glob(f"{glob.escape(stem)}_*{ext}")
+        if pattern.match(os.path.basename(path))
+    )
+
+
+def master_data_summary(filepath: str) -> tuple[int, pd.Timestamp, pd.Timestamp]:
+    """Row count and first and last date of the MasterData sheet of a workbook."""
+    workbook = load_workbook(filepath, read_only=True)
+    rows = workbook["MasterData"].iter_rows(values_only=True)
+    date_idx = list(next(rows)).index("Date")
+    dates = pd.to_datetime(pd.Series([row[date_idx] for row in rows], dtype=object))
+    workbook.close()
+    return len(dates), dates.min(), dates.max()
+
+
+def update_index_workbook(
+    filepath: str,
+    shards: pd.DataFrame,
+    base_currency: str = "GBP",
+    extra_sheets: dict[str, pd.DataFrame] = None,
+    rewritten: list[str] = (),
+) -> None:
+    """
+    Add the rows just written to the shards to the index workbook and rebuild
+    its summary sheets.
+
+    Args:
+        filepath (str): Index workbook.
+        shards (pd.DataFrame): Per touched period, the `INDEX_COLUMNS` of the new rows.
+        base_currency (str): Currency of the summary sheets.
+        extra_sheets (dict, optional): Summary sheets, as for `update_excel_file`.
+        rewritten (list[str]): Periods whose rows in `shards` describe the whole
+            shard, after rows were removed from it, and replace its entry.
+    """
+    if os.path.exists(filepath):
+        workbook = load_workbook(filepath)
+    else:
+        workbook = Workbook()
+        workbook.remove(workbook.active)
+
+    index = pd.DataFrame(columns=INDEX_COLUMNS)
+    if INDEX_SHEET in workbook.sheetnames:
+        rows = list(workbook[INDEX_SHEET].iter_rows(values_only=True))
+        if rows:
+            index = pd.DataFrame(rows[1:], columns=rows[0])[INDEX_COLUMNS]
+    index = index[~index["Period"].isin(rewritten)]
+    index = pd.concat([index, shards], ignore_index=True)
+    for col in ("First Date", "Last Date"):
+        index[col] = pd.to_datetime(index[col])
+    index = (
+        index.groupby(["Period", "Workbook"], as_index=False)
+        .agg({"Rows": "sum", "First Date": "min", "Last Date": "max"})
+        .sort_values("Period")
+    )
+    for col in ("First Date", "Last Date"):
+        index[col] = index[col].dt.date
+
+    write_summary_sheet(workbook, INDEX_SHEET, index[INDEX_COLUMNS], base_currency)
+    ws = workbook[INDEX_SHEET]
+    col_idx = INDEX_COLUMNS.index("Workbook") + 1
+    for row in ws.iter_rows(min_row=2, min_col=col_idx, max_col=col_idx):
+        for cell in row:
+            cell.hyperlink = cell.value
+            cell.style = "Hyperlink"
+    for extra_name, extra_df in (extra_sheets or {}).items():
+        write_summary_sheet(workbook, extra_name, extra_df, base_currency)
+    order_sheets(workbook, [INDEX_SHEET, *(extra_sheets or {})])
+
+    with atomic_write(filepath) as tmp_path:
+        workbook.save(tmp_path)
+
+
+def update_sharded_excel_files(
+    df: pd.DataFrame,
+    filepath: str,
+    sharding: str,
+    category_list: list[str],
+    subcategory_list: list[str],
+    category_colour_map: dict,
+    account_colour_map: dict,
+    base_currency: str = "GBP",
+    extra_sheets: dict[str, pd.DataFrame] = None,
+    replace: tuple = None,
+) -> list[str]:
+    """
+    Append transactions to one workbook per year or quarter.
+
+    Only the workbooks of the periods present in `df` are opened, so the time
+    taken depends on the size of the current period rather than the history.
+    The summary sheets go to a small index workbook at `filepath`, which links
+    to every shard.
+
+    Args:
+        df (pd.DataFrame): New transactions, as for `update_excel_file`.
+        filepath (str): Index workbook; shards are written next to it.
+        sharding (str): 'year' or 'quarter'.
+        replace (tuple, optional): (accounts, since, until) to replace, as for
+            `update_excel_file`; the shards overlapping the window are rewritten
+            even when `df` has no rows for them.
+
+    Returns:
+        list[str]: The shard workbooks that were updated.
+    """
+    periods = shard_periods(df["Date"], sharding)
+    parts = dict(list(df.groupby(periods, sort=True)))
+    if replace:
+        _, since, until = replace
+        window = pd.Series(pd.date_range(since, until, freq="D"))
+        for period in shard_periods(window, sharding).unique():
+            path = shard_path(filepath, period)
+            if period not in parts and os.path.exists(path):
+                parts[period] = df.iloc[0:0]
+
+    touched, shards, rewritten = [], [], []
+    for period in sorted(parts):
+        part = parts[period]
+        path = shard_path(filepath, period)
+        removed = update_excel_file(
+            part.copy(),
+            path,
+            category_list,
+            subcategory_list,
+            category_colour_map,
+            account_colour_map,
+            base_currency,
+            replace=replace,
+        )
+        touched.append(path)
+        rows, first, last = len(part), part["Date"].min(), part["Date"].max()
+        if removed:
+            # The removed rows may have been the shard's first or last
+            rows, first, last = master_data_summary(path)
+            rewritten.append(period)
+        shards.append(
+            {
+                "Period": period,
+                "Workbook": os.path.basename(path),
+                "Rows": rows,
+                "First Date": first,
+                "Last Date": last,
+            }
+        )
+
+    update_index_workbook(
+        filepath,
+        pd.DataFrame(shards, columns=INDEX_COLUMNS),
+        base_currency,
+        extra_sheets,
+        rewritten,
+    )
+    return touched
+
+
+def delete_excel_shards(filepath: str) -> None:
+    """Remove every shard workbook and the index sheet linking them."""
+    for path in list_shards(filepath):
+        os.remove(path)
+        print(f"Shard {path} removed.")
+    if os.path.exists(filepath):
+        delete_sheet_in_excel_file(filepath, INDEX_SHEET)
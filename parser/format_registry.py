@@ -0,0 +1,111 @@
+"""
+parser/format_registry.py
+
+Recognises which account a CSV statement belongs to from its header line alone,
+so misfiled or unknown statements are caught before any full parse.
+"""
+
+import csv
+from functools import lru_cache
+
+
+CORE_COLUMNS = ("Date", "Name")
+AMOUNT_COLUMNS = ("Amount", "Amount Out", "Amount In")
+
+
+def build_format_registry(accounts: dict) -> tuple:
+    """
+    Known statement formats: each CSV account with the columns of its `mapping`.
+
+    A statement must have the columns mapped to Date and Name and at least one
+    amount column; other mapped columns, such as a running balance, are optional
+    and only used to tell similar formats apart.
+
+    Returns:
+        tuple: (account, required, amount, mapped) tuples of frozensets of
+        normalised column names, hashable so header matches can be cached.
+    """
+    registry = []
+    for account, details in accounts.items():
+        if details.get("format", "csv") != "csv":
+            continue
+        mapping = {col.strip().lower(): target for col, target in details["mapping"].items()}
+        registry.append(
+            (
+                account,
+                frozenset(col for col, target in mapping.items() if target in CORE_COLUMNS),
+                frozenset(col for col, target in mapping.items() if target in AMOUNT_COLUMNS),
+                frozenset(mapping),
+            )
+        )
+    return tuple(registry)
+
+
+def missing_columns(header: tuple[str, ...], required, amount) -> list[str]:
+    """Core columns of a format absent from a header."""
+    columns = set(header)
+    missing = sorted(required - columns)
+    if amount and not amount & columns:
+        missing.append(" or ".join(sorted(amount)))
+    return missing
+
+
+def read_header(path: str) -> tuple[str, ...]:
+    """Read the header line of a CSV file, normalised as in `load_csv_statement`."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), [])
+    return tuple(col.strip().lower() for col in header)
+
+
+@lru_cache(maxsize=256)
+def match_header(header: tuple[str, ...], registry: tuple) -> tuple[str, ...]:
+    """
+    Accounts whose format a header satisfies, i.e. has all its core columns.
+
+    Only the most specific matches (the most mapped columns present) are
+    returned. Cached per header signature, so each distinct layout is matched once.
+    """
+    columns = set(header)
+    matches = [
+        (account, len(mapped & columns))
+        for account, required, amount, mapped in registry
+        if not missing_columns(header, required, amount)
+    ]
+    if not matches:
+        return ()
+    best = max(size for _, size in matches)
+    return tuple(account for account, size in matches if size == best)
+
+
+def route_statement(
+    path: str, registry: tuple, expected_account: str = None
+) -> tuple[str | None, str]:
+    """
+    Decide which account a CSV statement belongs to.
+
+    Args:
+        path (str): CSV statement.
+        registry (tuple): From `build_format_registry`.
+        expected_account (str, optional): Account whose directory holds the file,
+            preferred whenever its format matches.
+
+    Returns:
+        tuple[str | None, str]: The account, or None if the file must be rejected,
+        and the reason for rejecting it.
+    """
+    header = read_header(path)
+    formats = {account: (required, amount) for account, required, amount, _ in registry}
+    missing = None
+    if expected_account in formats:
+        missing = missing_columns(header, *formats[expected_account])
+        if not missing:
+            return expected_account, ""
+
+    candidates = match_header(header, registry)
+    if not candidates:
+        if missing:
+            return None, f"no {expected_account} columns {', '.join(missing)}"
+        return None, "header matches no known statement format"
+    if len(candidates) > 1:
+        return None, f"header matches several accounts ({', '.join(candidates)})"
+    return candidates[0], ""
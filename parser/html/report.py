@@ -0,0 +1,225 @@
+"""
+parser/html/report.py
+
+Static HTML spending report rendered from the running monthly totals rather
+than from individual transactions. Each month is rendered to its own fragment,
+which is only regenerated when that month's aggregates (or the template)
+change; the index page then stitches the fragments together.
+"""
+
+import os
+import json
+import hashlib
+from functools import lru_cache
+
+import pandas as pd
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+from data_processing.file_management import atomic_write
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
+MANIFEST_FILENAME = "manifest.json"
+
+
+@lru_cache(maxsize=None)
+def get_environment(cache_dir: str) -> Environment:
+    """
+    Jinja2 environment shared by every report build in this process.
+
+    Compiled templates are kept in memory by the environment and as bytecode in
+    `cache_dir`, so templates are only compiled when they change.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    env = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        bytecode_cache=FileSystemBytecodeCache(cache_dir),
+        autoescape=select_autoescape(["html"]),
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    env.filters["money"] = lambda value: f"{value:,.2f}"
+    return env
+
+
+def _template_digest(env: Environment, name: str) -> str:
+    source, _, _ = env.loader.get_source(env, name)
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def _month_hashes(df: pd.DataFrame) -> pd.Series:
+    # Order-independent fingerprint of the rows of each month
+    row_hashes = pd.util.hash_pandas_object(df, index=False)
+    return row_hashes.groupby(df["Month"].to_numpy()).sum()
+
+
+def summarise_months(
+    totals: pd.DataFrame, merchant_totals: pd.DataFrame, top_n: int = 10
+) -> dict[str, dict]:
+    """
+    Build the context of every month page from the running totals.
+
+    Args:
+        totals (pd.DataFrame): Totals from `analysis.rollups` keyed by category.
+        merchant_totals (pd.DataFrame): Totals keyed by merchant.
+        top_n (int): Number of merchants listed per month.
+
+    Returns:
+        dict: Month ('YYYY-MM') to its template context.
+    """
+    def money(value) -> float:
+        return round(float(value), 2)
+
+    by_category = totals.groupby(["Month", "Category"], as_index=False)[
+        ["Spend", "Income"]
+    ].sum()
+    subcategories = dict(
+        tuple(
+            totals[totals["Subcategory"] != ""]
+            .groupby(["Month", "Category", "Subcategory"], as_index=False)["Spend"]
+            .sum()
+            .sort_values("Spend", ascending=False)
+            .groupby(["Month", "Category"])
+        )
+    )
+    accounts = dict(
+        tuple(
+            totals.groupby(["Month", "Account"], as_index=False)[["Spend", "Income"]]
+            .sum()
+            .groupby("Month")
+        )
+    )
+    merchants = dict(
+        tuple(
+            merchant_totals[merchant_totals["Spend"] > 0]
+            .sort_values(["Month", "Spend"], ascending=[True, False])
+            .groupby("Month")
+            .head(top_n)
+            .groupby("Month")
+        )
+    )
+    empty = pd.DataFrame(columns=["Subcategory", "Account", "Merchant", "Spend", "Income", "Count"])
+
+    months = {}
+    for month, categories in by_category.groupby("Month"):
+        months[month] = {
+            "month": month,
+            "spend": money(categories["Spend"].sum()),
+            "income": money(categories["Income"].sum()),
+            "categories": [
+                {
+                    "name": row.Category or "Uncategorised",
+                    "spend": money(row.Spend),
+                    "subcategories": [
+                        {"name": sub.Subcategory, "spend": money(sub.Spend)}
+                        for sub in subcategories.get((month, row.Category), empty).itertuples()
+                    ],
+                }
+                for row in categories.sort_values("Spend", ascending=False).itertuples()
+                if row.Spend
+            ],
+            "accounts": [
+                {"name": row.Account, "spend": money(row.Spend), "income": money(row.Income)}
+                for row in accounts.get(month, empty).itertuples()
+            ],
+            "merchants": [
+                {"name": row.Merchant.title(), "spend": money(row.Spend), "count": int(row.Count)}
+                for row in merchants.get(month, empty).itertuples()
+            ],
+        }
+    return months
+
+
+def report_files(totals: pd.DataFrame, output_dir: str) -> list[str]:
+    """Every file `build_html_report` writes for these totals."""
+    return [
+        os.path.join(output_dir, "index.html"),
+        os.path.join(output_dir, MANIFEST_FILENAME),
+        *(
+            os.path.join(output_dir, "months", f"{month}.html")
+            for month in sorted(totals["Month"].unique())
+        ),
+    ]
+
+
+def build_html_report(
+    totals: pd.DataFrame,
+    merchant_totals: pd.DataFrame,
+    output_dir: str,
+    currency_symbol: str = "£",
+    top_n: int = 10,
+) -> list[str]:
+    """
+    Render the report into `output_dir`, regenerating only months whose data changed.
+
+    Args:
+        totals (pd.DataFrame): Totals from `analysis.rollups` keyed by category.
+        merchant_totals (pd.DataFrame): Totals keyed by merchant.
+        output_dir (str): Directory receiving index.html and the month fragments.
+        currency_symbol (str): Shown in front of amounts.
+        top_n (int): Number of merchants listed per month.
+
+    Returns:
+        list[str]: Months whose fragments were re-rendered.
+    """
+    fragment_dir = os.path.join(output_dir, "months")
+    os.makedirs(fragment_dir, exist_ok=True)
+    env = get_environment(os.path.join(output_dir, ".jinja_cache"))
+    month_template = env.get_template("month.html")
+    template_digest = _template_digest(env, "month.html")
+
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    # Fingerprint every month from its aggregate rows so only changed months are
+    # summarised and rendered.
+    settings = f"{template_digest}:{currency_symbol}:{top_n}"
+    digests = (
+        pd.concat([_month_hashes(totals), _month_hashes(merchant_totals)])
+        .groupby(level=0)
+        .sum()
+        .map(lambda value: hashlib.sha256(f"{settings}:{value}".encode()).hexdigest()[:16])
+    )
+    changed = [
+        month
+        for month, digest in digests.items()
+        if manifest.get(month) != digest
+        or not os.path.exists(os.path.join(fragment_dir, f"{month}.html"))
+    ]
+
+    contexts = summarise_months(
+        totals[totals["Month"].isin(changed)],
+        merchant_totals[merchant_totals["Month"].isin(changed)],
+        top_n,
+    )
+    for month, context in contexts.items():
+        fragment_path = os.path.join(fragment_dir, f"{month}.html")
+        with atomic_write(fragment_path) as tmp_path:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(month_template.render(currency=currency_symbol, **context))
+        manifest[month] = digests[month]
+    rendered = list(contexts)
+
+    monthly = totals.groupby("Month")[["Spend", "Income"]].sum().round(2)
+    months = list(monthly.index)
+    fragments = []
+    for month in sorted(months, reverse=True):
+        with open(os.path.join(fragment_dir, f"{month}.html"), encoding="utf-8") as f:
+            fragments.append(f.read())
+    overview = [
+        {"month": month, "spend": float(row.Spend), "income": float(row.Income)}
+        for month, row in monthly.sort_index(ascending=False).iterrows()
+    ]
+    with atomic_write(os.path.join(output_dir, "index.html")) as tmp_path:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(
+                env.get_template("report.html").render(
+                    currency=currency_symbol, overview=overview, fragments=fragments
+                )
+            )
+    with atomic_write(manifest_path) as tmp_path:
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    return rendered
@@ -0,0 +1,147 @@
+"""
+parser/pdf_parser.py
+"""
+
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pdfplumber
+
+from parser.csv_parser import normalise_statement
+
+# Relative to the data directory. Extracted tables are stored here keyed by the
+# SHA-256 of the PDF so a statement is only ever parsed once.
+PDF_CACHE_DIR = os.path.join(".cache", "pdf")
+
+
+def retrieve_pdf_filepaths(dir: str) -> list[str]:
+    """Retrieves PDF files in a directory"""
+    return [
+        os.path.join(dir, filename)
+        for filename in os.listdir(dir)
+        if filename.lower().endswith(".pdf")
+        and os.path.isfile(os.path.join(dir, filename))
+    ]
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _extract_pages(path: str, page_numbers: list[int]) -> list[list[list]]:
+    # Runs in a worker process, so the PDF is opened once per batch of pages
+    # rather than once per page.
+    tables = []
+    with pdfplumber.open(path) as pdf:
+        for page_number in page_numbers:
+            tables.extend(pdf.pages[page_number].extract_tables())
+    return tables
+
+
+def extract_pdf_tables(path: str, max_workers: int | None = None) -> list[list[list]]:
+    """
+    Extract every table from a PDF, spreading the pages across a process pool.
+
+    Args:
+        path (str): Path to the PDF statement.
+        max_workers (int, optional): Size of the process pool. Defaults to the CPU count.
+
+    Returns:
+        list: Tables in page order, each a list of rows of cell strings.
+    """
+    with pdfplumber.open(path) as pdf:
+        n_pages = len(pdf.pages)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if n_pages <= 1 or max_workers == 1:
+        return _extract_pages(path, list(range(n_pages)))
+
+    # Contiguous page batches keep the results in page order.
+    n_batches = min(max_workers, n_pages)
+    batches = [
+        list(range(i * n_pages // n_batches, (i + 1) * n_pages // n_batches))
+        for i in range(n_batches)
+    ]
+    with ProcessPoolExecutor(max_workers=n_batches) as executor:
+        results = executor.map(_extract_pages, [path] * n_batches, batches)
+        return [table for tables in results for table in tables]
+
+
+def load_cached_tables(
+    path: str, cache_dir: str, read_only: bool = False
+) -> list[list[list]]:
+    """
+    Return the tables of a PDF, extracting them only if this file content has not
+    been seen before.
+
+    Args:
+        path (str): Path to the PDF statement.
+        cache_dir (str): Directory holding the extraction cache.
+        read_only (bool): Use cached tables but do not store new ones.
+
+    Returns:
+        list: Tables as returned by `extract_pdf_tables`.
+    """
+    cache_path = os.path.join(cache_dir, f"{hash_file(path)}.json")
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f)
+
+    tables = extract_pdf_tables(path)
+    if read_only:
+        return tables
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(tables, f)
+    os.replace(tmp_path, cache_path)
+    return tables
+
+
+def tables_to_dataframe(tables: list[list[list]]) -> pd.DataFrame:
+    """
+    Stitch the per-page tables of a statement into a single DataFrame.
+
+    The first row of the first table is taken as the header. Tables on later pages
+    may repeat that header, and tables of a different width (summaries, adverts)
+    are ignored.
+    """
+    tables = [table for table in tables if table]
+    if not tables:
+        return pd.DataFrame()
+
+    header = [str(cell or "").strip() for cell in tables[0][0]]
+    rows = []
+    for table in tables:
+        for row in table:
+            cells = [cell.strip() if isinstance(cell, str) else cell for cell in row]
+            if len(cells) != len(header) or cells == header:
+                continue
+            if all(cell in ("", None) for cell in cells):
+                continue
+            rows.append([None if cell == "" else cell for cell in cells])
+
+    return pd.DataFrame(rows, columns=header)
+
+
+def load_pdf_statement(
+    path: str,
+    account: str,
+    columns_mapping: dict,
+    final_columns: list,
+    cache_dir: str,
+    nrows: int = None,
+    read_only: bool = False,
+) -> pd.DataFrame:
+    df = tables_to_dataframe(load_cached_tables(path, cache_dir, read_only))
+    if nrows is not None:
+        df = df.head(nrows)
+    return normalise_statement(df, account, columns_mapping, final_columns)
@@ -1,8 +1,10 @@
-from data_processing.data_loading import load_config, load_path_variables
+from data_processing.data_loading import load_config, load_path_variables, load_state_dir
+from data_processing.stage_cache import STAGE_CACHE_DIR
 from data_processing.file_management import unarchive_processed_folders
-from parser.excel.openpyxl.main import delete_sheet_in_excel_file
+from parser.excel.openpyxl.main import delete_excel_shards, delete_sheet_in_excel_file
 import pandas as pd
 import os
+import shutil
 import yaml
 import warnings
 
@@ -17,10 +19,29 @@ def main():
     archive_dir = os.path.join(DATA_DIR, archive_folder)
 
     print(f"Unarchiving files in '{archive_dir}' and moving to '{DATA_DIR}'...")
-    unarchive_processed_folders(archive_dir, DATA_DIR)
+    if not unarchive_processed_folders(archive_dir, DATA_DIR):
+        # The state still describes the statements left in the archive
+        print(
+            "[❌] Reset stopped before removing any state. Resolve the files above "
+            "and run it again."
+        )
+        raise SystemExit(1)
 
-    print(f"Removing worksheet in '{EXCEL_OUTPUT_PATH}'...")
-    delete_sheet_in_excel_file(EXCEL_OUTPUT_PATH)
+    if config.get("excel_sharding"):
+        print(f"Removing the workbook shards of '{EXCEL_OUTPUT_PATH}'...")
+        delete_excel_shards(EXCEL_OUTPUT_PATH)
+    else:
+        print(f"Removing worksheet in '{EXCEL_OUTPUT_PATH}'...")
+        delete_sheet_in_excel_file(EXCEL_OUTPUT_PATH)
+
+    # History, running totals, series, statistics, cursors and balances describe
+    # the statements just unarchived; keeping them would count those twice
+    state_dir = load_state_dir(config)
+    stage_cache_dir = os.path.join(DATA_DIR, STAGE_CACHE_DIR)
+    for directory in (state_dir, stage_cache_dir):
+        if os.path.isdir(directory):
+            print(f"Removing '{directory}'...")
+            shutil.rmtree(directory)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+"""
+rules.py
+
+Try out a categorisation rule against the stored history before adding it to
+`categorisation_rules.py`:
+
+    python rules.py preview --category Bills --subcategory Phone --contains EE "BT Group"
+    python rules.py preview --category Bills --subcategory Phone
+
+Without `--contains` the terms are read from a prompt, one rule after another,
+so a rule can be refined without reloading anything.
+"""
+
+import argparse
+import os
+import time
+import warnings
+
+from categorisation.categorisation_rules import rules
+from categorisation.rule_preview import (
+    build_merchant_table,
+    format_preview,
+    preview_rule,
+)
+from data_processing.data_loading import load_config, load_state_dir
+from data_processing.history import load_history
+from data_processing.stage_cache import (
+    STAGE_CACHE_DIR,
+    file_digest,
+    open_stage_cache,
+    resolve,
+    run_stage,
+)
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+
+def load_merchant_table(config: dict):
+    """Merchant table of the stored history, rebuilt only when the history changed."""
+    history_path = os.path.join(load_state_dir(config), "history.csv")
+    if not os.path.exists(history_path):
+        raise FileNotFoundError(
+            f"No stored history at '{history_path}'. Run main.py first."
+        )
+    stage_cache = open_stage_cache(
+        os.path.join(config["data_dir"], STAGE_CACHE_DIR),
+        config.get("stage_cache", True),
+    )
+    merchants = run_stage(
+        stage_cache,
+        "merchants",
+        lambda: build_merchant_table(load_history(history_path), rules),
+        {"history": file_digest(history_path), "rules": rules},
+        keep=1,
+    )
+    return resolve(merchants)
+
+
+def preview(merchants, category: str, subcategory: str, terms: list[str]):
+    rule = {
+        "category": category,
+        "conditions": [{"column": "Name", "contains": terms}],
+    }
+    if subcategory:
+        rule["subcategory"] = subcategory
+    start = time.perf_counter()
+    result = preview_rule(merchants, rule)
+    elapsed = time.perf_counter() - start
+    print(f"[🔍] Name contains {', '.join(map(repr, terms))}")
+    for line in format_preview(result):
+        print(line)
+    print(f"Matched in {elapsed * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Work with categorisation rules.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    preview_parser = commands.add_parser(
+        "preview", help="show what a candidate rule matches in the stored history"
+    )
+    preview_parser.add_argument("--category", required=True)
+    preview_parser.add_argument("--subcategory")
+    preview_parser.add_argument(
+        "--contains", nargs="+", metavar="TERM", help="terms matched case-insensitively"
+    )
+    parser.add_argument("--config", default="config.yaml")
+    args = parser.parse_args()
+
+    print("Loading stored history...")
+    merchants = load_merchant_table(load_config(args.config))
+    print(f"{len(merchants)} unique merchants")
+
+    if args.contains:
+        preview(merchants, args.category, args.subcategory, args.contains)
+        return
+    while True:
+        try:
+            line = input("Terms (comma separated, empty to quit)> ")
+        except EOFError:
+            break
+        terms = [term.strip() for term in line.split(",") if term.strip()]
+        if not terms:
+            break
+        preview(merchants, args.category, args.subcategory, terms)
+
+
+if __name__ == "__main__":
+    main()
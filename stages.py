@@ -0,0 +1,701 @@
+"""
+stages.py
+
+The stages of a tracker run. Each stage takes its inputs as arguments and
+returns its outputs, so `main.run` only wires them together and the stages
+whose inputs can be hashed are cached by `run_stage` under the same keys.
+State is never saved here: `run` commits it once every output is written.
+"""
+
+import os
+import pandas as pd
+from contextlib import nullcontext
+
+from data_processing.data_loading import combine_statements
+from data_processing.file_management import atomic_write
+from data_processing.fx import convert_to_base_currency
+from data_processing.history import (
+    apply_category_edits,
+    find_category_edits,
+    fingerprint_rows,
+    split_window,
+    update_overrides,
+)
+from data_processing.pipeline import prefetch
+from data_processing.preview import preview_changes
+from data_processing.stage_cache import file_digest, resolve, run_stage
+from parser.csv_parser import write_csv
+from analysis.recurring import (
+    classify_series,
+    merge_series,
+    overlapping_series,
+    rescan_series,
+    summarise_series,
+)
+from analysis.rollups import (
+    MERCHANT_ROLLUP_KEYS,
+    load_rollup,
+    monthly_rollup,
+    update_rollup,
+)
+from analysis.anomalies import batch_stats, merge_stats, score_anomalies
+from analysis.budgets import evaluate_budgets
+from analysis.reconciliation import find_gaps, reconcile_balances, update_positions
+from analysis.transfers import exclude_transfers, match_stored_transfers, match_transfers
+from categorisation.manual_categorisation import (
+    apply_categorisation_rules,
+    apply_categorisation_rules_chunked,
+    categorisation_pool,
+)
+from parser.excel.openpyxl.main import (
+    read_master_data_categories,
+    shard_path,
+    shard_periods,
+    update_excel_file,
+    update_sharded_excel_files,
+)
+from parser.excel.openpyxl.excel_formatting import CURRENCY_SYMBOLS
+from parser.html.report import build_html_report, report_files
+
+
+def read_workbook_edits(
+    history: pd.DataFrame,
+    overrides: pd.DataFrame,
+    workbooks: list[str],
+    category_emoji_map: dict,
+) -> tuple[pd.DataFrame, pd.DataFrame, list[pd.DataFrame]]:
+    """
+    Read category corrections made in MasterData back into the run state.
+
+    Args:
+        history (pd.DataFrame): Stored history.
+        overrides (pd.DataFrame): Stored category overrides.
+        workbooks (list[str]): Workbooks modified since the history was saved.
+        category_emoji_map (dict): Category to emoji, stripped from the sheet.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame, list[pd.DataFrame]]: The history and
+        overrides with the edits applied, and the rollup deltas moving the
+        edited rows between categories.
+    """
+    print("Reading back category edits from MasterData...")
+    sheets = []
+    for path in workbooks:
+        sheet = read_master_data_categories(path, category_emoji_map)
+        sheet["Fingerprint"] = fingerprint_rows(sheet)
+        sheets.append(sheet[["Fingerprint", "Category", "Subcategory"]])
+    edits = find_category_edits(history, pd.concat(sheets, ignore_index=True))
+    if edits.empty:
+        return history, overrides, []
+
+    print(f"[✏️] {len(edits)} categories corrected in the workbook")
+    overrides = update_overrides(
+        overrides,
+        edits.drop(columns=["Category", "Subcategory"]).rename(
+            columns={"New Category": "Category", "New Subcategory": "Subcategory"}
+        ),
+    )
+    # Move the edited rows between categories in the running totals
+    edited = exclude_transfers(edits)
+    edit_deltas = []
+    if not edited.empty:
+        edit_deltas = [
+            monthly_rollup(edited, sign=-1),
+            monthly_rollup(
+                edited.assign(
+                    Category=edited["New Category"],
+                    Subcategory=edited["New Subcategory"],
+                )
+            ),
+        ]
+    return apply_category_edits(history, edits), overrides, edit_deltas
+
+
+def parse_and_categorise(
+    statements,
+    rules: list[dict],
+    currencies: dict[str, str],
+    base_currency: str,
+    fx_rates: pd.DataFrame,
+    categorisation: dict,
+    stage_cache: dict,
+) -> list:
+    """
+    Convert and categorise each statement while the next one is being parsed.
+
+    Args:
+        statements: `(account, path, statement)` tuples from `iter_statements`.
+        rules (list[dict]): Categorisation rules, ideally passed through `compile_rules`.
+        currencies (dict[str, str]): Currency of each account.
+        base_currency (str): Currency the amounts are converted to.
+        fx_rates (pd.DataFrame): Exchange rates, or None when every account is
+            in the base currency.
+        categorisation (dict): The `categorisation:` config section.
+        stage_cache (dict): Cache from `open_stage_cache`.
+
+    Returns:
+        list: A cached result per statement, to be passed to `combine`.
+    """
+    workers = categorisation.get("workers")
+    # One pool for the whole run; its workers only start once a statement needs them
+    pool = categorisation_pool(rules, workers) if workers else nullcontext()
+
+    def categorise(statement: pd.DataFrame) -> pd.DataFrame:
+        statement = convert_to_base_currency(
+            statement, currencies, base_currency, fx_rates
+        )
+        if workers:
+            # Large backfills are categorised in blocks on a process pool
+            statement[["Category", "Subcategory"]] = apply_categorisation_rules_chunked(
+                statement,
+                rules,
+                categorisation.get("chunk_size", 100_000),
+                workers,
+                executor=pool,
+            )
+        else:
+            statement[["Category", "Subcategory"]] = apply_categorisation_rules(
+                statement, rules
+            )
+        return statement
+
+    print("Parsing and categorising statements...")
+    df_list = []
+    with pool:
+        for account, path, statement in prefetch(statements):
+            df_list.append(
+                run_stage(
+                    stage_cache,
+                    "categorise",
+                    lambda: categorise(statement),
+                    {
+                        "statement": statement,
+                        "rules": rules,
+                        "currencies": currencies,
+                        "base_currency": base_currency,
+                        "fx_rates": fx_rates,
+                    },
+                    label=os.path.basename(path),
+                )
+            )
+    return df_list
+
+
+def combine(df_list: list, output_columns: list[str], stage_cache: dict) -> pd.DataFrame:
+    """
+    Concatenate the categorised statements.
+
+    Args:
+        df_list (list): Results of `parse_and_categorise`.
+        output_columns (list[str]): Columns of the output files.
+        stage_cache (dict): Cache from `open_stage_cache`.
+
+    Returns:
+        pd.DataFrame: The batch, safe to modify.
+    """
+    print("Combining statements...")
+    combined = run_stage(
+        stage_cache,
+        "combine",
+        lambda: combine_statements(resolve(df_list), output_columns),
+        {"statements": df_list},
+        version=2,
+        keep=1,
+    )
+    return resolve(combined).copy()
+
+
+def replace_window(
+    df: pd.DataFrame,
+    history: pd.DataFrame,
+    accounts: list[str],
+    since: pd.Timestamp = None,
+    until: pd.Timestamp = None,
+) -> tuple[pd.DataFrame, pd.DataFrame, tuple]:
+    """
+    Take the stored transactions being reprocessed out of the history.
+
+    Args:
+        df (pd.DataFrame): The reprocessed batch.
+        history (pd.DataFrame): Stored history.
+        accounts (list[str]): Reprocessed accounts.
+        since (pd.Timestamp, optional): First date, defaults to the batch's first.
+        until (pd.Timestamp, optional): Last date, defaults to the batch's last.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame, tuple]: The remaining history, the
+        removed rows and the `(accounts, start, end)` window.
+
+    Raises:
+        ValueError: If the batch has rows outside the window.
+    """
+    window_start = since if since is not None else df["Date"].min()
+    window_end = until if until is not None else df["Date"].max()
+    outside = df[~df["Date"].between(window_start, window_end)]
+    if not outside.empty:
+        # Dropping them would lose them once the statement is archived
+        raise ValueError(
+            f"{len(outside)} transactions from {outside['Date'].min():%d/%m/%Y} "
+            f"to {outside['Date'].max():%d/%m/%Y} fall outside the reprocessing "
+            f"window. Widen --since/--until to cover the whole statement."
+        )
+    window = (sorted(accounts), window_start, window_end)
+    history, removed = split_window(history, *window)
+    print(
+        f"[🔁] Replacing {len(removed)} stored transactions of "
+        f"{', '.join(window[0])} from {window_start:%d/%m/%Y} to "
+        f"{window_end:%d/%m/%Y} with {len(df)} reprocessed ones"
+    )
+    return history, removed, window
+
+
+def reconcile(
+    df: pd.DataFrame, positions: pd.DataFrame, reconciliation: dict
+) -> pd.DataFrame:
+    """
+    Report balance discrepancies and gaps between statements.
+
+    Args:
+        df (pd.DataFrame): The batch.
+        positions (pd.DataFrame): Stored last balance of each account.
+        reconciliation (dict): The `reconciliation:` config section.
+
+    Returns:
+        pd.DataFrame: The positions after the batch.
+    """
+    print("Reconciling balances...")
+    discrepancies = reconcile_balances(
+        df, positions, reconciliation.get("tolerance", 0.01)
+    )
+    for _, row in discrepancies.iterrows():
+        print(
+            f"[⚠️] {row['Account']} balance {row['Balance']:.2f} on "
+            f"{row['Date']:%d/%m/%Y} ({row['Name']}), expected {row['Expected']:.2f}"
+        )
+    gaps = find_gaps(df, positions, reconciliation.get("max_gap_days", 35))
+    for _, row in gaps.iterrows():
+        print(
+            f"[⚠️] No {row['Account']} transactions from {row['From']:%d/%m/%Y} "
+            f"to {row['To']:%d/%m/%Y} ({row['Days']} days), is a statement missing?"
+        )
+    return update_positions(positions, df)
+
+
+def print_preview(
+    df: pd.DataFrame,
+    history: pd.DataFrame,
+    removed: pd.DataFrame,
+    n_files: int,
+    preview_rows: int = None,
+) -> None:
+    """
+    Print how a dry run would change the stored transactions.
+
+    Args:
+        df (pd.DataFrame): The batch.
+        history (pd.DataFrame): Stored history outside the reprocessing window.
+        removed (pd.DataFrame): Stored rows the batch would replace.
+        n_files (int): Number of statements read.
+        preview_rows (int, optional): Rows read from each statement.
+    """
+    rows = f"first {preview_rows} rows of " if preview_rows is not None else ""
+    print(f"[👀] Dry run: {len(df)} transactions from the {rows}{n_files} files")
+    # Compared with the stored rows being replaced, not as brand new ones
+    for line in preview_changes(df, pd.concat([history, removed], ignore_index=True)):
+        print(line)
+    print("Nothing was written or archived.")
+
+
+def link_transfers(
+    df: pd.DataFrame, history: pd.DataFrame, removed: pd.DataFrame, options: dict
+) -> tuple[pd.Series, pd.DataFrame, pd.DataFrame]:
+    """
+    Match transfers within the batch and with earlier transactions.
+
+    Args:
+        df (pd.DataFrame): The batch, with fingerprints.
+        history (pd.DataFrame): Stored history outside the reprocessing window.
+        removed (pd.DataFrame): Stored rows being reprocessed.
+        options (dict): The `transfers:` config section.
+
+    Returns:
+        tuple[pd.Series, pd.DataFrame, pd.DataFrame]: The Transfer ID of each
+        row of `df`, the history with its newly paired rows marked, and those
+        stored rows as they were before, to be taken out of the totals.
+    """
+    print("Matching transfers between accounts...")
+    transfer_ids = match_transfers(df, **options)
+    if not removed.empty:
+        # The other side of a reprocessed transfer is not reprocessed with it
+        stored_ids = removed.dropna(subset=["Transfer ID"]).set_index("Fingerprint")
+        transfer_ids = transfer_ids.fillna(
+            df["Fingerprint"].map(stored_ids["Transfer ID"])
+        )
+    print(f"Matched {transfer_ids.notna().sum() // 2} transfers")
+    # Transfers whose other side was stored by an earlier run
+    new_ids, stored_ids = match_stored_transfers(
+        df.assign(**{"Transfer ID": transfer_ids}), history, **options
+    )
+    late_transfers = history[stored_ids.notna()]
+    if not late_transfers.empty:
+        transfer_ids = transfer_ids.fillna(new_ids)
+        history = history.copy()
+        history.loc[stored_ids.notna(), "Transfer ID"] = stored_ids.dropna()
+        print(f"Matched {len(late_transfers)} transfers with earlier transactions")
+    return transfer_ids, history, late_transfers
+
+
+def detect_recurring(
+    spending: pd.DataFrame,
+    fresh: pd.DataFrame,
+    history: pd.DataFrame,
+    stored_series: pd.DataFrame,
+    options: dict,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Fold the batch into the recurring series and classify them.
+
+    Args:
+        spending (pd.DataFrame): The batch without transfers.
+        fresh (pd.DataFrame): The spending not already folded in by an earlier run.
+        history (pd.DataFrame): Stored history.
+        stored_series (pd.DataFrame): Stored series summaries.
+        options (dict): The `recurring:` config section.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: The updated series and the recurring ones.
+    """
+    print("Detecting recurring payments...")
+    new_series = summarise_series(fresh)
+    series = merge_series(stored_series, new_series)
+    late = overlapping_series(stored_series, new_series)
+    if not late.empty:
+        # Payments interleaved with stored ones: re-derive those series exactly
+        unseen = spending[~spending["Fingerprint"].isin(history["Fingerprint"])]
+        series = rescan_series(
+            series, pd.concat([exclude_transfers(history), unseen]), late
+        )
+    recurring = classify_series(series, **options)
+    print(f"Found {len(recurring)} recurring payments")
+    return series, recurring
+
+
+def score_unusual(
+    spending: pd.DataFrame, fresh: pd.DataFrame, stats: pd.DataFrame, options: dict
+) -> tuple[pd.Series, pd.DataFrame]:
+    """
+    Flag unusual payments, then fold the batch into the statistics.
+
+    Args:
+        spending (pd.DataFrame): The batch without transfers.
+        fresh (pd.DataFrame): The spending not already folded in by an earlier run.
+        stats (pd.DataFrame): Stored merchant and category statistics.
+        options (dict): The `anomalies:` config section.
+
+    Returns:
+        tuple[pd.Series, pd.DataFrame]: The label of each flagged row of
+        `spending`, and the updated statistics.
+    """
+    print("Scoring unusual payments...")
+    # Scored against the statistics from before this batch, then folded in
+    anomalies = score_anomalies(spending, stats, **options)
+    for _, row in spending[anomalies.notna()].iterrows():
+        print(
+            f"[🔎] Unusual payment: {row['Name']} {row['Amount']:.2f} on "
+            f"{row['Date']:%d/%m/%Y} ({row['Account']})"
+        )
+    return anomalies, merge_stats(stats, batch_stats(fresh))
+
+
+def update_totals(
+    spending: pd.DataFrame,
+    replaced: pd.DataFrame,
+    edit_deltas: list[pd.DataFrame],
+    rollup_path: str,
+    merchant_rollup_path: str,
+    stage_cache: dict,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Add the batch to the stored monthly totals.
+
+    Args:
+        spending (pd.DataFrame): The batch without transfers.
+        replaced (pd.DataFrame): Stored rows to take back out of the totals.
+        edit_deltas (list[pd.DataFrame]): Deltas from `read_workbook_edits`.
+        rollup_path (str): Stored category totals.
+        merchant_rollup_path (str): Stored merchant totals.
+        stage_cache (dict): Cache from `open_stage_cache`.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: Category and merchant totals.
+    """
+    print("Updating running totals and budgets...")
+    replaced_deltas, replaced_merchant_deltas = [], []
+    if not replaced.empty:
+        replaced_deltas = [monthly_rollup(replaced, sign=-1)]
+        replaced_merchant_deltas = [
+            monthly_rollup(replaced, sign=-1, keys=MERCHANT_ROLLUP_KEYS)
+        ]
+
+    def compute_rollups():
+        totals = update_rollup(
+            load_rollup(rollup_path),
+            pd.concat(
+                [monthly_rollup(spending), *replaced_deltas, *edit_deltas],
+                ignore_index=True,
+            ),
+        )
+        merchant_totals = update_rollup(
+            load_rollup(merchant_rollup_path, MERCHANT_ROLLUP_KEYS),
+            pd.concat(
+                [
+                    monthly_rollup(spending, keys=MERCHANT_ROLLUP_KEYS),
+                    *replaced_merchant_deltas,
+                ],
+                ignore_index=True,
+            ),
+            MERCHANT_ROLLUP_KEYS,
+        )
+        return totals, merchant_totals
+
+    # Keyed on the stored totals too, since the new ones are built on top of them
+    return resolve(
+        run_stage(
+            stage_cache,
+            "rollup",
+            compute_rollups,
+            {
+                "spending": spending,
+                "edits": edit_deltas,
+                "replaced": replaced,
+                "totals": file_digest(rollup_path),
+                "merchant_totals": file_digest(merchant_rollup_path),
+            },
+            keep=1,
+        )
+    )
+
+
+def check_budgets(totals: pd.DataFrame, budgets: list[dict]) -> pd.DataFrame:
+    """
+    Evaluate the budgets and report those overspent.
+
+    Args:
+        totals (pd.DataFrame): Monthly category totals.
+        budgets (list[dict]): The `budgets:` config section.
+
+    Returns:
+        pd.DataFrame: The budget report from `evaluate_budgets`.
+    """
+    budget_report = evaluate_budgets(totals, budgets)
+    for _, row in budget_report[budget_report["Status"] == "Over budget"].iterrows():
+        print(
+            f"[⚠️] {row['Category']} {row['Subcategory']} over budget: "
+            f"{row['Spend']:.2f} of {row['Budget']:.2f} ({row['Window']})"
+        )
+    return budget_report
+
+
+def format_for_output(
+    df: pd.DataFrame,
+    output_columns: list[str],
+    category_list: list[str],
+    category_colour_map: dict,
+    category_emoji_map: dict,
+) -> tuple[pd.DataFrame, list[str], dict]:
+    """
+    Select the output columns and prefix the categories with their emoji.
+
+    Args:
+        df (pd.DataFrame): The batch.
+        output_columns (list[str]): Columns of the output files.
+        category_list (list[str]): Categories from the config.
+        category_colour_map (dict): Category to colour.
+        category_emoji_map (dict): Category to emoji.
+
+    Returns:
+        tuple[pd.DataFrame, list[str], dict]: The output rows, and the category
+        list and colour map keyed by the prefixed names.
+    """
+    df = df[output_columns].copy()
+    print(df.head())
+
+    df["Category"] = df["Category"].apply(
+        lambda cat: (
+            f"{category_emoji_map.get(cat, '')} {cat}"
+            if cat in category_emoji_map
+            else cat
+        )
+    )
+    category_colour_map = {
+        f"{category_emoji_map.get(cat, '')} {cat}": colour
+        for cat, colour in category_colour_map.items()
+    }
+    category_list_with_emojis = [
+        f"{category_emoji_map.get(cat, '')} {cat}" for cat in category_list
+    ]
+    return df, category_list_with_emojis, category_colour_map
+
+
+# Each output is skipped when it was already written from identical inputs and
+# has not been modified since.
+def export_csv(
+    df: pd.DataFrame, path: str, engine: str, compression: str, stage_cache: dict
+) -> None:
+    """
+    Write the batch to the combined CSV.
+
+    Args:
+        df (pd.DataFrame): Output rows from `format_for_output`.
+        path (str): CSV path, with the compression extension.
+        engine (str): CSV engine.
+        compression (str): Output compression.
+        stage_cache (dict): Cache from `open_stage_cache`.
+    """
+
+    def write():
+        with atomic_write(path) as tmp_path:
+            write_csv(df, tmp_path, engine, compression)
+        print(f"Combined CSV saved to: {path}")
+
+    run_stage(
+        stage_cache,
+        "export_csv",
+        write,
+        {"df": df, "engine": engine, "compression": compression},
+        outputs=[path],
+    )
+
+
+def export_excel(
+    df: pd.DataFrame,
+    path: str,
+    category_list: list[str],
+    subcategory_list: list[str],
+    category_colour_map: dict,
+    account_colour_map: dict,
+    base_currency: str,
+    extra_sheets: dict[str, pd.DataFrame],
+    sharding: str,
+    window: tuple,
+    history_path: str,
+    stage_cache: dict,
+) -> None:
+    """
+    Append the batch to the workbook, or to its shards.
+
+    Args:
+        df (pd.DataFrame): Output rows from `format_for_output`.
+        path (str): Workbook path, or the index workbook when sharded.
+        category_list (list[str]): Categories with their emoji.
+        subcategory_list (list[str]): Subcategories.
+        category_colour_map (dict): Category with emoji to colour.
+        account_colour_map (dict): Account to colour.
+        base_currency (str): Currency of the amounts.
+        extra_sheets (dict[str, pd.DataFrame]): Sheets rewritten on every run.
+        sharding (str): `excel_sharding` period, or None.
+        window (tuple): Reprocessing window whose rows are replaced, or None.
+        history_path (str): Stored history, not yet updated by this run.
+        stage_cache (dict): Cache from `open_stage_cache`.
+    """
+    outputs = [path]
+    if sharding:
+        dates = df["Date"]
+        if window:
+            dates = pd.concat(
+                [dates, pd.Series(pd.date_range(window[1], window[2], freq="D"))]
+            )
+        outputs += [
+            shard_path(path, period)
+            for period in shard_periods(dates, sharding).unique()
+        ]
+
+    def write():
+        # update_excel_file reformats the date columns in place
+        if sharding:
+            touched = update_sharded_excel_files(
+                df.copy(),
+                path,
+                sharding,
+                category_list,
+                subcategory_list,
+                category_colour_map,
+                account_colour_map,
+                base_currency,
+                extra_sheets=extra_sheets,
+                replace=window,
+            )
+            print(
+                f"Excel shards {', '.join(map(os.path.basename, touched))} "
+                f"and index {path} saved"
+            )
+            return
+        update_excel_file(
+            df.copy(),
+            path,
+            category_list,
+            subcategory_list,
+            category_colour_map,
+            account_colour_map,
+            base_currency,
+            extra_sheets=extra_sheets,
+            replace=window,
+        )
+        print(f"Excel spreadsheet saved to {path}")
+
+    # The rows are appended, so like the totals the workbook is written again when
+    # the same batch lands on different stored state
+    run_stage(
+        stage_cache,
+        "export_excel",
+        write,
+        {
+            "df": df,
+            "categories": category_list,
+            "subcategories": subcategory_list,
+            "category_colours": category_colour_map,
+            "account_colours": account_colour_map,
+            "base_currency": base_currency,
+            "extra_sheets": extra_sheets,
+            "sharding": sharding,
+            "replace": window,
+            "history": file_digest(history_path),
+        },
+        outputs=outputs,
+    )
+
+
+def export_html(
+    totals: pd.DataFrame,
+    merchant_totals: pd.DataFrame,
+    report_dir: str,
+    base_currency: str,
+    stage_cache: dict,
+) -> None:
+    """
+    Re-render the HTML report pages whose months changed.
+
+    Args:
+        totals (pd.DataFrame): Monthly category totals.
+        merchant_totals (pd.DataFrame): Monthly merchant totals.
+        report_dir (str): Report directory.
+        base_currency (str): Currency of the amounts.
+        stage_cache (dict): Cache from `open_stage_cache`.
+    """
+    currency_symbol = CURRENCY_SYMBOLS.get(base_currency.upper(), f"{base_currency} ")
+
+    def write():
+        rendered = build_html_report(totals, merchant_totals, report_dir, currency_symbol)
+        print(f"HTML report saved to {report_dir} ({len(rendered)} months re-rendered)")
+
+    run_stage(
+        stage_cache,
+        "export_html",
+        write,
+        {
+            "totals": totals,
+            "merchant_totals": merchant_totals,
+            "currency_symbol": currency_symbol,
+        },
+        outputs=report_files(totals, report_dir),
+    )
@@ -0,0 +1,11 @@
+"""
+tests/conftest.py
+
+Makes the repository's top-level packages importable when the tests are run
+with a bare `pytest` from any directory.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
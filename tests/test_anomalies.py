@@ -0,0 +1,51 @@
+"""
+tests/test_anomalies.py
+"""
+
+import numpy as np
+import pandas as pd
+
+from analysis.anomalies import ANOMALY_LABEL, batch_stats, merge_stats, score_anomalies
+
+
+def payments(amounts: list[float], name: str = "Greggs", category: str = "Food"):
+    return pd.DataFrame(
+        {"Name": name, "Category": category, "Amount": [-amount for amount in amounts]}
+    )
+
+
+def test_merged_statistics_match_a_single_batch():
+    rng = np.random.default_rng(0)
+    amounts = rng.gamma(2.0, 10.0, 60).round(2).tolist()
+    df = pd.concat(
+        [payments(amounts[:40]), payments(amounts[40:], name="Pret"), payments([3.0], name="")],
+        ignore_index=True,
+    )
+    merged = merge_stats(
+        merge_stats(batch_stats(df.iloc[:25]), batch_stats(df.iloc[25:50])),
+        batch_stats(df.iloc[50:]),
+    )
+    whole = batch_stats(df)
+    on = ["Level", "Key"]
+    pd.testing.assert_frame_equal(
+        merged.sort_values(on).reset_index(drop=True),
+        whole.sort_values(on).reset_index(drop=True),
+        check_dtype=False,
+    )
+    assert "" not in merged["Key"].tolist()
+
+
+def test_payments_far_above_the_merchant_mean_are_flagged():
+    stats = batch_stats(payments([4.0, 4.5, 5.0, 4.2, 4.8, 4.6]))
+    batch = pd.concat(
+        [
+            payments([4.9, 25.0]),
+            payments([500.0], name="New Shop"),  # scored against its category instead
+            payments([100.0], name="Refund").assign(Amount=100.0),
+        ],
+        ignore_index=True,
+    )
+    flags = score_anomalies(batch, stats, min_count=5)
+    assert flags.eq(ANOMALY_LABEL).tolist() == [False, True, True, False]
+    # Too little history to score against
+    assert score_anomalies(batch, stats, min_count=10).isna().all()
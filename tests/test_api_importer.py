@@ -0,0 +1,80 @@
+"""
+tests/test_api_importer.py
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from parser.api_importer import load_api_statement
+
+COLUMNS = ["Date", "Name", "Amount", "Amount Out", "Amount In", "Account"]
+RECORDS = [
+    {"bookingDateTime": f"2024-01-0{day}T10:00:00Z", "transactionInformation": name, "amount": amount}
+    for day, name, amount in [(2, "Netflix", -9.99), (4, "TESCO STORES", -20.0), (6, "Salary", 2000.0)]
+]
+
+
+class InclusiveFeed(BaseHTTPRequestHandler):
+    """Answers with the records at or after `since`, two per page."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        since = query.get("since", [""])[0]
+        size, page = int(query["page_size"][0]), int(query["page"][0])
+        records = [record for record in RECORDS if record["bookingDateTime"] >= since]
+        body = {
+            "transactions": records[(page - 1) * size : page * size],
+            "total_pages": max(1, -(-len(records) // size)),
+        }
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+
+@pytest.fixture
+def account():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), InclusiveFeed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield {
+        "format": "api",
+        "api": {
+            "url": f"http://127.0.0.1:{server.server_port}/transactions",
+            "cursor_field": "bookingDateTime",
+            "page_size": 2,
+            "requests_per_second": 0,
+        },
+        "mapping": {
+            "bookingDateTime": "Date",
+            "transactionInformation": "Name",
+            "amount": "Amount",
+        },
+    }
+    server.shutdown()
+
+
+def test_all_pages_are_fetched_and_the_cursor_advances(account):
+    df, cursor = load_api_statement("bank4", account, COLUMNS)
+    assert df["Name"].tolist() == ["Netflix", "TESCO STORES", "Salary"]
+    assert df["Date"].tolist() == ["02/01/2024", "04/01/2024", "06/01/2024"]
+    assert cursor == "2024-01-06T10:00:00Z"
+
+
+def test_record_at_the_cursor_is_not_imported_again(account):
+    _, cursor = load_api_statement("bank4", account, COLUMNS, "2024-01-04T10:00:00Z")
+    assert cursor == "2024-01-06T10:00:00Z"
+    df, again = load_api_statement("bank4", account, COLUMNS, cursor)
+    assert df.empty and again == cursor
+
+
+def test_unknown_api_option_is_named(account):
+    account["api"]["page_szie"] = 50
+    with pytest.raises(ValueError, match="page_szie"):
+        load_api_statement("bank4", account, COLUMNS)
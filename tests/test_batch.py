@@ -0,0 +1,27 @@
+"""
+tests/test_batch.py
+
+Needs the household's `categorisation_rules` and the model runners that
+`main` imports, so it is skipped where they are not installed.
+"""
+
+import pytest
+
+batch = pytest.importorskip("batch")
+
+
+def test_a_failing_tenant_does_not_stop_the_others(monkeypatch):
+    def run(config, rules):
+        if config["path"] == "broken.yaml":
+            raise ValueError("Unknown accounts to reprocess: savings")
+        return {"parse_and_categorise": 0.5}
+
+    monkeypatch.setattr(batch, "load_config", lambda path: {"path": path})
+    monkeypatch.setattr(batch, "run", run)
+    paths = ["alice.yaml", "broken.yaml", "bob.yaml"]
+    results = batch.run_batch(paths, workers=2)
+
+    assert [result["config"] for result in results] == paths
+    assert [result["status"] for result in results] == ["ok", "failed", "ok"]
+    assert "Unknown accounts to reprocess" in results[1]["error"]
+    assert results[0]["stages"] == {"parse_and_categorise": 0.5}
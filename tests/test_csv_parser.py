@@ -0,0 +1,67 @@
+"""
+tests/test_csv_parser.py
+"""
+
+import pandas as pd
+import pytest
+
+from parser.csv_parser import load_csv_statement, read_csv, write_csv
+
+COLUMNS = ["Date", "Type", "Name", "Amount", "Amount Out", "Amount In", "Account"]
+MAPPING = {
+    "transaction date": "Date",
+    "transaction type": "Type",
+    "transaction description": "Name",
+    "debit amount": "Amount Out",
+    "credit amount": "Amount In",
+}
+STATEMENT = (
+    "Transaction Date,Transaction Type,Transaction Description,Debit Amount,Credit Amount\n"
+    "05/01/2024,DEB,TESCO STORES,12.50,\n"
+    "06/01/2024,BGC,,,\"£1,200.00\"\n"
+    "07/01/2024,DEB,Greggs,4,\n"
+)
+
+
+@pytest.fixture
+def statement_path(tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text(STATEMENT)
+    return str(path)
+
+
+@pytest.mark.parametrize("engine", ["pandas", "pyarrow"])
+def test_engines_parse_statements_identically(statement_path, engine):
+    pytest.importorskip(engine)
+    df = load_csv_statement(statement_path, "bank1", MAPPING, COLUMNS, engine)
+    assert df["Amount"].tolist() == [-12.5, 1200.0, -4.0]
+    assert df["Date"].tolist() == ["05/01/2024", "06/01/2024", "07/01/2024"]
+    assert df["Name"].isna().tolist() == [False, True, False]
+
+
+def test_unreadable_amount_is_an_error(tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text(STATEMENT.replace("12.50", "twelve"))
+    with pytest.raises(ValueError, match="twelve"):
+        load_csv_statement(str(path), "bank1", MAPPING, COLUMNS)
+
+
+@pytest.mark.parametrize("engine", ["pandas", "pyarrow"])
+@pytest.mark.parametrize("compression", [None, "gzip", "zstd"])
+def test_written_csv_reads_back_the_same(tmp_path, engine, compression):
+    pytest.importorskip(engine)
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    df = pd.DataFrame(
+        {
+            "Date": pd.to_datetime(["2024-01-05", "2024-01-06"]),
+            "Name": ["TESCO STORES", None],
+            "Amount": [-12.5, 1200.0],
+        }
+    )
+    path = str(tmp_path / "out.csv")
+    write_csv(df, path, engine, compression)
+    back = read_csv(path, "pandas", compression="infer" if not compression else compression)
+    assert back["Date"].tolist() == ["2024-01-05", "2024-01-06"]
+    assert back["Name"].isna().tolist() == [False, True]
+    assert back["Amount"].tolist() == [-12.5, 1200.0]
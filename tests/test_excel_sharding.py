@@ -0,0 +1,90 @@
+"""
+tests/test_excel_sharding.py
+"""
+
+import os
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from parser.excel.openpyxl.main import (
+    INDEX_SHEET,
+    list_shards,
+    shard_path,
+    update_sharded_excel_files,
+)
+
+COLUMNS = ["Date", "Time", "Type", "Name", "Amount", "Category", "Subcategory", "Account"]
+
+
+def transactions(dates: list[str], account: str = "bank1") -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Date": pd.to_datetime(dates),
+            "Time": None,
+            "Type": "DEB",
+            "Name": "TESCO STORES",
+            "Amount": -12.5,
+            "Category": "Food",
+            "Subcategory": "Groceries",
+            "Account": account,
+        }
+    )[COLUMNS]
+
+
+def write(df: pd.DataFrame, path: str, replace: tuple = None) -> list[str]:
+    return update_sharded_excel_files(
+        df, path, "quarter", ["Food"], ["Groceries"], {}, {}, replace=replace
+    )
+
+
+def index_rows(path: str) -> list[tuple]:
+    rows = list(load_workbook(path)[INDEX_SHEET].iter_rows(min_row=2, values_only=True))
+    return [(period, n, str(first.date()), str(last.date())) for period, _, n, first, last in rows]
+
+
+def test_only_the_quarters_present_are_written(tmp_path):
+    path = str(tmp_path / "tracker.xlsx")
+    assert write(transactions(["2023-12-30", "2024-01-05"]), path) == [
+        shard_path(path, "2023-Q4"),
+        shard_path(path, "2024-Q1"),
+    ]
+    q4_written = os.path.getmtime(shard_path(path, "2023-Q4"))
+
+    assert write(transactions(["2024-02-10"]), path) == [shard_path(path, "2024-Q1")]
+    assert os.path.getmtime(shard_path(path, "2023-Q4")) == q4_written
+    assert list_shards(path) == [shard_path(path, "2023-Q4"), shard_path(path, "2024-Q1")]
+    assert index_rows(path) == [
+        ("2023-Q4", 1, "2023-12-30", "2023-12-30"),
+        ("2024-Q1", 2, "2024-01-05", "2024-02-10"),
+    ]
+
+
+def test_reprocessed_window_is_replaced_and_reindexed(tmp_path):
+    path = str(tmp_path / "tracker.xlsx")
+    write(
+        pd.concat(
+            [
+                transactions(["2024-01-05", "2024-02-10", "2024-03-01"]),
+                transactions(["2024-01-20"], account="bank2"),
+            ]
+        ),
+        path,
+    )
+    window = (["bank1"], pd.Timestamp("2024-01-01"), pd.Timestamp("2024-01-31"))
+    write(transactions(["2024-01-06", "2024-01-07"]), path, replace=window)
+
+    sheet = load_workbook(shard_path(path, "2024-Q1"))["MasterData"]
+    header = [cell.value for cell in sheet[1]]
+    rows = [
+        (row[header.index("Account")], str(row[header.index("Date")].date()))
+        for row in sheet.iter_rows(min_row=2, values_only=True)
+    ]
+    assert sorted(rows) == [
+        ("bank1", "2024-01-06"),
+        ("bank1", "2024-01-07"),
+        ("bank1", "2024-02-10"),
+        ("bank1", "2024-03-01"),
+        ("bank2", "2024-01-20"),
+    ]
+    assert index_rows(path) == [("2024-Q1", 5, "2024-01-06", "2024-03-01")]
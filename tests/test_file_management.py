@@ -0,0 +1,74 @@
+"""
+tests/test_file_management.py
+"""
+
+import os
+
+import pytest
+
+import reset
+from data_processing.file_management import (
+    JOURNAL_FILENAME,
+    archive_processed_files,
+    unarchive_processed_folders,
+)
+
+STATEMENT = "Date,Name,Amount\n05/01/2024,TESCO STORES,-12.50\n03/01/2024,Netflix,-9.99\n"
+
+
+def write(path: str, content: str = STATEMENT) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+    return path
+
+
+def archive(data_dir: str, paths: dict, compression: str = None) -> None:
+    accounts = {account: {"directory": account} for account in paths}
+    archive_processed_files(accounts, paths, data_dir, "archive", compression=compression)
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_reset_restores_original_paths(tmp_path, compression):
+    data_dir = str(tmp_path)
+    first = write(os.path.join(data_dir, "bank", "statement.csv"))
+    second = write(os.path.join(data_dir, "inbox", "export (1).csv"))
+    archive(data_dir, {"bank": [first, second]}, compression)
+    assert not os.path.exists(first) and not os.path.exists(second)
+
+    assert unarchive_processed_folders(os.path.join(data_dir, "archive"), data_dir)
+    for path in (first, second):
+        with open(path) as f:
+            assert f.read() == STATEMENT
+    assert not os.path.exists(os.path.join(data_dir, "archive", JOURNAL_FILENAME))
+
+
+def test_same_original_path_archived_twice_is_restored_once(tmp_path):
+    data_dir = str(tmp_path)
+    path = os.path.join(data_dir, "bank", "statement.csv")
+    archive(data_dir, {"bank": [write(path)]})
+    archive(data_dir, {"bank": [write(path, STATEMENT.replace("12.50", "13.50"))]})
+
+    assert not unarchive_processed_folders(os.path.join(data_dir, "archive"), data_dir)
+    with open(os.path.join(data_dir, "archive", JOURNAL_FILENAME)) as f:
+        assert len(f.readlines()) == 1
+
+
+def test_reset_keeps_state_when_files_cannot_be_restored(tmp_path, monkeypatch):
+    data_dir = str(tmp_path / "data")
+    path = os.path.join(data_dir, "bank", "statement.csv")
+    archive(data_dir, {"bank": [write(path)]})
+    # A new statement now sits where the archived one came from
+    write(path)
+    state = write(os.path.join(data_dir, ".state", "history.csv"), "Date\n")
+    monkeypatch.chdir(tmp_path)
+    write(
+        str(tmp_path / "config.yaml"),
+        f"data_dir: {data_dir}\narchive_folder: archive\n"
+        "csv_output: out.csv\nexcel_output: out.xlsx\n",
+    )
+
+    with pytest.raises(SystemExit):
+        reset.main()
+    assert os.path.exists(state)
+    assert os.path.exists(os.path.join(data_dir, "archive", JOURNAL_FILENAME))
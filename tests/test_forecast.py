@@ -0,0 +1,49 @@
+"""
+tests/test_forecast.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis.forecast import MODELS, forecast_spend, spend_matrix
+
+
+def totals(spend: dict[str, list[float]], months: int) -> pd.DataFrame:
+    """Running totals of one series per category, its spend in the last months."""
+    labels = pd.period_range("2023-01", periods=months, freq="M").strftime("%Y-%m")
+    rows = [
+        {"Month": month, "Category": category, "Subcategory": "", "Account": "bank1",
+         "Spend": value, "Income": 0.0, "Count": 1}
+        for category, values in spend.items()
+        for month, value in zip(labels[-len(values):], values)
+    ]
+    return pd.DataFrame(rows)
+
+
+def test_months_before_a_series_starts_are_not_zeros():
+    data = totals({"Old": [50.0] * 24, "New": [100.0] * 6}, months=24)
+    _, _, y = spend_matrix(data)
+    assert np.isnan(y[0, :18]).all() and (y[0, 18:] == 100).all()
+
+    forecast = forecast_spend(data, horizon=2).set_index("Category")
+    for model in MODELS:
+        assert forecast.loc["New", model].tolist() == pytest.approx([100.0, 100.0])
+        assert forecast.loc["Old", model].tolist() == pytest.approx([50.0, 50.0])
+
+
+def test_models_follow_a_late_series():
+    data = totals({"Old": [50.0] * 24, "New": [10.0, 20.0, 30.0, 40.0]}, months=24)
+    forecast = forecast_spend(data, horizon=1, alpha=0.5).set_index("Category")
+    assert forecast.loc["New", "Linear Trend"] == pytest.approx(50.0)
+    # Level started at 10, then 15, 22.5, 31.25
+    assert forecast.loc["New", "Exp Smoothing"] == pytest.approx(31.25, abs=0.01)
+    # Less than a season of history: the last month is repeated
+    assert forecast.loc["New", "Seasonal Naive"] == pytest.approx(40.0)
+
+
+def test_seasonal_naive_repeats_last_season():
+    data = totals({"Bills": [float(month) for month in range(1, 25)]}, months=24)
+    forecast = forecast_spend(data, horizon=3)
+    assert forecast["Seasonal Naive"].tolist() == [13.0, 14.0, 15.0]
+    assert forecast["Month"].tolist() == ["2025-01", "2025-02", "2025-03"]
@@ -0,0 +1,64 @@
+"""
+tests/test_format_registry.py
+"""
+
+import pytest
+
+from parser.format_registry import build_format_registry, route_statement
+
+ACCOUNTS = {
+    "current": {
+        "mapping": {
+            "Transaction Date": "Date",
+            "Transaction Description": "Name",
+            "Debit Amount": "Amount Out",
+            "Credit Amount": "Amount In",
+            "Balance": "Balance",
+        }
+    },
+    "savings": {
+        "mapping": {"Date": "Date", "Description": "Name", "Amount": "Amount"}
+    },
+    "card": {
+        "mapping": {"Date": "Date", "Description": "Name", "Amount": "Amount", "Card": "Card"}
+    },
+    "pdf_bank": {"format": "pdf", "mapping": {"Date": "Date"}},
+}
+
+
+@pytest.fixture
+def write_statement(tmp_path):
+    def write(header: str) -> str:
+        path = tmp_path / "statement.csv"
+        path.write_text(f"{header}\n05/01/2024,TESCO,12.50\n", encoding="utf-8-sig")
+        return str(path)
+
+    return write
+
+
+@pytest.mark.parametrize(
+    "header, expected, account",
+    [
+        # Optional columns may be missing from a bank's export
+        ("Transaction Date,Transaction Description,Debit Amount", None, "current"),
+        # Dropped into the wrong account's folder
+        ("Transaction Date,Transaction Description,Credit Amount", "savings", "current"),
+        # The most specific format wins
+        ("Date,Description,Amount,Card", None, "card"),
+        ("Date,Description,Amount", "savings", "savings"),
+    ],
+)
+def test_statements_are_routed_by_their_core_columns(write_statement, header, expected, account):
+    registry = build_format_registry(ACCOUNTS)
+    assert route_statement(write_statement(header), registry, expected) == (account, "")
+
+
+def test_unknown_and_ambiguous_headers_are_rejected(write_statement):
+    registry = build_format_registry(ACCOUNTS)
+    account, reason = route_statement(write_statement("Date,Description"), registry, "savings")
+    assert account is None
+    assert reason == "no savings columns amount"
+
+    twins = build_format_registry({"a": ACCOUNTS["savings"], "b": ACCOUNTS["savings"]})
+    account, reason = route_statement(write_statement("Date,Description,Amount"), twins)
+    assert (account, reason) == (None, "header matches several accounts (a, b)")
@@ -0,0 +1,41 @@
+"""
+tests/test_fx.py
+"""
+
+import pandas as pd
+import pytest
+
+from data_processing.fx import account_currencies, convert_to_base_currency, load_fx_rates
+
+RATES = "Date,Currency,Rate\n2024-01-01,eur,0.86\n2024-01-10,EUR,0.85\n"
+
+
+def statement() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Date": ["05/01/2024", "12/01/2024", "12/01/2024"],
+            "Account": ["euro", "euro", "current"],
+            "Amount": [-10.0, -20.0, -5.0],
+        }
+    )
+
+
+def test_amounts_use_the_latest_rate_on_or_before_each_date(tmp_path):
+    path = tmp_path / "rates.csv"
+    path.write_text(RATES)
+    currencies = account_currencies(
+        {"euro": {"currency": "eur"}, "current": {}}, "GBP"
+    )
+    df = convert_to_base_currency(statement(), currencies, "gbp", load_fx_rates(str(path)))
+    assert df["Amount"].tolist() == [-8.6, -17.0, -5.0]
+    assert df["Original Amount"].tolist() == [-10.0, -20.0, -5.0]
+    assert df["Currency"].tolist() == ["EUR", "EUR", "GBP"]
+
+
+def test_transactions_before_the_first_rate_are_rejected(tmp_path):
+    path = tmp_path / "rates.csv"
+    path.write_text("Date,Currency,Rate\n2024-01-10,EUR,0.85\n")
+    with pytest.raises(ValueError, match="No EUR rate on or before 2024-01-05"):
+        convert_to_base_currency(
+            statement(), {"euro": "EUR"}, "GBP", load_fx_rates(str(path))
+        )
@@ -0,0 +1,88 @@
+"""
+tests/test_history.py
+"""
+
+import os
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from data_processing.data_loading import combine_statements
+from data_processing.history import (
+    append_history,
+    apply_category_edits,
+    find_category_edits,
+    fingerprint_rows,
+    split_window,
+)
+from parser.excel.openpyxl.main import read_master_data_categories, update_excel_file
+
+COLUMNS = ["Date", "Time", "Type", "Name", "Amount", "Category", "Subcategory", "Account"]
+
+
+def transactions() -> pd.DataFrame:
+    df = pd.DataFrame(
+        {
+            "Date": pd.to_datetime(["2024-01-03", "2024-01-05", "2024-01-05", "2024-01-11"]),
+            "Time": [None, None, None, "12:00"],
+            "Type": ["DD", "DEB", "DEB", "POS"],
+            "Name": ["Netflix", "TESCO STORES", "TESCO STORES", "Greggs"],
+            "Amount": [-9.99, -12.5, -12.5, -5],
+            "Category": ["Bills", "Food", "Food", "Food"],
+            "Subcategory": ["", "Groceries", "Groceries", "Eating Out"],
+            "Account": ["bank1", "bank1", "bank1", "bank2"],
+        }
+    )
+    df["Fingerprint"] = fingerprint_rows(df)
+    return df
+
+
+def test_identical_transactions_get_distinct_fingerprints():
+    df = transactions()
+    assert df["Fingerprint"].is_unique
+    history = append_history(pd.DataFrame(columns=df.columns), df)
+    # The same shop twice more on the same day counts on from the stored two
+    again = fingerprint_rows(df.iloc[[1, 2]], history)
+    assert not again.isin(history["Fingerprint"]).any()
+
+
+def test_workbook_edits_are_found_by_fingerprint(tmp_path):
+    df = transactions()
+    history = append_history(pd.DataFrame(columns=df.columns), df)
+    path = str(tmp_path / "tracker.xlsx")
+    update_excel_file(df[COLUMNS].copy(), path, ["Bills", "Food"], [], {}, {})
+
+    workbook = load_workbook(path)
+    sheet = workbook["MasterData"]
+    header = [cell.value for cell in sheet[1]]
+    for row in sheet.iter_rows(min_row=2):
+        if row[header.index("Name")].value == "Greggs":
+            row[header.index("Category")].value = "Shopping"
+    workbook.save(path)
+
+    read_back = read_master_data_categories(path)
+    read_back["Fingerprint"] = fingerprint_rows(read_back)
+    assert set(read_back["Fingerprint"]) == set(history["Fingerprint"])
+
+    edits = find_category_edits(history, read_back[["Fingerprint", "Category", "Subcategory"]])
+    assert edits["Name"].tolist() == ["Greggs"]
+    assert edits["New Category"].tolist() == ["Shopping"]
+    history = apply_category_edits(history, edits)
+    assert history.set_index("Name").loc["Greggs", "Category"] == "Shopping"
+
+
+def test_combining_no_statements_gives_an_empty_frame():
+    # A run that only syncs workbook edits has no statements to combine
+    combined = combine_statements([], COLUMNS)
+    assert combined.empty
+    assert list(combined.columns) == COLUMNS
+    assert pd.api.types.is_datetime64_any_dtype(combined["Date"])
+
+
+def test_window_takes_out_only_the_reprocessed_accounts():
+    history = append_history(pd.DataFrame(columns=transactions().columns), transactions())
+    kept, removed = split_window(
+        history.iloc[::-1], ["bank1"], pd.Timestamp("2024-01-05"), pd.Timestamp("2024-01-11")
+    )
+    assert removed["Name"].tolist() == ["TESCO STORES", "TESCO STORES"]
+    assert kept["Name"].tolist() == ["Netflix", "Greggs"]
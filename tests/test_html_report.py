@@ -0,0 +1,48 @@
+"""
+tests/test_html_report.py
+"""
+
+import os
+
+import pandas as pd
+
+from analysis.rollups import ROLLUP_KEYS, MERCHANT_ROLLUP_KEYS, monthly_rollup, update_rollup
+from parser.html.report import build_html_report, report_files
+
+
+def totals(df: pd.DataFrame, keys: list[str] = ROLLUP_KEYS) -> pd.DataFrame:
+    return update_rollup(pd.DataFrame(), monthly_rollup(df, keys=keys), keys)
+
+
+def transactions() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Date": pd.to_datetime(["2024-01-05", "2024-02-02", "2024-03-09"]),
+            "Name": ["TESCO STORES", "Greggs", "Pret"],
+            "Amount": [-40.0, -4.5, -6.0],
+            "Category": "Food",
+            "Subcategory": ["Groceries", "Eating Out", "Eating Out"],
+            "Account": "bank1",
+        }
+    )
+
+
+def render(df: pd.DataFrame, output_dir: str) -> list[str]:
+    return build_html_report(totals(df), totals(df, MERCHANT_ROLLUP_KEYS), output_dir)
+
+
+def test_only_changed_months_are_rerendered(tmp_path):
+    output_dir = str(tmp_path / "report")
+    df = transactions()
+    assert render(df, output_dir) == ["2024-01", "2024-02", "2024-03"]
+    assert all(os.path.exists(path) for path in report_files(totals(df), output_dir))
+    assert render(df, output_dir) == []
+
+    df.loc[1, "Amount"] = -5.5
+    assert render(df, output_dir) == ["2024-02"]
+    with open(os.path.join(output_dir, "months", "2024-02.html"), encoding="utf-8") as f:
+        assert "5.50" in f.read()
+
+    # A deleted fragment is rendered again even though its month is unchanged
+    os.remove(os.path.join(output_dir, "months", "2024-01.html"))
+    assert render(df, output_dir) == ["2024-01"]
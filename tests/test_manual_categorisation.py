@@ -0,0 +1,68 @@
+"""
+tests/test_manual_categorisation.py
+"""
+
+import pandas as pd
+import pytest
+
+from categorisation.manual_categorisation import (
+    apply_categorisation_rules,
+    apply_categorisation_rules_chunked,
+    categorisation_pool,
+    compile_rules,
+)
+
+RULES = [
+    {
+        "category": "Food",
+        "subcategory": "Groceries",
+        "conditions": [{"column": "Name", "contains": ["tesco", "Lidl"]}],
+    },
+    {
+        "category": "Bills",
+        "conditions": [
+            {"column": "Name", "contains": ["british gas"]},
+            {"column": "Amount", "lt": -50},
+        ],
+    },
+    {
+        "category": "Income",
+        "subcategory": "Salary",
+        "conditions": [{"column": "Type", "equals": "BGC"}],
+    },
+]
+
+
+@pytest.fixture
+def statement() -> pd.DataFrame:
+    names = ["TESCO STORES 123", "British Gas", "British Gas", "ACME LTD", "lidl gb", "Pret"]
+    amounts = [-12.5, -80.0, -20.0, 2000.0, -7.3, -4.2]
+    types = ["DEB", "DD", "DD", "BGC", "DEB", "POS"]
+    return pd.DataFrame(
+        {"Name": names * 5, "Amount": amounts * 5, "Type": types * 5, "Other": 1}
+    )
+
+
+def test_rules_categorise_by_every_condition(statement):
+    result = apply_categorisation_rules(statement.head(6), RULES).fillna("")
+    assert result["Category"].tolist() == ["Food", "Bills", "", "Income", "Food", ""]
+    assert result["Subcategory"].tolist() == ["Groceries", "", "", "Salary", "Groceries", ""]
+
+
+def test_chunked_matches_single_process_with_own_pool(statement):
+    expected = apply_categorisation_rules(statement, RULES)
+    result = apply_categorisation_rules_chunked(statement, RULES, chunk_size=4, max_workers=2)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_chunked_matches_single_process_with_shared_pool(statement):
+    expected = apply_categorisation_rules(statement, RULES)
+    rules = compile_rules(RULES)
+    with categorisation_pool(rules, 2) as pool:
+        for chunk_size in (4, 7):
+            result = apply_categorisation_rules_chunked(
+                statement, rules, chunk_size=chunk_size, max_workers=2, executor=pool
+            )
+            pd.testing.assert_frame_equal(result, expected)
+        # The pool is left running for the next statement
+        assert pool.submit(len, "abc").result() == 3
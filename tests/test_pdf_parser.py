@@ -0,0 +1,45 @@
+"""
+tests/test_pdf_parser.py
+"""
+
+import parser.pdf_parser as pdf_parser
+from parser.pdf_parser import load_cached_tables, tables_to_dataframe
+
+HEADER = ["Date", "Description", "Amount"]
+TABLES = [
+    [HEADER, ["05/01/2024", "TESCO STORES", "-12.50"], ["", "", ""]],
+    [["Balance brought forward", "100.00"]],  # summary box of another width
+    [HEADER, ["06/01/2024", "Greggs ", "-4.00"]],
+]
+
+
+def test_page_tables_are_stitched_under_one_header():
+    df = tables_to_dataframe(TABLES)
+    assert list(df.columns) == HEADER
+    assert df["Description"].tolist() == ["TESCO STORES", "Greggs"]
+
+
+def test_tables_are_extracted_once_per_file_content(tmp_path, monkeypatch):
+    calls = []
+
+    def extract(path):
+        calls.append(path)
+        return TABLES
+
+    monkeypatch.setattr(pdf_parser, "extract_pdf_tables", extract)
+    statement = tmp_path / "statement.pdf"
+    statement.write_bytes(b"%PDF-1.4 statement")
+    copy = tmp_path / "renamed.pdf"
+    copy.write_bytes(b"%PDF-1.4 statement")
+    cache_dir = str(tmp_path / "cache")
+
+    assert load_cached_tables(str(statement), cache_dir) == TABLES
+    assert load_cached_tables(str(copy), cache_dir) == TABLES
+    assert len(calls) == 1
+
+    # A dry run reads the cache but never adds to it
+    other = tmp_path / "other.pdf"
+    other.write_bytes(b"%PDF-1.4 other")
+    load_cached_tables(str(other), cache_dir, read_only=True)
+    load_cached_tables(str(other), cache_dir, read_only=True)
+    assert len(calls) == 3
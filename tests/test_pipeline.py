@@ -0,0 +1,57 @@
+"""
+tests/test_pipeline.py
+"""
+
+import threading
+
+import pytest
+
+from data_processing.pipeline import prefetch, run_concurrently
+
+
+def test_prefetch_keeps_order_and_reraises_producer_errors():
+    def produce():
+        yield from range(5)
+        raise RuntimeError("unreadable statement")
+
+    seen = []
+    with pytest.raises(RuntimeError, match="unreadable statement"):
+        for item in prefetch(produce(), depth=2):
+            seen.append(item)
+    assert seen == [0, 1, 2, 3, 4]
+
+
+def test_prefetch_produces_ahead_of_the_consumer():
+    produced = []
+    second_ready = threading.Event()
+
+    def produce():
+        for item in range(3):
+            produced.append(item)
+            if item == 1:
+                second_ready.set()
+            yield item
+
+    items = prefetch(produce())
+    assert next(items) == 0
+    # The next statement is parsed while the caller is busy with this one
+    assert second_ready.wait(timeout=5)
+    assert list(items) == [1, 2]
+
+
+def test_outputs_run_concurrently_and_all_finish_before_an_error():
+    barrier = threading.Barrier(2, timeout=5)
+    finished = []
+
+    def write_csv():
+        barrier.wait()
+        finished.append("csv")
+
+    def write_excel():
+        barrier.wait()
+        raise OSError("workbook is open in Excel")
+
+    with pytest.raises(OSError, match="open in Excel"):
+        run_concurrently({"csv": write_csv, "excel": write_excel})
+    assert finished == ["csv"]
+    assert set(run_concurrently({"csv": lambda: None})) == {"csv"}
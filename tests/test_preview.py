@@ -0,0 +1,46 @@
+"""
+tests/test_preview.py
+"""
+
+import pandas as pd
+
+from data_processing.history import append_history, fingerprint_rows
+from data_processing.preview import preview_changes
+
+
+def statement(category: str = "Food") -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Date": pd.to_datetime(["2024-01-05"]),
+            "Account": ["bank1"],
+            "Name": ["TESCO STORES"],
+            "Amount": [-12.5],
+            "Category": [category],
+            "Subcategory": ["Groceries"],
+        }
+    )
+
+
+def stored_history() -> pd.DataFrame:
+    stored = statement()
+    stored["Fingerprint"] = fingerprint_rows(stored)
+    return append_history(pd.DataFrame(columns=stored.columns), stored)
+
+
+def test_repeat_of_a_stored_transaction_is_previewed_as_new():
+    history = stored_history()
+    df = statement()
+    # As fingerprinted by the run: the second such payment on that day
+    df["Fingerprint"] = fingerprint_rows(df, history)
+    lines = preview_changes(df, history)
+    assert lines[0].startswith("+ 05/01/2024")
+    assert "1 new, 0 recategorised, 0 unchanged" in lines
+
+
+def test_recategorised_stored_transaction_is_shown_with_its_old_category():
+    history = stored_history()
+    df = statement("Shopping")
+    df["Fingerprint"] = history["Fingerprint"].to_numpy()
+    lines = preview_changes(df, history)
+    assert lines[0].startswith("~ ") and "Food / Groceries → Shopping / Groceries" in lines[0]
+    assert "0 new, 1 recategorised, 0 unchanged" in lines
@@ -0,0 +1,52 @@
+"""
+tests/test_reconciliation.py
+"""
+
+import numpy as np
+import pandas as pd
+
+from analysis.reconciliation import find_gaps, reconcile_balances, update_positions
+
+
+def statement(rows: list[tuple]) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["Date", "Account", "Name", "Amount", "Balance"]).assign(
+        Date=lambda df: pd.to_datetime(df["Date"])
+    )
+
+
+def test_only_the_row_after_a_missing_transaction_is_reported():
+    df = statement(
+        [
+            ("2024-01-02", "bank1", "Salary", 1000.0, 1500.0),
+            ("2024-01-03", "bank1", "Tesco", -50.0, 1450.0),
+            # A -20 payment is missing before this row
+            ("2024-01-05", "bank1", "Greggs", -5.0, 1425.0),
+            ("2024-01-06", "bank1", "Pret", -6.0, 1419.0),
+            ("2024-01-04", "bank2", "Rent", -500.0, np.nan),  # no balance exported
+        ]
+    )
+    report = reconcile_balances(df)
+    assert report[["Name", "Expected", "Difference"]].values.tolist() == [
+        ["Greggs", 1445.0, -20.0]
+    ]
+
+
+def test_next_batch_is_checked_against_the_stored_position():
+    first = statement([("2024-01-31", "bank1", "Tesco", -50.0, 1000.0)])
+    positions = update_positions(None, first)
+    assert positions[["Account", "Balance"]].values.tolist() == [["bank1", 1000.0]]
+
+    later = statement(
+        [
+            ("2024-03-20", "bank1", "Salary", 1000.0, 1990.0),  # 10 unaccounted for
+            ("2024-03-21", "bank1", "Greggs", -5.0, np.nan),
+        ]
+    )
+    report = reconcile_balances(later, positions)
+    assert report[["Expected", "Difference"]].values.tolist() == [[2000.0, -10.0]]
+    gaps = find_gaps(later, positions, max_gap_days=35)
+    assert gaps[["From", "To", "Days"]].values.tolist() == [
+        [pd.Timestamp("2024-01-31"), pd.Timestamp("2024-03-20"), 49]
+    ]
+    # The balance is carried past the row that reports none
+    assert update_positions(positions, later)["Balance"].tolist() == [1985.0]
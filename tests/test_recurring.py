@@ -0,0 +1,74 @@
+"""
+tests/test_recurring.py
+"""
+
+import pandas as pd
+import pytest
+
+from analysis.recurring import (
+    SERIES_COLUMNS,
+    classify_series,
+    merge_series,
+    overlapping_series,
+    rescan_series,
+    summarise_series,
+)
+
+
+def payments(dates: list[str], name: str = "NETFLIX.COM 4412", amount: float = -9.99):
+    return pd.DataFrame(
+        {
+            "Date": pd.to_datetime(dates),
+            "Name": name,
+            "Account": "bank1",
+            "Amount": amount,
+        }
+    )
+
+
+MONTHLY = ["2024-01-03", "2024-02-03", "2024-03-04", "2024-04-03", "2024-05-03"]
+
+
+def assert_same_series(left: pd.DataFrame, right: pd.DataFrame):
+    pd.testing.assert_frame_equal(
+        left.reset_index(drop=True)[SERIES_COLUMNS],
+        right.reset_index(drop=True)[SERIES_COLUMNS],
+        check_dtype=False,
+    )
+
+
+@pytest.mark.parametrize("split", [1, 3])
+def test_merging_batches_in_either_order_matches_a_full_scan(split):
+    full = summarise_series(payments(MONTHLY))
+    first, second = payments(MONTHLY[:split]), payments(MONTHLY[split:])
+    assert_same_series(merge_series(summarise_series(first), summarise_series(second)), full)
+    # A statement imported after a later one
+    assert_same_series(merge_series(summarise_series(second), summarise_series(first)), full)
+
+
+def test_interleaved_statement_is_rescanned_exactly():
+    stored = payments(MONTHLY[0::2])
+    late = payments(MONTHLY[1::2])
+    existing, new = summarise_series(stored), summarise_series(late)
+    keys = overlapping_series(existing, new)
+    assert keys.to_dict("records") == [{"Merchant": "netflix com", "Account": "bank1"}]
+    series = rescan_series(merge_series(existing, new), pd.concat([stored, late]), keys)
+    assert_same_series(series, summarise_series(payments(MONTHLY)))
+
+
+def test_regular_payments_are_classified_by_period():
+    series = pd.concat(
+        [
+            summarise_series(payments(MONTHLY)),
+            # Regular, but too few payments so far
+            summarise_series(payments(MONTHLY[:2], name="Greggs", amount=-3.5)),
+            summarise_series(
+                payments(["2024-01-01", "2024-01-20", "2024-04-30"], name="Amazon")
+            ),
+        ],
+        ignore_index=True,
+    )
+    recurring = classify_series(series)
+    assert recurring["Merchant"].tolist() == ["netflix com"]
+    assert recurring.loc[0, "Period"] == "Monthly"
+    assert recurring.loc[0, "Next Expected"] == pd.Timestamp("2024-06-02")
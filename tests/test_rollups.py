@@ -0,0 +1,63 @@
+"""
+tests/test_rollups.py
+"""
+
+import pandas as pd
+
+from analysis.budgets import evaluate_budgets
+from analysis.rollups import (
+    MERCHANT_ROLLUP_KEYS,
+    load_rollup,
+    monthly_rollup,
+    save_rollup,
+    update_rollup,
+)
+
+
+def transactions() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Date": pd.to_datetime(["2024-01-05", "2024-01-20", "2024-02-02", "2024-02-25"]),
+            "Name": ["TESCO STORES 123", "Tesco Stores 456", "Salary", "Greggs"],
+            "Amount": [-40.0, -35.5, 2000.0, -4.5],
+            "Category": ["Food", "Food", "Income", "Food"],
+            "Subcategory": ["Groceries", "Groceries", None, "Eating Out"],
+            "Account": "bank1",
+        }
+    )
+
+
+def test_running_totals_match_a_full_rollup(tmp_path):
+    df = transactions()
+    path = str(tmp_path / "monthly_totals.csv")
+    save_rollup(update_rollup(load_rollup(path), monthly_rollup(df.iloc[:2])), path)
+    totals = update_rollup(load_rollup(path), monthly_rollup(df.iloc[2:]))
+    full = update_rollup(load_rollup(str(tmp_path / "missing.csv")), monthly_rollup(df))
+    pd.testing.assert_frame_equal(totals, full, check_dtype=False)
+    groceries = totals[totals["Subcategory"] == "Groceries"].iloc[0]
+    assert (groceries["Spend"], groceries["Count"]) == (75.5, 2)
+
+    # Taking a row back out drops groups that become empty
+    totals = update_rollup(totals, monthly_rollup(df.iloc[[3]], sign=-1))
+    assert "Eating Out" not in totals["Subcategory"].tolist()
+
+
+def test_merchant_totals_group_normalised_names():
+    totals = monthly_rollup(transactions(), keys=MERCHANT_ROLLUP_KEYS)
+    tesco = totals[totals["Merchant"] == "tesco stores"]
+    assert tesco[["Month", "Spend", "Count"]].values.tolist() == [["2024-01", 75.5, 2]]
+
+
+def test_monthly_and_rolling_budgets():
+    totals = update_rollup(pd.DataFrame(), monthly_rollup(transactions()))
+    report = evaluate_budgets(
+        totals,
+        [
+            {"category": "Food", "subcategory": "Eating Out", "monthly": 4},
+            {"category": "Food", "rolling_months": 2, "limit": 100},
+        ],
+    )
+    assert report["Status"].tolist() == ["Over budget", "OK"]
+    assert report.loc[0, ["Spend", "Remaining"]].tolist() == [4.5, -0.5]
+    # The rolling window covers January's groceries too
+    assert report.loc[1, ["From", "To", "Spend"]].tolist() == ["2024-01", "2024-02", 80.0]
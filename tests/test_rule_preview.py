@@ -0,0 +1,59 @@
+"""
+tests/test_rule_preview.py
+"""
+
+import pandas as pd
+import pytest
+
+from categorisation.rule_preview import build_merchant_table, format_preview, preview_rule
+
+RULES = [
+    {
+        "category": "Bills",
+        "subcategory": "Phone",
+        "conditions": [{"column": "Name", "contains": ["ee limited"]}],
+    },
+]
+
+
+def history() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Name": ["EE LIMITED", "EE LIMITED", "COFFEE HOUSE", "Tesco Stores", "Salary"],
+            "Amount": [-30.0, -30.0, -3.5, -20.0, 2000.0],
+            "Category": ["Bills", "Bills", "Food", "Food", "Income"],
+            "Subcategory": ["Phone", "Phone", "Eating Out", "Groceries", None],
+        }
+    )
+
+
+def test_preview_lists_matches_conflicts_and_partial_words():
+    merchants = build_merchant_table(history(), RULES)
+    assert len(merchants) == 4
+    preview = preview_rule(
+        merchants,
+        {
+            "category": "Bills",
+            "subcategory": "Broadband",
+            "conditions": [{"column": "Name", "contains": ["ee"]}],
+        },
+    )
+    matches = preview["matches"]
+    assert matches["Name"].tolist() == ["EE LIMITED", "COFFEE HOUSE"]
+    assert matches.loc[0, ["Rows", "Spend", "Stored"]].tolist() == [2, 60.0, "Bills / Phone"]
+    assert preview["conflicts"][["Name", "Rule"]].values.tolist() == [
+        ["EE LIMITED", "Bills / Phone"]
+    ]
+    assert preview["partial"].values.tolist() == [["ee", "COFFEE HOUSE"]]
+    lines = format_preview(preview)
+    assert lines[-2].startswith("[⚠️] 1 merchants are already categorised as Bills / Phone")
+    assert "2 merchants, 3 rows, 63.50 spend" in lines[-3]
+
+
+def test_only_name_conditions_can_be_previewed():
+    merchants = build_merchant_table(history())
+    with pytest.raises(ValueError, match="conditions on Name"):
+        preview_rule(
+            merchants,
+            {"category": "Bills", "conditions": [{"column": "Amount", "lt": -50}]},
+        )
@@ -0,0 +1,67 @@
+"""
+tests/test_stage_cache.py
+"""
+
+import os
+
+import pandas as pd
+
+from data_processing.stage_cache import open_stage_cache, resolve, run_stage
+
+
+def counted(calls: list, value):
+    def compute():
+        calls.append(value)
+        return value
+
+    return compute
+
+
+def test_stages_rerun_only_when_an_input_changes(tmp_path):
+    cache = open_stage_cache(str(tmp_path))
+    calls = []
+    df = pd.DataFrame({"Amount": [-1.0, -2.0]})
+
+    first = run_stage(cache, "parse", counted(calls, df), {"df": df})
+    again = run_stage(cache, "parse", counted(calls, df), {"df": df.copy()})
+    assert (first["hit"], again["hit"]) == (False, True)
+    pd.testing.assert_frame_equal(resolve(again), df)
+
+    # A later stage is keyed on the earlier stage's key, not on its value
+    total = run_stage(cache, "total", lambda: resolve(again)["Amount"].sum(), {"df": again})
+    assert resolve(total) == -3.0
+    assert run_stage(cache, "total", lambda: 0, {"df": first})["hit"]
+
+    changed = run_stage(cache, "parse", counted(calls, df), {"df": df.assign(Amount=0)})
+    assert not changed["hit"]
+    assert len(calls) == 2
+
+
+def test_output_stages_rerun_when_their_files_change(tmp_path):
+    cache = open_stage_cache(str(tmp_path / "cache"))
+    path = tmp_path / "out.csv"
+
+    def write():
+        path.write_text("Amount\n-1.0\n")
+
+    assert not run_stage(cache, "export", write, {"rows": 1}, outputs=[str(path)])["hit"]
+    assert run_stage(cache, "export", write, {"rows": 1}, outputs=[str(path)])["hit"]
+    path.write_text("edited by hand\n")
+    assert not run_stage(cache, "export", write, {"rows": 1}, outputs=[str(path)])["hit"]
+    assert path.read_text() == "Amount\n-1.0\n"
+
+
+def test_results_are_pruned_and_read_only_caches_are_left_alone(tmp_path):
+    cache = open_stage_cache(str(tmp_path), keep=2)
+    for value in range(4):
+        run_stage(cache, "parse", lambda: value, {"value": value})
+    run_stage(cache, "combine", lambda: 0, {"value": 0}, keep=1)
+    run_stage(cache, "combine", lambda: 1, {"value": 1}, keep=1)
+    assert len(os.listdir(tmp_path / "parse")) == 2
+    assert len(os.listdir(tmp_path / "combine")) == 1
+
+    read_only = open_stage_cache(str(tmp_path), read_only=True)
+    assert run_stage(read_only, "combine", lambda: 1, {"value": 1})["hit"]
+    result = run_stage(read_only, "combine", lambda: 2, {"value": 2})
+    assert resolve(result) == 2
+    assert len(os.listdir(tmp_path / "combine")) == 1
@@ -0,0 +1,83 @@
+"""
+tests/test_stages.py
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from data_processing.stage_cache import open_stage_cache
+from stages import export_excel, link_transfers, replace_window
+
+COLUMNS = ["Date", "Time", "Type", "Name", "Amount", "Category", "Subcategory", "Account"]
+
+
+def batch() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Date": pd.to_datetime(["2024-01-05", "2024-01-11"]),
+            "Time": [None, None],
+            "Type": ["DEB", "FPI"],
+            "Name": ["TESCO STORES", "From current"],
+            "Amount": [-12.5, 100.0],
+            "Category": ["Food", ""],
+            "Subcategory": ["Groceries", ""],
+            "Account": ["bank2", "bank2"],
+            "Fingerprint": ["a", "b"],
+        }
+    )
+
+
+def write(df, path, history_path, cache):
+    export_excel(
+        df, path, ["Food"], ["Groceries"], {}, {}, "GBP", {}, None, None, history_path, cache
+    )
+
+
+def test_workbook_is_appended_again_on_top_of_different_history(tmp_path):
+    cache = open_stage_cache(str(tmp_path / "cache"))
+    path = str(tmp_path / "tracker.xlsx")
+    history_path = tmp_path / "history.csv"
+    history_path.write_text("Fingerprint\n")
+    df = batch()[COLUMNS]
+
+    write(df, path, str(history_path), cache)
+    modified = os.path.getmtime(path)
+    write(df, path, str(history_path), cache)
+    assert os.path.getmtime(path) == modified
+
+    # Same batch, but the stored state moved on: the totals stage recomputes,
+    # so the workbook must not be left behind
+    history_path.write_text("Fingerprint\nx\n")
+    write(df, path, str(history_path), cache)
+    assert len(pd.read_excel(path, sheet_name="MasterData")) == 2 * len(df)
+
+
+def test_late_transfer_marks_a_copy_of_the_history():
+    history = pd.DataFrame(
+        {
+            "Date": pd.to_datetime(["2024-01-10"]),
+            "Account": ["bank1"],
+            "Name": ["To savings"],
+            "Amount": [-100.0],
+            "Fingerprint": ["s"],
+            "Transfer ID": [None],
+        }
+    )
+    removed = history.iloc[0:0]
+    ids, linked, late = link_transfers(batch(), history, removed, {"window_days": 3})
+    assert ids.isna().tolist() == [True, False]
+    assert linked.loc[0, "Transfer ID"] == ids[1]
+    # The stored row as it was, to be taken back out of the totals
+    assert late["Transfer ID"].isna().all()
+    assert history["Transfer ID"].isna().all()
+
+
+def test_reprocessing_window_must_cover_the_whole_batch():
+    history = batch().assign(**{"Transfer ID": None})
+    with pytest.raises(ValueError, match="outside the reprocessing window"):
+        replace_window(batch(), history, ["bank2"], since=pd.Timestamp("2024-01-10"))
+    remaining, removed, window = replace_window(batch(), history, ["bank2"])
+    assert remaining.empty and len(removed) == 2
+    assert window == (["bank2"], pd.Timestamp("2024-01-05"), pd.Timestamp("2024-01-11"))
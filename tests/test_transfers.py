@@ -0,0 +1,66 @@
+"""
+tests/test_transfers.py
+"""
+
+import pandas as pd
+
+from analysis.transfers import exclude_transfers, match_stored_transfers, match_transfers
+
+
+def transactions(rows: list[tuple]) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["Date", "Account", "Name", "Amount"]).assign(
+        Date=lambda df: pd.to_datetime(df["Date"])
+    )
+
+
+def test_opposite_amounts_between_accounts_are_paired_one_to_one():
+    df = transactions(
+        [
+            ("2024-01-10", "bank1", "To savings", -100.0),
+            ("2024-01-11", "bank2", "From current", 100.0),
+            ("2024-01-12", "bank1", "To savings", -100.0),
+            ("2024-01-20", "bank2", "From current", 100.0),  # outside the window
+            ("2024-01-11", "bank1", "Refund", 100.0),  # same account
+        ]
+    )
+    ids = match_transfers(df, window_days=3)
+    assert ids[0] == ids[1] and ids[0] is not None
+    assert ids[[2, 3, 4]].isna().all()
+    assert len(exclude_transfers(df.assign(**{"Transfer ID": ids}))) == 3
+
+
+def test_transfer_split_across_runs_is_paired_with_the_stored_side():
+    history = transactions(
+        [
+            ("2024-01-10", "bank1", "To savings", -100.0),
+            ("2024-01-11", "bank1", "Rent", -500.0),
+            ("2024-01-12", "bank2", "From current", 500.0),  # already paired
+        ]
+    ).assign(**{"Transfer ID": [None, "TR-1", "TR-1"]})
+    batch = transactions(
+        [
+            ("2024-01-11", "bank2", "From current", 100.0),
+            ("2024-01-11", "bank2", "Greggs", -5.0),
+        ]
+    ).assign(**{"Transfer ID": None})
+
+    new_ids, stored_ids = match_stored_transfers(batch, history, window_days=3)
+    assert new_ids[0] == stored_ids[0] and new_ids[0] is not None
+    assert new_ids[[1]].isna().all() and stored_ids[[1, 2]].isna().all()
+    # Same ID as if both sides had arrived in one batch
+    together = match_transfers(pd.concat([history.iloc[[0]], batch], ignore_index=True))
+    assert together[0] == stored_ids[0]
+
+
+def test_stored_rows_are_not_paired_with_each_other():
+    history = transactions(
+        [
+            ("2024-01-10", "bank1", "To savings", -100.0),
+            ("2024-01-10", "bank2", "From current", 100.0),
+        ]
+    ).assign(**{"Transfer ID": None})
+    batch = transactions([("2024-01-11", "bank1", "Greggs", -5.0)]).assign(
+        **{"Transfer ID": None}
+    )
+    new_ids, stored_ids = match_stored_transfers(batch, history)
+    assert new_ids.isna().all() and stored_ids.isna().all()